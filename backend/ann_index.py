@@ -0,0 +1,361 @@
+"""
+Approximate Nearest Neighbour (ANN) Index Module
+Sub-linear alternatives to the exact matrix scan used by VectorDB.
+
+Two index types are provided:
+- IVF:  inverted file index built with spherical k-means (pure numpy).
+        Tuned per query with `nprobe` (number of clusters scanned).
+- HNSW: hierarchical navigable small world graph backed by `hnswlib`
+        (optional dependency). Tuned per query with `ef_search`.
+
+All vectors handed to an index are expected to be L2-normalized, so inner
+product equals cosine similarity.
+"""
+import os
+import threading
+import numpy as np
+from typing import Optional
+
+try:
+    import hnswlib
+except ImportError:  # optional dependency
+    hnswlib = None
+
+
+INDEX_TYPES = ('exact', 'ivf', 'hnsw')
+
+
+class ANNIndex:
+    """Common interface for approximate indexes"""
+    kind = None
+    file_suffix = None
+
+    def __init__(self, dim: int, path: Optional[str] = None):
+        self.dim = dim
+        self.path = path
+        # Entries removed logically but still occupying the index (see remove)
+        self.tombstones = 0
+
+    def build(self, ids: np.ndarray, vectors: np.ndarray):
+        """(Re)build the index from scratch"""
+        raise NotImplementedError
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        """Add vectors to an already built index"""
+        raise NotImplementedError
+
+    def remove(self, ids: np.ndarray, vectors: np.ndarray):
+        """Remove ids; vectors are their currently indexed vectors (used to locate them)"""
+        raise NotImplementedError
+
+    def update(self, ids: np.ndarray, old_vectors: np.ndarray, vectors: np.ndarray):
+        """Replace the vectors of ids already in the index"""
+        self.remove(ids, old_vectors)
+        self.add(ids, vectors)
+
+    def search(self, query: np.ndarray, k: int, **params) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Search the index
+        Returns: (ids, scores) ordered best first
+        """
+        raise NotImplementedError
+
+    def save(self):
+        """Persist the index to self.path"""
+        raise NotImplementedError
+
+    def load(self) -> bool:
+        """Load the index from self.path; returns False if nothing was loaded"""
+        raise NotImplementedError
+
+    def remove_file(self):
+        """Delete the persisted index, if any"""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class IVFIndex(ANNIndex):
+    """Inverted file index over spherical k-means clusters"""
+    kind = 'ivf'
+    file_suffix = '.ivf.npz'
+
+    def __init__(self, dim: int, path: Optional[str] = None, n_lists: Optional[int] = None,
+                 nprobe: int = 8, kmeans_iterations: int = 10, seed: int = 0):
+        super().__init__(dim, path)
+        self.n_lists = n_lists
+        self.default_nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.centroids = np.empty((0, dim), dtype=np.float32)
+        self.list_ids = []
+        self.list_vectors = []
+        self._lock = threading.Lock()
+
+    def _train_centroids(self, vectors: np.ndarray, n_lists: int) -> np.ndarray:
+        """Spherical k-means on a sample of the vectors"""
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), n_lists * 256)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            empty = norms[:, 0] == 0
+            sums[empty] = centroids[empty]
+            norms[empty] = 1.0
+            centroids = sums / norms
+
+        return centroids.astype(np.float32)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Nearest centroid for each vector"""
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def build(self, ids: np.ndarray, vectors: np.ndarray):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        with self._lock:
+            if len(vectors) == 0:
+                self.centroids = np.empty((0, self.dim), dtype=np.float32)
+                self.list_ids = []
+                self.list_vectors = []
+                return
+
+            n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+            n_lists = min(n_lists, len(vectors))
+            self.centroids = self._train_centroids(vectors, n_lists)
+
+            assignment = self._assign(vectors)
+            order = np.argsort(assignment, kind='stable')
+            bounds = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+            self.list_ids = [ids[order[bounds[i]:bounds[i + 1]]] for i in range(n_lists)]
+            self.list_vectors = [np.ascontiguousarray(vectors[order[bounds[i]:bounds[i + 1]]])
+                                 for i in range(n_lists)]
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+
+        with self._lock:
+            if len(self.centroids) == 0:
+                # Nothing trained yet: seed a single list with these vectors
+                self.centroids = self._train_centroids(vectors, 1)
+                self.list_ids = [np.empty(0, dtype=np.int64)]
+                self.list_vectors = [np.empty((0, self.dim), dtype=np.float32)]
+
+            assignment = self._assign(vectors)
+            for list_no in np.unique(assignment):
+                mask = assignment == list_no
+                self.list_ids[list_no] = np.concatenate([self.list_ids[list_no], ids[mask]])
+                self.list_vectors[list_no] = np.vstack([self.list_vectors[list_no], vectors[mask]])
+
+    def remove(self, ids: np.ndarray, vectors: np.ndarray):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+
+        with self._lock:
+            if len(self.centroids) == 0:
+                return
+            # A vector's list is its nearest centroid, so only those lists are
+            # touched; ids not found there (e.g. stale vectors) fall back to a full pass
+            assignment = self._assign(vectors)
+            missing = []
+            for list_no in np.unique(assignment):
+                wanted = ids[assignment == list_no]
+                keep = ~np.isin(self.list_ids[list_no], wanted)
+                missing.extend(np.setdiff1d(wanted, self.list_ids[list_no][~keep]))
+                self.list_ids[list_no] = self.list_ids[list_no][keep]
+                self.list_vectors[list_no] = self.list_vectors[list_no][keep]
+            if missing:
+                for list_no in range(len(self.list_ids)):
+                    keep = ~np.isin(self.list_ids[list_no], missing)
+                    if not keep.all():
+                        self.list_ids[list_no] = self.list_ids[list_no][keep]
+                        self.list_vectors[list_no] = self.list_vectors[list_no][keep]
+
+    def search(self, query: np.ndarray, k: int, nprobe: Optional[int] = None,
+               **params) -> tuple[np.ndarray, np.ndarray]:
+        # add / remove replace a list's ids and vectors one after the other;
+        # take matching pairs under the lock (the arrays themselves are never
+        # modified in place) and score them outside it
+        with self._lock:
+            if len(self.centroids) == 0 or k <= 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            if nprobe is not None and nprobe < 1:
+                raise ValueError("nprobe must be at least 1")
+            nprobe = min(nprobe or self.default_nprobe, len(self.centroids))
+            centroid_scores = self.centroids @ query
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+            probed = [(self.list_ids[i], self.list_vectors[i]) for i in probe]
+
+        ids = np.concatenate([list_ids for list_ids, _ in probed])
+        if len(ids) == 0:
+            return ids, np.empty(0, dtype=np.float32)
+        scores = np.vstack([list_vectors for _, list_vectors in probed]) @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return ids[top], scores[top]
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            sizes = np.array([len(ids) for ids in self.list_ids], dtype=np.int64)
+            all_ids = np.concatenate(self.list_ids) if self.list_ids else np.empty(0, dtype=np.int64)
+            all_vectors = (np.vstack(self.list_vectors) if self.list_vectors
+                           else np.empty((0, self.dim), dtype=np.float32))
+            # Write through a file object so numpy does not append its own suffix
+            with open(self.path, 'wb') as f:
+                np.savez(f, centroids=self.centroids, sizes=sizes, ids=all_ids, vectors=all_vectors)
+
+    def load(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with np.load(self.path) as data:
+            centroids = data['centroids']
+            if centroids.shape[1:] != (self.dim,):
+                return False
+            offsets = np.concatenate([[0], np.cumsum(data['sizes'])])
+            ids, vectors = data['ids'], data['vectors']
+        with self._lock:
+            self.centroids = centroids
+            self.list_ids = [ids[offsets[i]:offsets[i + 1]] for i in range(len(centroids))]
+            self.list_vectors = [vectors[offsets[i]:offsets[i + 1]] for i in range(len(centroids))]
+        return True
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self.list_ids)
+
+
+class HNSWIndex(ANNIndex):
+    """HNSW graph index backed by hnswlib"""
+    kind = 'hnsw'
+    file_suffix = '.hnsw.bin'
+
+    def __init__(self, dim: int, path: Optional[str] = None, M: int = 16,
+                 ef_construction: int = 200, ef_search: int = 64):
+        if hnswlib is None:
+            raise ImportError("HNSW index requires the 'hnswlib' package (pip install hnswlib)")
+        super().__init__(dim, path)
+        self.M = M
+        self.ef_construction = ef_construction
+        self.default_ef_search = ef_search
+        self.index = None
+        # Labels marked deleted; tombstones is its size
+        self._deleted = set()
+        self._lock = threading.Lock()
+
+    def _new_index(self, capacity: int):
+        index = hnswlib.Index(space='ip', dim=self.dim)
+        index.init_index(max_elements=max(capacity, 1), ef_construction=self.ef_construction, M=self.M)
+        index.set_ef(self.default_ef_search)
+        return index
+
+    def build(self, ids: np.ndarray, vectors: np.ndarray):
+        with self._lock:
+            self.index = self._new_index(len(ids))
+            self._deleted = set()
+            self.tombstones = 0
+            if len(ids):
+                self.index.add_items(np.asarray(vectors, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            if self.index is None:
+                self.index = self._new_index(len(ids))
+            needed = self.index.get_current_count() + len(ids)
+            if needed > self.index.get_max_elements():
+                self.index.resize_index(max(needed, self.index.get_max_elements() * 2))
+            self.index.add_items(vectors, ids)
+            # Re-adding a deleted label (e.g. a product moved back by a shard
+            # resize) un-marks it in place: it is live again, not a new node
+            if self._deleted:
+                self._deleted.difference_update(ids.tolist())
+                self.tombstones = len(self._deleted)
+
+    def remove(self, ids: np.ndarray, vectors: np.ndarray):
+        # hnswlib cannot unlink graph nodes: deleted labels are only skipped by
+        # searches until the index is rebuilt
+        with self._lock:
+            if self.index is None:
+                return
+            for product_id in np.asarray(ids, dtype=np.int64):
+                if int(product_id) in self._deleted:
+                    continue
+                try:
+                    self.index.mark_deleted(int(product_id))
+                    self._deleted.add(int(product_id))
+                except RuntimeError:
+                    # Not in the index
+                    pass
+            self.tombstones = len(self._deleted)
+
+    def update(self, ids: np.ndarray, old_vectors: np.ndarray, vectors: np.ndarray):
+        # add_items with an existing label replaces its vector in place
+        self.add(ids, vectors)
+
+    def search(self, query: np.ndarray, k: int, ef_search: Optional[int] = None,
+               **params) -> tuple[np.ndarray, np.ndarray]:
+        live = self.index.get_current_count() - self.tombstones if self.index is not None else 0
+        if k <= 0 or live <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(k, live)
+        with self._lock:
+            # ef must be at least k for hnswlib to return k results
+            self.index.set_ef(max(ef_search or self.default_ef_search, k))
+            labels, distances = self.index.knn_query(query.reshape(1, -1), k=k)
+        # hnswlib's 'ip' distance is 1 - inner product
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def save(self):
+        if self.path and self.index is not None:
+            with self._lock:
+                self.index.save_index(self.path)
+
+    def load(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        index = hnswlib.Index(space='ip', dim=self.dim)
+        index.load_index(self.path)
+        index.set_ef(self.default_ef_search)
+        with self._lock:
+            self.index = index
+            # Deleted marks are persisted but not counted; the caller's size
+            # check then triggers a rebuild, which also compacts them away
+            self._deleted = set()
+            self.tombstones = 0
+        return True
+
+    def __len__(self) -> int:
+        return self.index.get_current_count() - self.tombstones if self.index is not None else 0
+
+
+def create_index(index_type: str, dim: int, db_path: str, **options) -> Optional[ANNIndex]:
+    """
+    Create an ANN index for a VectorDB instance
+    The index file is stored next to the database file, e.g. data/vector.ivf.npz
+    Returns None for the 'exact' index type.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    if index_type == 'exact':
+        return None
+
+    index_class = IVFIndex if index_type == 'ivf' else HNSWIndex
+    path = os.path.splitext(db_path)[0] + index_class.file_suffix
+    return index_class(dim, path, **options)
+
+# Made with Bob
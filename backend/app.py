@@ -1,19 +1,263 @@
 """
 Flask Backend API for Vector DB vs SQL DB Comparison
 """
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
 from traditional_db import TraditionalDB
 from vector_db import VectorDB
+from sharding import ShardedVectorDB
 from sample_data import SAMPLE_PRODUCTS
+from filters import parse_filters
+from metrics import REGISTRY, StageTimer
+from ingest import IngestPipeline, parse_products, INGEST_FORMATS
+from hybrid import fuse, RRF_K
+from response_cache import ResponseCache
+from embedding_cache import normalize_query
+from pagination import MAX_PAGE_SIZE, parse_cursor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Iterable, Optional
+import json
 import os
+import threading
+import time
 
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
 CORS(app)
 
 # Initialize databases
-traditional_db = TraditionalDB()
-vector_db = VectorDB()
+# VECTOR_INDEX selects the vector search path: exact (default), ivf or hnsw
+# VECTOR_STORAGE selects the resident vector encoding: float32 (default), int8 or binary
+# VECTOR_MMAP=1 keeps that matrix in memory-mapped sidecar files next to vector.db
+# QUERY_CACHE_SIZE bounds the query embedding LRU cache (0 disables it)
+# ENCODER_PROCESSES > 0 encodes bulk / streaming loads on that many worker processes
+# QUERY_BATCH_SIZE > 1 micro-batches concurrent query encodes, waiting up to
+# QUERY_BATCH_WINDOW_MS for a batch to fill
+# VECTOR_ENCODER selects the text encoder: sentence-transformers (default),
+# quantized (dynamic int8) or stub; ENCODER_THREADS sets torch intra-op threads
+# VECTOR_SHARDS > 0 hash-partitions the vector store across that many SQLite
+# files, each searched by its own worker process
+VECTOR_OPTIONS = {
+    'index_type': os.environ.get('VECTOR_INDEX', 'exact'),
+    'storage_mode': os.environ.get('VECTOR_STORAGE', 'float32'),
+    'mmap_matrix': os.environ.get('VECTOR_MMAP', '0') == '1',
+    'query_cache_size': int(os.environ.get('QUERY_CACHE_SIZE', 1024)),
+    'encoder_processes': int(os.environ.get('ENCODER_PROCESSES', 0)),
+    'query_batch_size': int(os.environ.get('QUERY_BATCH_SIZE', 0)),
+    'query_batch_window_ms': float(os.environ.get('QUERY_BATCH_WINDOW_MS', 2.0)),
+    'encoder': os.environ.get('VECTOR_ENCODER', 'sentence-transformers'),
+    'encoder_threads': int(os.environ.get('ENCODER_THREADS', 0)) or None
+}
+VECTOR_SHARDS = int(os.environ.get('VECTOR_SHARDS', 0))
+
+# Worker processes (encoder pool, vector shards) are spawned, which runs this
+# module again as __mp_main__; only the server process opens the databases
+if __name__ != '__mp_main__':
+    traditional_db = TraditionalDB()
+    if VECTOR_SHARDS:
+        vector_db = ShardedVectorDB(shards=VECTOR_SHARDS, **VECTOR_OPTIONS)
+    else:
+        vector_db = VectorDB(**VECTOR_OPTIONS)
+    # Load the embedding model in the background; traditional search is served
+    # immediately and /api/ready reports when the vector engine can take traffic
+    vector_db.start_warm_up()
+
+VECTOR_WARMING_UP = 'Vector engine is warming up'
+
+# Shared pool for running both engines concurrently; SQLite, numpy and torch
+# release the GIL, so the engines overlap instead of running back to back
+search_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('SEARCH_WORKERS', 8)),
+    thread_name_prefix='search'
+)
+# Default per-engine timeout (ms) for multi-engine endpoints
+SEARCH_TIMEOUT_MS = float(os.environ.get('SEARCH_TIMEOUT_MS', 10000))
+
+# Upper bound on queries accepted by /api/search/vector/batch
+MAX_BATCH_QUERIES = int(os.environ.get('MAX_BATCH_QUERIES', 10000))
+
+# Streaming ingest: one load at a time, never alongside /api/initialize or
+# /api/clear (all three take ingest_lock); progress is served by /api/ingest/status
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+ingest_lock = threading.Lock()
+current_ingest = None
+
+# Default shortlist size requested from each engine by /api/search/hybrid
+HYBRID_CANDIDATES = int(os.environ.get('HYBRID_CANDIDATES', 50))
+
+# Serialized search responses, tagged with the data version they were built
+# from; RESPONSE_CACHE_SIZE=0 disables the cache
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', 1024)),
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+)
+
+# Per-query tuning parameters accepted by the vector search endpoints
+VECTOR_SEARCH_PARAMS = ('ef_search', 'nprobe', 'rescore_factor')
+
+# Default and largest "limit" of the single-engine search endpoints
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = int(os.environ.get('MAX_SEARCH_LIMIT', 1000))
+
+
+# Metrics exposed at /metrics (Prometheus text format)
+REGISTRY.describe('http_requests_total', 'counter', 'HTTP requests by endpoint, method and status')
+REGISTRY.describe('http_request_duration_seconds', 'histogram', 'HTTP request latency by endpoint')
+REGISTRY.describe('search_stage_duration_seconds', 'histogram',
+                  'Time spent in each search stage by endpoint and engine')
+REGISTRY.gauge('vector_ready', 'Whether the vector engine has finished warming up',
+               lambda: int(vector_db.is_ready))
+REGISTRY.gauge('vector_matrix_bytes', 'Bytes held by the resident vector search matrix',
+               lambda: vector_db.memory_stats()['matrix_bytes'])
+REGISTRY.gauge('query_cache_hits_total', 'Query embedding cache hits',
+               lambda: vector_db.query_cache.hits, kind='counter')
+REGISTRY.gauge('query_cache_misses_total', 'Query embedding cache misses',
+               lambda: vector_db.query_cache.misses, kind='counter')
+REGISTRY.gauge('response_cache_hits_total', 'Search responses served from the response cache',
+               lambda: response_cache.hits, kind='counter')
+REGISTRY.gauge('response_cache_misses_total', 'Search responses not found (or stale) in the response cache',
+               lambda: response_cache.misses, kind='counter')
+REGISTRY.gauge('response_cache_bytes', 'Bytes held by the response cache', lambda: response_cache.bytes)
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start_ns = time.perf_counter_ns()
+
+
+@app.after_request
+def _record_request_metrics(response):
+    # Label by route pattern, not raw path, to keep label cardinality bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    REGISTRY.inc('http_requests_total', endpoint=endpoint, method=request.method,
+                 status=response.status_code)
+    start_ns = g.get('request_start_ns')
+    if start_ns is not None:
+        REGISTRY.observe('http_request_duration_seconds', (time.perf_counter_ns() - start_ns) / 1e9,
+                         endpoint=endpoint, method=request.method)
+    return response
+
+
+def _wants_timings(data: dict) -> bool:
+    """Whether the request asked for per-stage timings ("timings": true or ?timings=1)"""
+    return bool(data.get('timings')) or request.args.get('timings') in ('1', 'true')
+
+
+def _data_version() -> tuple:
+    """Combined write version of both databases; changes whenever either one is written"""
+    return traditional_db.data_version, vector_db.data_version
+
+
+def _cached_search(data: dict, query: str, **params):
+    """
+    Look up a search response in the response cache
+    The key is the endpoint, the normalized query and every other parameter
+    that shapes the response. Requests asking for timings are never cached.
+    Returns: (cached response or None, (key, version) to store a fresh
+    response under, or None when it must not be stored)
+    """
+    if not response_cache.enabled or _wants_timings(data):
+        return None, None
+    key = (request.url_rule.rule, normalize_query(query), json.dumps(params, sort_keys=True))
+    # Captured before searching, so a write racing with this request leaves
+    # its response tagged with the older version
+    version = _data_version()
+    body = response_cache.get(key, version)
+    if body is None:
+        return None, (key, version)
+    response = Response(body, mimetype='application/json')
+    response.headers['X-Cache'] = 'HIT'
+    return response, None
+
+
+def _search_response(body: dict, timer: StageTimer, engine: str, include_timings: bool,
+                     cache_entry: Optional[tuple] = None):
+    """
+    Serialize a search response, recording the request's stage timings
+    The optional 'timings' object covers every stage before serialization;
+    the Server-Timing header and /metrics include serialization as well.
+    With cache_entry (from _cached_search) the serialized body is cached.
+    """
+    if include_timings:
+        body['timings'] = timer.as_ms()
+    with timer.stage('serialize'):
+        response = jsonify(body)
+    response.headers['Server-Timing'] = timer.server_timing()
+    if cache_entry is not None:
+        key, version = cache_entry
+        response_cache.put(key, version, response.get_data())
+        response.headers['X-Cache'] = 'MISS'
+    REGISTRY.observe_stages('search_stage_duration_seconds', timer,
+                            endpoint=request.url_rule.rule, engine=engine)
+    return response
+
+
+def _wants_stream(data: dict) -> bool:
+    """Whether the request asked for an NDJSON stream ("stream": true or ?format=ndjson)"""
+    return bool(data.get('stream')) or request.args.get('format') == 'ndjson'
+
+
+def _parse_limit(value: Any, default: Optional[int], maximum: Optional[int], name: str = 'limit') -> Optional[int]:
+    """Validate a result-count parameter; default when absent, ValueError when out of [1, maximum]"""
+    if value is None or value == '':
+        return default
+    limit = int(value)
+    if limit < 1 or (maximum is not None and limit > maximum):
+        raise ValueError(f"{name} must be between 1 and {maximum}" if maximum else f"{name} must be at least 1")
+    return limit
+
+
+def _ndjson_response(rows: Iterable[Dict[str, Any]]) -> Response:
+    """
+    Stream rows as newline-delimited JSON, one object per line
+    Rows are serialized only as the client reads them, so memory stays flat
+    and the first row is sent without waiting for the last.
+    """
+    def generate():
+        for row in rows:
+            yield json.dumps(row) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def _search_params(data: dict) -> dict:
+    """
+    Extract vector search tuning parameters (ef_search / nprobe / rescore_factor)
+    from a request body; ValueError unless each given one is at least 1
+    """
+    return {key: _parse_limit(data[key], None, None, name=key)
+            for key in VECTOR_SEARCH_PARAMS if data.get(key) is not None}
+
+
+def _run_engines(tasks: dict, timeout_ms: float) -> dict:
+    """
+    Run engine searches concurrently on the shared executor
+    tasks maps an engine name to a zero-argument callable returning
+    (results, execution_time). Each engine gets timeout_ms; an engine that
+    fails or times out is reported with an error instead of failing the call.
+    Returns: {engine: response section}
+    """
+    futures = {name: search_executor.submit(task) for name, task in tasks.items()}
+    deadline = time.perf_counter() + timeout_ms / 1000
+    
+    sections = {}
+    for name, future in futures.items():
+        try:
+            results, execution_time = future.result(timeout=max(0, deadline - time.perf_counter()))
+            sections[name] = {
+                'results': results,
+                'execution_time': round(execution_time * 1000, 2),
+                'count': len(results)
+            }
+        except FutureTimeoutError:
+            # The search keeps running in the pool; its result is discarded
+            sections[name] = {
+                'results': [],
+                'count': 0,
+                'timed_out': True,
+                'error': f'{name} search timed out after {timeout_ms:g} ms'
+            }
+        except Exception as e:
+            sections[name] = {'results': [], 'count': 0, 'error': str(e)}
+    return sections
 
 
 @app.route('/')
@@ -28,55 +272,161 @@ def health_check():
     return jsonify({'status': 'healthy', 'message': 'API is running'})
 
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint: 200 once the vector engine has warmed up, 503 before"""
+    if vector_db.is_ready:
+        vector_status = 'ready'
+    elif vector_db.warm_up_error:
+        vector_status = 'failed'
+    else:
+        vector_status = 'warming_up'
+    
+    body = {
+        'ready': vector_db.is_ready,
+        'traditional': 'ready',
+        'vector': vector_status
+    }
+    if vector_db.warm_up_error:
+        body['error'] = vector_db.warm_up_error
+    if vector_db.warm_up_time is not None:
+        body['warm_up_time'] = round(vector_db.warm_up_time * 1000, 2)
+    return jsonify(body), 200 if vector_db.is_ready else 503
+
+
+def _ingest_conflict() -> tuple:
+    """409 response for a bulk write attempted while ingest_lock is held"""
+    # current_ingest may still be the finished previous load (or None) for
+    # a moment after the running one took the lock, and is not the holder
+    # at all while /api/initialize or /api/clear runs
+    running = current_ingest
+    status = running.report() if running is not None and running.end_time is None else None
+    return jsonify({'success': False, 'error': 'Another ingest, initialize or clear is running',
+                    'progress': status}), 409
+
+
 @app.route('/api/initialize', methods=['POST'])
 def initialize_databases():
     """Initialize both databases with sample data"""
+    # Wiping and reseeding must not interleave with a streaming ingest
+    if not ingest_lock.acquire(blocking=False):
+        return _ingest_conflict()
     try:
         # Clear existing data
         traditional_db.clear_all()
         vector_db.clear_all()
         
-        # Insert sample products
-        for product in SAMPLE_PRODUCTS:
-            traditional_db.insert_product(
-                product['name'],
-                product['description'],
-                product['category'],
-                product['price']
-            )
-            vector_db.insert_product(
-                product['name'],
-                product['description'],
-                product['category'],
-                product['price']
-            )
+        # Insert sample products in batches, timing each database
+        start_time = time.perf_counter()
+        trad_count = traditional_db.insert_products_bulk(SAMPLE_PRODUCTS)
+        trad_time = time.perf_counter() - start_time
+        
+        start_time = time.perf_counter()
+        vec_count = vector_db.insert_products_bulk(SAMPLE_PRODUCTS)
+        vec_time = time.perf_counter() - start_time
         
         return jsonify({
             'success': True,
-            'message': f'Initialized databases with {len(SAMPLE_PRODUCTS)} products'
+            'message': f'Initialized databases with {len(SAMPLE_PRODUCTS)} products',
+            'traditional': {
+                'count': trad_count,
+                'execution_time': round(trad_time * 1000, 2),
+                'rows_per_second': round(trad_count / trad_time, 1) if trad_time else None
+            },
+            'vector': {
+                'count': vec_count,
+                'execution_time': round(vec_time * 1000, 2),
+                'rows_per_second': round(vec_count / vec_time, 1) if vec_time else None
+            }
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        ingest_lock.release()
+
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_products():
+    """
+    Stream products from an NDJSON or CSV request body into both databases
+    The format comes from ?format= or the Content-Type (text/csv, otherwise
+    NDJSON); ?replace=1 clears both databases first.
+    """
+    global current_ingest
+    
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in INGEST_FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}', expected one of {INGEST_FORMATS}"}), 400
+    try:
+        batch_size = _parse_limit(request.args.get('batch_size'), INGEST_BATCH_SIZE, None, name='batch_size')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not ingest_lock.acquire(blocking=False):
+        return _ingest_conflict()
+    
+    try:
+        def progress(report):
+            print(f"[INFO] Ingest: {report['rows']} rows loaded ({report['rows_per_second']} rows/s)")
+        
+        # Published before clearing, so /api/ingest/status already shows this load
+        current_ingest = IngestPipeline(traditional_db, vector_db, batch_size=batch_size, progress=progress)
+        if request.args.get('replace') in ('1', 'true'):
+            traditional_db.clear_all()
+            vector_db.clear_all()
+        
+        # Decode the body line by line as it arrives; it is never held in memory whole
+        lines = (line.decode('utf-8') for line in request.stream)
+        try:
+            report = current_ingest.run(parse_products(lines, fmt))
+        except (ValueError, RuntimeError) as e:
+            return jsonify({'success': False, 'error': str(e), 'progress': current_ingest.report()}), 400
+        
+        return jsonify({'success': True, 'format': fmt, **report})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        ingest_lock.release()
+
+
+@app.route('/api/ingest/status', methods=['GET'])
+def ingest_status():
+    """Progress of the running (or last) streaming ingest"""
+    if current_ingest is None:
+        return jsonify({'running': False, 'progress': None})
+    # The lock may be held by /api/initialize or /api/clear instead
+    running = ingest_lock.locked() and current_ingest.end_time is None
+    return jsonify({'running': running, 'progress': current_ingest.report()})
 
 
 @app.route('/api/search/traditional', methods=['POST'])
 def search_traditional():
     """Search using traditional SQL database"""
     try:
-        data = request.get_json()
-        query = data.get('query', '')
+        timer = StageTimer()
+        with timer.stage('parse'):
+            data = request.get_json()
+            query = data.get('query', '')
+            
+            if not query:
+                return jsonify({'error': 'Query is required'}), 400
+            
+            filters = parse_filters(data.get('filters'))
+            limit = _parse_limit(data.get('limit'), SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+        if _wants_stream(data):
+            return _ndjson_response(traditional_db.iter_search_exact(query, filters, limit))
+        cached, cache_entry = _cached_search(data, query, filters=filters, limit=limit)
+        if cached is not None:
+            return cached
+        results, execution_time = traditional_db.search_exact(query, filters=filters, timer=timer, limit=limit)
         
-        if not query:
-            return jsonify({'error': 'Query is required'}), 400
-        
-        results, execution_time = traditional_db.search_exact(query)
-        
-        return jsonify({
+        return _search_response({
             'results': results,
             'execution_time': round(execution_time * 1000, 2),  # Convert to ms
             'count': len(results),
             'db_type': 'traditional'
-        })
+        }, timer, 'traditional', _wants_timings(data), cache_entry)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -84,21 +434,101 @@ def search_traditional():
 @app.route('/api/search/vector', methods=['POST'])
 def search_vector():
     """Search using vector database"""
+    try:
+        timer = StageTimer()
+        with timer.stage('parse'):
+            data = request.get_json()
+            query = data.get('query', '')
+            
+            if not query:
+                return jsonify({'error': 'Query is required'}), 400
+            
+            if not vector_db.is_ready:
+                return jsonify({'error': VECTOR_WARMING_UP}), 503
+            
+            filters = parse_filters(data.get('filters'))
+            search_params = _search_params(data)
+            limit = _parse_limit(data.get('limit'), SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+        if _wants_stream(data):
+            # The top-k is ranked as a whole; streaming only spares building the JSON document
+            results, _ = vector_db.search_semantic(query, limit, filters=filters, **search_params)
+            return _ndjson_response(results)
+        cached, cache_entry = _cached_search(data, query, filters=filters, limit=limit, **search_params)
+        if cached is not None:
+            return cached
+        results, execution_time = vector_db.search_semantic(query, limit, filters=filters, timer=timer,
+                                                            **search_params)
+        
+        return _search_response({
+            'results': results,
+            'execution_time': round(execution_time * 1000, 2),  # Convert to ms
+            'count': len(results),
+            'db_type': 'vector'
+        }, timer, 'vector', _wants_timings(data), cache_entry)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/search/vector/batch', methods=['POST'])
+def search_vector_batch():
+    """Search the vector database for many queries in one pass"""
     try:
         data = request.get_json()
-        query = data.get('query', '')
+        queries = data.get('queries', [])
         
-        if not query:
-            return jsonify({'error': 'Query is required'}), 400
+        if not queries or not isinstance(queries, list):
+            return jsonify({'error': 'Queries are required'}), 400
+        if len(queries) > MAX_BATCH_QUERIES:
+            return jsonify({'error': f'At most {MAX_BATCH_QUERIES} queries per batch'}), 400
+        if not vector_db.is_ready:
+            return jsonify({'error': VECTOR_WARMING_UP}), 503
         
-        results, execution_time = vector_db.search_semantic(query)
+        filters = parse_filters(data.get('filters'))
+        limit = _parse_limit(data.get('limit'), SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+        batch_results, timings = vector_db.search_semantic_batch(
+            [str(query) for query in queries], limit=limit, filters=filters, **_search_params(data))
+        # hydrate on a single store, merge on a sharded one
+        for stage in ('encode', 'score', 'hydrate', 'merge'):
+            if stage not in timings:
+                continue
+            REGISTRY.observe('search_stage_duration_seconds', timings[stage] / 1000,
+                             endpoint=request.url_rule.rule, engine='vector', stage=stage)
         
         return jsonify({
-            'results': results,
-            'execution_time': round(execution_time * 1000, 2),  # Convert to ms
-            'count': len(results),
+            'results': [
+                {'query': query, 'results': results, 'count': len(results)}
+                for query, results in zip(queries, batch_results)
+            ],
+            'timings': timings,
+            'execution_time': timings['total'],
+            'count': len(batch_results),
             'db_type': 'vector'
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/search/vector/recall', methods=['POST'])
+def search_vector_recall():
+    """Measure recall@k and latency of the ANN / quantized path against exact vector search"""
+    try:
+        data = request.get_json()
+        queries = data.get('queries', [])
+        
+        if not queries:
+            return jsonify({'error': 'Queries are required'}), 400
+        
+        if not vector_db.is_ready:
+            return jsonify({'error': VECTOR_WARMING_UP}), 503
+        
+        report = vector_db.evaluate_recall(queries, k=_parse_limit(data.get('k'), 10, MAX_SEARCH_LIMIT, name='k'), **_search_params(data))
+        return jsonify(report)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -113,22 +543,124 @@ def search_compare():
         if not query:
             return jsonify({'error': 'Query is required'}), 400
         
-        # Search in both databases
-        trad_results, trad_time = traditional_db.search_exact(query)
-        vec_results, vec_time = vector_db.search_semantic(query)
+        # Search both databases concurrently; while the vector engine warms up
+        # the traditional results are returned on their own
+        timeout_ms = float(data.get('timeout_ms', SEARCH_TIMEOUT_MS))
+        search_params = _search_params(data)
+        filters = parse_filters(data.get('filters'))
+        cached, cache_entry = _cached_search(data, query, filters=filters, **search_params)
+        if cached is not None:
+            return cached
+        # One timer per engine: the engines run on different threads
+        timers = {'traditional': StageTimer(), 'vector': StageTimer()}
+        tasks = {'traditional': lambda: traditional_db.search_exact(query, filters=filters,
+                                                                    timer=timers['traditional'])}
+        if vector_db.is_ready:
+            tasks['vector'] = lambda: vector_db.search_semantic(query, filters=filters, timer=timers['vector'],
+                                                                **search_params)
         
-        return jsonify({
-            'traditional': {
-                'results': trad_results,
-                'execution_time': round(trad_time * 1000, 2),
-                'count': len(trad_results)
-            },
-            'vector': {
-                'results': vec_results,
-                'execution_time': round(vec_time * 1000, 2),
-                'count': len(vec_results)
-            }
-        })
+        timer = StageTimer()
+        with timer.stage('engines'):
+            sections = _run_engines(tasks, timeout_ms)
+        sections.setdefault('vector', {'results': [], 'count': 0, 'error': VECTOR_WARMING_UP})
+        
+        include_timings = _wants_timings(data)
+        if any('error' in section for section in sections.values()):
+            # Partial results (warm-up, timeout, failure) are not worth replaying
+            cache_entry = None
+        for name, section in sections.items():
+            # A timed-out engine may still be writing to its timer
+            if name in tasks and 'error' not in section:
+                REGISTRY.observe_stages('search_stage_duration_seconds', timers[name],
+                                        endpoint=request.url_rule.rule, engine=name)
+                if include_timings:
+                    section['timings'] = timers[name].as_ms()
+        
+        return _search_response({
+            'traditional': sections['traditional'],
+            'vector': sections['vector'],
+            'wall_time': round(timer.stages['engines'] / 1e6, 2)
+        }, timer, 'compare', include_timings, cache_entry)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/search/hybrid', methods=['POST'])
+def search_hybrid():
+    """
+    One ranked list fused from traditional and vector shortlists
+    Body: query, limit, method ('rrf' or 'weighted'), candidates (an int or
+    {engine: int}), weights ({engine: float}), rrf_k, filters, timeout_ms
+    """
+    try:
+        timer = StageTimer()
+        with timer.stage('parse'):
+            data = request.get_json()
+            query = data.get('query', '')
+            
+            if not query:
+                return jsonify({'error': 'Query is required'}), 400
+            
+            limit = _parse_limit(data.get('limit'), SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+            method = data.get('method', 'rrf')
+            candidates = data.get('candidates', HYBRID_CANDIDATES)
+            if not isinstance(candidates, dict):
+                candidates = {'traditional': candidates, 'vector': candidates}
+            pool_sizes = {engine: _parse_limit(candidates.get(engine), HYBRID_CANDIDATES, MAX_SEARCH_LIMIT,
+                                               name='candidates')
+                          for engine in ('traditional', 'vector')}
+            weights = {engine: float(weight) for engine, weight in (data.get('weights') or {}).items()}
+            rrf_k = int(data.get('rrf_k', RRF_K))
+            timeout_ms = float(data.get('timeout_ms', SEARCH_TIMEOUT_MS))
+            search_params = _search_params(data)
+            filters = parse_filters(data.get('filters'))
+        cached, cache_entry = _cached_search(data, query, limit=limit, method=method, candidates=pool_sizes,
+                                             weights=weights, rrf_k=rrf_k, filters=filters, **search_params)
+        if cached is not None:
+            return cached
+        
+        # Each engine only returns a shortlist; both run concurrently
+        timers = {'traditional': StageTimer(), 'vector': StageTimer()}
+        tasks = {'traditional': lambda: traditional_db.search_exact(
+            query, filters=filters, timer=timers['traditional'], limit=pool_sizes['traditional'])}
+        if vector_db.is_ready:
+            tasks['vector'] = lambda: vector_db.search_semantic(
+                query, limit=pool_sizes['vector'], filters=filters, timer=timers['vector'], **search_params)
+        
+        with timer.stage('engines'):
+            sections = _run_engines(tasks, timeout_ms)
+        sections.setdefault('vector', {'results': [], 'count': 0, 'error': VECTOR_WARMING_UP})
+        
+        # Engines that failed are left out of the fusion rather than failing the request
+        with timer.stage('fuse'):
+            rankings = {name: section['results'] for name, section in sections.items() if 'error' not in section}
+            results = fuse(rankings, method=method, weights=weights, limit=limit, rrf_k=rrf_k)
+        
+        include_timings = _wants_timings(data)
+        if any('error' in section for section in sections.values()):
+            cache_entry = None
+        engines = {}
+        for name, section in sections.items():
+            engines[name] = {key: value for key, value in section.items() if key != 'results'}
+            if name in tasks and 'error' not in section:
+                REGISTRY.observe_stages('search_stage_duration_seconds', timers[name],
+                                        endpoint=request.url_rule.rule, engine=name)
+                if include_timings:
+                    engines[name]['timings'] = timers[name].as_ms()
+        
+        return _search_response({
+            'results': results,
+            'count': len(results),
+            'method': method,
+            'candidates': pool_sizes,
+            'engines': engines,
+            'execution_time': round(timer.elapsed_ns() / 1e6, 2),
+            'db_type': 'hybrid'
+        }, timer, 'hybrid', include_timings, cache_entry)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -142,18 +674,138 @@ def get_stats():
         
         return jsonify({
             'traditional': trad_stats,
-            'vector': vec_stats
+            'vector': vec_stats,
+            'response_cache': response_cache.stats()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/vector/shards', methods=['POST'])
+def resize_vector_shards():
+    """Add or remove vector shards (body: {"shards": n}); only products whose shard changes move"""
+    try:
+        if not isinstance(vector_db, ShardedVectorDB):
+            return jsonify({'error': 'The vector store is not sharded (set VECTOR_SHARDS)'}), 400
+        data = request.get_json() or {}
+        shards = int(data.get('shards', 0))
+        if shards < 1:
+            return jsonify({'error': 'shards must be at least 1'}), 400
+        
+        start_time = time.perf_counter()
+        moved = vector_db.resize(shards)
+        execution_time = time.perf_counter() - start_time
+        
+        return jsonify({
+            'success': True,
+            'shards': shards,
+            'moved': moved,
+            'execution_time': round(execution_time * 1000, 2)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Request, search stage and cache metrics in Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+PRODUCT_SOURCES = ('traditional', 'vector')
+
+
 @app.route('/api/products', methods=['GET'])
 def get_products():
-    """Get all products from traditional database"""
+    """
+    List products in id order, one keyset page at a time (?cursor=<next_cursor>)
+    ?format=ndjson streams every product after the cursor (up to ?limit) instead.
+    """
+    try:
+        source = request.args.get('source', 'traditional')
+        if source not in PRODUCT_SOURCES:
+            return jsonify({'error': f"Unknown source '{source}', expected one of {PRODUCT_SOURCES}"}), 400
+        db = traditional_db if source == 'traditional' else vector_db
+        after_id = parse_cursor(request.args.get('cursor'))
+        filters = parse_filters({
+            'category': request.args.getlist('category'),
+            'min_price': request.args.get('min_price') or None,
+            'max_price': request.args.get('max_price') or None
+        })
+        
+        if _wants_stream({}):
+            limit = _parse_limit(request.args.get('limit'), None, None)
+            return _ndjson_response(db.iter_products(after_id, limit, filters))
+        
+        limit = _parse_limit(request.args.get('limit'), 100, MAX_PAGE_SIZE)
+        products, next_cursor = db.get_products_page(after_id, limit, filters)
+        return jsonify({'products': products, 'count': len(products), 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+PRODUCT_FIELDS = ('name', 'description', 'category', 'price')
+
+
+@app.route('/api/products/<int:product_id>', methods=['PUT', 'PATCH'])
+def update_product(product_id):
+    """Update fields of one product in both databases (only changed text is re-embedded)"""
     try:
-        products = traditional_db.get_all_products(limit=100)
-        return jsonify({'products': products, 'count': len(products)})
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': f'Body must be a JSON object with any of {PRODUCT_FIELDS}'}), 400
+        unknown = set(data) - set(PRODUCT_FIELDS)
+        if unknown:
+            return jsonify({'error': f"Unknown field(s) {sorted(unknown)}, expected any of {PRODUCT_FIELDS}"}), 400
+        changes = {key: data[key] for key in PRODUCT_FIELDS if data.get(key) not in (None, '')}
+        if not changes:
+            return jsonify({'error': f'At least one of {PRODUCT_FIELDS} is required'}), 400
+        if 'price' in changes:
+            try:
+                changes['price'] = float(changes['price'])
+            except (TypeError, ValueError):
+                return jsonify({'error': f"price must be a number, got {changes['price']!r}"}), 400
+        
+        start_time = time.perf_counter()
+        traditional = traditional_db.update_product(product_id, **changes)
+        vector = vector_db.update_product(product_id, **changes)
+        execution_time = time.perf_counter() - start_time
+        
+        if not traditional and not vector:
+            return jsonify({'error': f'Product {product_id} not found'}), 404
+        return jsonify({
+            'success': True,
+            'id': product_id,
+            'updated': {'traditional': traditional, 'vector': vector},
+            'execution_time': round(execution_time * 1000, 2)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/products/<int:product_id>', methods=['DELETE'])
+def delete_product(product_id):
+    """Delete one product from both databases"""
+    try:
+        start_time = time.perf_counter()
+        traditional = traditional_db.delete_product(product_id)
+        vector = vector_db.delete_product(product_id)
+        execution_time = time.perf_counter() - start_time
+        
+        if not traditional and not vector:
+            return jsonify({'error': f'Product {product_id} not found'}), 404
+        return jsonify({
+            'success': True,
+            'id': product_id,
+            'deleted': {'traditional': traditional, 'vector': vector},
+            'execution_time': round(execution_time * 1000, 2)
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -161,12 +813,16 @@ def get_products():
 @app.route('/api/clear', methods=['POST'])
 def clear_databases():
     """Clear all data from both databases"""
+    if not ingest_lock.acquire(blocking=False):
+        return _ingest_conflict()
     try:
         traditional_db.clear_all()
         vector_db.clear_all()
         return jsonify({'success': True, 'message': 'Databases cleared'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    finally:
+        ingest_lock.release()
 
 
 if __name__ == '__main__':
@@ -185,8 +841,10 @@ if __name__ == '__main__':
     print()
     print("📡 API Endpoints:")
     print("   • http://localhost:8080/api/health")
+    print("   • http://localhost:8080/api/ready")
     print("   • http://localhost:8080/api/initialize")
     print("   • http://localhost:8080/api/search/compare")
+    print("   • http://localhost:8080/metrics")
     print()
     print("📝 Instructions:")
     print("   1. Open http://localhost:8080 in your browser")
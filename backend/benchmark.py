@@ -0,0 +1,408 @@
+"""
+Benchmark Module
+Measures ingest throughput, query latency (p50/p95/p99), memory footprint and
+recall@k of TraditionalDB.search_exact and every VectorDB search mode on a
+deterministic synthetic catalog, and writes the results as JSON.
+
+Usage (from backend/):
+    python benchmark.py --products 100000 --queries 200 --output bench.json
+
+Recall@k is measured against the exact float32 vector search, so for the
+traditional engine it is the share of the semantic top-k that keyword search
+also finds. With --shards N the catalog is also copied (pre-encoded) into an
+N-way sharded store and searched with scatter-gather.
+
+--encoders compares query encoder backends on the same catalog: encode
+latency, end-to-end search latency, recall@k and cosine agreement with the
+catalog encoder's query embeddings, plus deltas against the catalog encoder.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import tempfile
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from traditional_db import TraditionalDB
+from vector_db import VectorDB
+from sharding import ShardedVectorDB
+from encoders import ENCODER_BACKENDS
+from sample_data import generate_products, generate_queries
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# VectorDB configurations benchmarked against the same ingested data
+VECTOR_MODES = {
+    'exact': {},
+    'ivf': {'index_type': 'ivf'},
+    'hnsw': {'index_type': 'hnsw'},
+    'int8': {'storage_mode': 'int8'},
+    'binary': {'storage_mode': 'binary'},
+    'float32-mmap': {'mmap_matrix': True}
+}
+
+
+def latency_summary(samples: List[float]) -> Dict[str, Optional[float]]:
+    """Mean and p50/p95/p99 (ms) of latencies given in seconds"""
+    if not samples:
+        return {'mean': None, 'p50': None, 'p95': None, 'p99': None}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'mean': round(float(ms.mean()), 3),
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3)
+    }
+
+
+def recall_at_k(results: List[List[Dict[str, Any]]], truth: List[List[int]], k: int) -> Optional[float]:
+    """Mean share of each query's exact top-k ids found in its first k results"""
+    recalls = []
+    for found, expected in zip(results, truth):
+        if expected:
+            found_ids = {product['id'] for product in found[:k]}
+            recalls.append(len(found_ids.intersection(expected)) / len(expected))
+    return round(float(np.mean(recalls)), 4) if recalls else None
+
+
+def db_file_bytes(db_path: str) -> int:
+    """Size of a SQLite database including its WAL and shared-memory files"""
+    return sum(os.path.getsize(db_path + suffix) for suffix in ('', '-wal', '-shm')
+               if os.path.exists(db_path + suffix))
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+def _ingest(db, count: int, seed: int, batch_size: int) -> Dict[str, Any]:
+    """Bulk load the synthetic catalog into db, timing the whole load"""
+    start_time = time.perf_counter()
+    inserted = db.insert_products_bulk(generate_products(count, seed), batch_size=batch_size)
+    elapsed = time.perf_counter() - start_time
+    return {
+        'count': inserted,
+        'execution_time': round(elapsed * 1000, 2),
+        'rows_per_second': round(inserted / elapsed, 1) if elapsed else None
+    }
+
+
+def _run_queries(search, queries: List[str]) -> tuple[List[List[Dict[str, Any]]], List[float]]:
+    """Run search(query) for every query; returns (results per query, latencies in seconds)"""
+    results, latencies = [], []
+    for query in queries:
+        start_time = time.perf_counter()
+        found, _ = search(query)
+        latencies.append(time.perf_counter() - start_time)
+        results.append(found)
+    return results, latencies
+
+
+def benchmark_traditional(workdir: str, args, queries: List[str], truth: List[List[int]]) -> Dict[str, Any]:
+    """Ingest and query TraditionalDB"""
+    db_path = os.path.join(workdir, 'traditional.db')
+    db = TraditionalDB(db_path)
+    try:
+        ingest = _ingest(db, args.products, args.seed, args.batch_size)
+        results, latencies = _run_queries(db.search_exact, queries)
+        return {
+            'engine': 'traditional',
+            'search_engine': db.search_engine,
+            'ingest': ingest,
+            'latency_ms': latency_summary(latencies),
+            'recall_at_k': recall_at_k(results, truth, args.k),
+            'memory': {'db_file_bytes': db_file_bytes(db_path)}
+        }
+    finally:
+        db.close()
+
+
+def benchmark_vector_mode(db_path: str, mode: str, options: Dict[str, Any], args,
+                          queries: List[str], embeddings: Dict[str, np.ndarray],
+                          truth: List[List[int]]) -> Dict[str, Any]:
+    """
+    Query an already ingested vector database in one configuration
+    Query embeddings are pre-seeded into the query cache, so the latencies
+    cover scoring and hydration only (encoding is reported separately).
+    """
+    db = VectorDB(db_path, persistent_cache=False,
+                  query_cache_size=max(len(embeddings), 1024), **options)
+    try:
+        for query, embedding in embeddings.items():
+            db.query_cache.put(query, embedding)
+
+        # The first search builds the resident matrix / ANN index
+        start_time = time.perf_counter()
+        db.search_semantic(queries[0], limit=args.k)
+        first_query_time = time.perf_counter() - start_time
+
+        results, latencies = _run_queries(lambda query: db.search_semantic(query, limit=args.k), queries)
+        return {
+            'engine': f'vector:{mode}',
+            'options': options,
+            'search_engine': db.search_engine,
+            'first_query_ms': round(first_query_time * 1000, 2),
+            'latency_ms': latency_summary(latencies),
+            'recall_at_k': recall_at_k(results, truth, args.k),
+            'memory': db.memory_stats()
+        }
+    finally:
+        db.close()
+
+
+def _copy_encoded(source_path: str, db, batch_size: int) -> Dict[str, Any]:
+    """Load db with the products and stored embeddings of another vector database, keeping ids"""
+    start_time = time.perf_counter()
+    source = sqlite3.connect(source_path)
+    copied = 0
+    try:
+        cursor = source.execute("""
+            SELECT p.id, p.name, p.description, p.category, p.price, e.embedding
+            FROM products p
+            JOIN embeddings e ON e.product_id = p.id
+            ORDER BY p.id
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            products = [{'name': row[1], 'description': row[2], 'category': row[3], 'price': row[4]}
+                        for row in rows]
+            embeddings = np.vstack([np.frombuffer(row[5], dtype=np.float32) for row in rows])
+            db.insert_encoded_products(products, embeddings, [row[0] for row in rows])
+            copied += len(rows)
+    finally:
+        source.close()
+    elapsed = time.perf_counter() - start_time
+    return {
+        'count': copied,
+        'execution_time': round(elapsed * 1000, 2),
+        'rows_per_second': round(copied / elapsed, 1) if elapsed else None
+    }
+
+
+def benchmark_sharded(workdir: str, vector_path: str, args, queries: List[str],
+                      embeddings: Dict[str, np.ndarray], truth: List[List[int]]) -> Dict[str, Any]:
+    """Copy the ingested catalog into a sharded store and query it (embeddings pre-seeded as above)"""
+    db = ShardedVectorDB(os.path.join(workdir, 'sharded.db'), shards=args.shards, persistent_cache=False,
+                         query_cache_size=max(len(embeddings), 1024))
+    try:
+        load = _copy_encoded(vector_path, db, args.batch_size)
+        for query, embedding in embeddings.items():
+            db.query_cache.put(query, embedding)
+
+        start_time = time.perf_counter()
+        db.search_semantic(queries[0], limit=args.k)
+        first_query_time = time.perf_counter() - start_time
+
+        results, latencies = _run_queries(lambda query: db.search_semantic(query, limit=args.k), queries)
+        return {
+            'engine': 'vector:sharded',
+            'options': {'shards': args.shards},
+            'search_engine': db.search_engine,
+            'load': load,
+            'first_query_ms': round(first_query_time * 1000, 2),
+            'latency_ms': latency_summary(latencies),
+            'recall_at_k': recall_at_k(results, truth, args.k),
+            'memory': db.memory_stats()
+        }
+    finally:
+        db.close()
+
+
+def benchmark_encoder(vector_path: str, backend: str, args, queries: List[str],
+                      embeddings: Dict[str, np.ndarray], truth: List[List[int]]) -> Dict[str, Any]:
+    """
+    Encode every query with one encoder backend and search the exact float32
+    catalog with it; quality is measured against the catalog encoder
+    """
+    db = VectorDB(vector_path, persistent_cache=False, query_cache_size=0,
+                  encoder=backend, encoder_threads=args.encoder_threads)
+    try:
+        start_time = time.perf_counter()
+        db.encoder.encode(["warm up"])
+        load_time = time.perf_counter() - start_time
+
+        encode_latencies, cosines = [], []
+        for query in queries:
+            start_time = time.perf_counter()
+            embedding = db.encoder.encode([query])[0]
+            encode_latencies.append(time.perf_counter() - start_time)
+            cosines.append(float(embedding @ embeddings[query] / (np.linalg.norm(embedding) or 1.0)))
+
+        results, latencies = _run_queries(lambda query: db.search_semantic(query, limit=args.k), queries)
+        return {
+            'engine': f'encoder:{backend}',
+            'encoder': db.encoder.stats(),
+            'load_ms': round(load_time * 1000, 2),
+            'encode_ms': latency_summary(encode_latencies),
+            'search_latency_ms': latency_summary(latencies),
+            'recall_at_k': recall_at_k(results, truth, args.k),
+            'mean_cosine_to_reference': round(float(np.mean(cosines)), 4) if cosines else None
+        }
+    finally:
+        db.close()
+
+
+def encoder_deltas(results: List[Dict[str, Any]], reference: str) -> None:
+    """Annotate encoder results with speed-up and recall change against the reference backend"""
+    baseline = next((result for result in results if result['engine'] == f'encoder:{reference}'
+                     and 'error' not in result), None)
+    if baseline is None:
+        return
+    for result in results:
+        if 'error' in result:
+            continue
+        p50 = result['encode_ms']['p50']
+        result['delta_vs_reference'] = {
+            'reference': reference,
+            'encode_p50_speedup': round(baseline['encode_ms']['p50'] / p50, 2) if p50 else None,
+            'recall_at_k': round(result['recall_at_k'] - baseline['recall_at_k'], 4)
+            if result['recall_at_k'] is not None and baseline['recall_at_k'] is not None else None
+        }
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    """Run every engine on one synthetic catalog; returns the JSON report"""
+    workdir = tempfile.mkdtemp(prefix='vector-bench-', dir=args.workdir)
+    queries = generate_queries(args.queries, args.query_seed)
+    report = {
+        'config': {
+            'products': args.products,
+            'queries': args.queries,
+            'k': args.k,
+            'seed': args.seed,
+            'query_seed': args.query_seed,
+            'batch_size': args.batch_size,
+            'encoder_processes': args.encoder_processes,
+            'encoder': args.encoder,
+            'encoder_threads': args.encoder_threads,
+            'shards': args.shards
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'engines': []
+    }
+
+    try:
+        # Ingest once with the exact float32 configuration; every other vector
+        # mode is opened on the same database file
+        vector_path = os.path.join(workdir, 'vector.db')
+        db = VectorDB(vector_path, persistent_cache=False, encoder_processes=args.encoder_processes,
+                      encoder=args.encoder, encoder_threads=args.encoder_threads)
+        try:
+            print(f"[INFO] Ingesting {args.products} products into the vector database")
+            vector_ingest = _ingest(db, args.products, args.seed, args.batch_size)
+
+            # Exact top-k for every query: the recall ground truth
+            unique_queries = list(dict.fromkeys(queries))
+            exact_results, timings = db.search_semantic_batch(unique_queries, limit=args.k, exact=True)
+            truth_by_query = {query: [product['id'] for product in found]
+                              for query, found in zip(unique_queries, exact_results)}
+            embeddings = {query: db.query_cache.get(query) for query in unique_queries}
+            encode_ms = round(timings['encode'] / max(len(unique_queries), 1), 3)
+        finally:
+            db.close()
+        truth = [truth_by_query[query] for query in queries]
+
+        print("[INFO] Benchmarking traditional search")
+        report['engines'].append(benchmark_traditional(workdir, args, queries, truth))
+
+        for mode in args.modes:
+            print(f"[INFO] Benchmarking vector search ({mode})")
+            try:
+                result = benchmark_vector_mode(vector_path, mode, VECTOR_MODES[mode], args,
+                                               queries, embeddings, truth)
+            except Exception as e:
+                # e.g. hnswlib not installed
+                result = {'engine': f'vector:{mode}', 'options': VECTOR_MODES[mode], 'error': str(e)}
+            if mode == 'exact':
+                result['ingest'] = vector_ingest
+            result['encode_ms_per_query'] = encode_ms
+            report['engines'].append(result)
+
+        if args.shards:
+            print(f"[INFO] Benchmarking vector search ({args.shards} shards)")
+            result = benchmark_sharded(workdir, vector_path, args, queries, embeddings, truth)
+            result['encode_ms_per_query'] = encode_ms
+            report['engines'].append(result)
+
+        if args.encoders:
+            report['encoders'] = []
+            for backend in args.encoders:
+                print(f"[INFO] Benchmarking query encoder ({backend})")
+                try:
+                    result = benchmark_encoder(vector_path, backend, args, queries, embeddings, truth)
+                except Exception as e:
+                    # e.g. torch / the model not installed
+                    result = {'engine': f'encoder:{backend}', 'error': str(e)}
+                report['encoders'].append(result)
+            encoder_deltas(report['encoders'], args.encoder)
+
+        for result in report['engines']:
+            if result['engine'].startswith('vector:') and result['engine'] != 'vector:sharded':
+                result.setdefault('memory', {})['db_file_bytes'] = db_file_bytes(vector_path)
+        report['peak_rss_bytes'] = peak_rss_bytes()
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the traditional and vector search engines')
+    parser.add_argument('--products', type=int, default=10000, help='synthetic catalog size')
+    parser.add_argument('--queries', type=int, default=100, help='number of benchmark queries')
+    parser.add_argument('-k', type=int, default=10, help='results per query (recall@k)')
+    parser.add_argument('--seed', type=int, default=42, help='catalog generator seed')
+    parser.add_argument('--query-seed', type=int, default=7, help='query generator seed')
+    parser.add_argument('--batch-size', type=int, default=1000, help='ingest batch size')
+    parser.add_argument('--encoder-processes', type=int, default=0,
+                        help='encode the catalog on this many worker processes (0: in-process)')
+    parser.add_argument('--modes', nargs='+', default=list(VECTOR_MODES), choices=list(VECTOR_MODES),
+                        help='vector search modes to benchmark')
+    parser.add_argument('--encoder', choices=ENCODER_BACKENDS, default='sentence-transformers',
+                        help='encoder backend used for the catalog (and the reference for --encoders)')
+    parser.add_argument('--encoder-threads', type=int, default=None, help='torch intra-op threads')
+    parser.add_argument('--encoders', nargs='+', default=[], choices=ENCODER_BACKENDS,
+                        help='query encoder backends to compare against --encoder')
+    parser.add_argument('--shards', type=int, default=0,
+                        help='also benchmark a vector store sharded this many ways (0: skip)')
+    parser.add_argument('--workdir', default=None, help='directory for the temporary databases')
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark databases')
+    parser.add_argument('--output', default='-', help="JSON output file ('-' for stdout)")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    output = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"[INFO] Benchmark results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
+
+# Made with Bob
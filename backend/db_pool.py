@@ -0,0 +1,113 @@
+"""
+SQLite Connection Management Module
+Per-thread connections with WAL journaling, shared by both database modules
+"""
+import sqlite3
+import threading
+from typing import Callable, Dict, Optional
+
+
+# Applied to every new connection. WAL lets readers run while a writer is
+# active; synchronous=NORMAL is durable across application crashes in WAL mode.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,   # 256 MB memory-mapped I/O
+    'cache_size': -64 * 1024,         # 64 MB page cache (negative = KiB)
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000              # ms to wait for a competing writer
+}
+
+# Compiled statements kept per connection (sqlite3's prepared statement cache)
+STATEMENT_CACHE_SIZE = 256
+
+
+class _Lease:
+    """Holds a thread's connection; hands it back to the pool when the thread exits"""
+
+    def __init__(self, manager: 'ConnectionManager', conn: sqlite3.Connection):
+        self.manager = manager
+        self.conn = conn
+
+    def __del__(self):
+        try:
+            self.manager._release(self.conn)
+        except Exception:
+            # Interpreter shutdown or an already closed connection
+            pass
+
+
+class ConnectionManager:
+    """
+    Thread-affine SQLite connection pool
+    Each thread gets its own connection (so cursors are never shared between
+    request threads); when a thread exits its connection returns to an idle
+    pool and is reused by the next thread instead of being reopened.
+    """
+
+    def __init__(self, db_path: str, on_connect: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 pragmas: Optional[Dict[str, object]] = None, max_idle: int = 16):
+        self.db_path = db_path
+        self.on_connect = on_connect
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._idle = []
+        self._open = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new connection"""
+        # check_same_thread=False only so a connection can move to another
+        # thread through the idle pool; it is never used by two threads at once
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        if self.on_connect:
+            self.on_connect(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """The calling thread's connection"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is not None:
+            return lease.conn
+
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError(f"Connection manager for {self.db_path} is closed")
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+            with self._lock:
+                self._open.add(conn)
+
+        self._local.lease = _Lease(self, conn)
+        return conn
+
+    def _release(self, conn: sqlite3.Connection):
+        """Return a connection from a finished thread to the idle pool"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._open.discard(conn)
+        conn.close()
+
+    def close_all(self):
+        """Close every connection opened by this manager"""
+        with self._lock:
+            self._closed = True
+            connections = list(self._open)
+            self._open.clear()
+            self._idle.clear()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+# Made with Bob
@@ -0,0 +1,176 @@
+"""
+Embedding Cache Module
+Avoids re-running the embedding model for text it has already encoded
+"""
+import hashlib
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from db_pool import ConnectionManager
+
+
+def normalize_query(text: str, lowercase: bool = True) -> str:
+    """
+    Canonical form of a query used as a cache key
+    Collapses whitespace and (by default) lowercases; all-MiniLM-L6-v2 is an
+    uncased model, so lowercasing does not change the embedding.
+    """
+    text = ' '.join(text.split())
+    return text.lower() if lowercase else text
+
+
+class QueryEmbeddingCache:
+    """Bounded, thread-safe LRU cache of query text -> embedding"""
+
+    def __init__(self, max_size: int = 1024, lowercase: bool = True):
+        self.max_size = max_size
+        self.lowercase = lowercase
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, text: str) -> str:
+        """Cache key for a query"""
+        return normalize_query(text, self.lowercase)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for text, or None"""
+        key = self.key(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, text: str, embedding: np.ndarray):
+        """Store an embedding, evicting the least recently used entry if full"""
+        if self.max_size <= 0:
+            return
+        # Cached arrays are shared between callers, so make them read-only
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.flags.writeable = False
+        key = self.key(text)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics for the stats endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class PersistentEmbeddingStore:
+    """
+    On-disk embedding store keyed by a hash of (model name, text)
+    Lives in its own SQLite file so it survives VectorDB.clear_all(); re-seeding
+    a catalog whose text has not changed then costs lookups instead of encoding.
+    """
+
+    # Keys per IN (...) lookup; stays under SQLite's default variable limit
+    LOOKUP_CHUNK = 500
+
+    def __init__(self, path: str, model_name: str, embedding_dim: int):
+        self.path = path
+        self.model_name = model_name
+        self.embedding_dim = embedding_dim
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.pool = ConnectionManager(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                content_hash TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    @property
+    def conn(self):
+        """The calling thread's database connection"""
+        return self.pool.connection()
+
+    def content_hash(self, text: str) -> str:
+        """Stable key for a text embedded with this store's model"""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """
+        Look up embeddings for texts
+        Returns: {position in texts: embedding} for the texts that were found
+        """
+        hashes = [self.content_hash(text) for text in texts]
+        found = {}
+        for start in range(0, len(hashes), self.LOOKUP_CHUNK):
+            chunk = list(set(hashes[start:start + self.LOOKUP_CHUNK]))
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(f"""
+                SELECT content_hash, embedding FROM embedding_cache
+                WHERE content_hash IN ({placeholders})
+            """, chunk).fetchall()
+            found.update((row['content_hash'], row['embedding']) for row in rows)
+
+        result = {}
+        for i, content_hash in enumerate(hashes):
+            blob = found.get(content_hash)
+            if blob is not None and len(blob) == self.embedding_dim * 4:
+                result[i] = np.frombuffer(blob, dtype=np.float32)
+        with self._lock:
+            self.hits += len(result)
+            self.misses += len(texts) - len(result)
+        return result
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        """Store embeddings for texts (one transaction)"""
+        rows = [(self.content_hash(text), np.asarray(embedding, dtype=np.float32).tobytes())
+                for text, embedding in zip(texts, embeddings)]
+        conn = self.conn
+        conn.executemany("""
+            INSERT OR REPLACE INTO embedding_cache (content_hash, embedding)
+            VALUES (?, ?)
+        """, rows)
+        conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Store statistics for the stats endpoint"""
+        size = self.conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def close(self):
+        """Close the store's database connections"""
+        self.pool.close_all()
+
+# Made with Bob
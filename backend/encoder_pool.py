@@ -0,0 +1,119 @@
+"""
+Encoder Pool Module
+Multi-process embedding for bulk loads. Text batches are split into chunks
+and sharded across worker processes, each with its own model copy and a
+bounded number of torch intra-op threads. Workers write their rows straight
+into one shared-memory output array instead of pickling results back.
+"""
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from typing import List, Optional
+
+from encoders import create_encoder
+
+# Encoder loaded once per worker process by _init_worker
+_worker_encoder = None
+
+
+def _init_worker(backend: str, model_name: str, embedding_dim: int, threads: int):
+    """Worker initializer: cap intra-op threads, then load the encoder"""
+    global _worker_encoder
+    # Must be set before torch is imported to bound OpenMP / MKL pools
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_encoder = create_encoder(backend, model_name, embedding_dim)
+    _worker_encoder.load()
+
+
+def _encode_into(shm_name: str, shape: tuple, start: int, texts: List[str], batch_size: int) -> int:
+    """Encode texts into rows start.. of the shared output array; returns rows written"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        output = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        output[start:start + len(texts)] = _worker_encoder.encode(texts, batch_size=batch_size)
+        del output
+    finally:
+        shm.close()
+    return len(texts)
+
+
+class EncoderPool:
+    """
+    Process pool that encodes text batches with one model copy per worker
+    Workers are spawned (not forked, which is unsafe once torch has started
+    threads) on first use and load the model once, with the same encoder
+    backend as the parent (see encoders.ENCODER_BACKENDS).
+    """
+
+    def __init__(self, model_name: str, embedding_dim: int, processes: Optional[int] = None,
+                 threads_per_process: Optional[int] = None, chunk_size: int = 256, batch_size: int = 64,
+                 backend: str = 'sentence-transformers'):
+        cpus = os.cpu_count() or 1
+        self.backend = backend
+        self.model_name = model_name
+        self.embedding_dim = embedding_dim
+        self.processes = processes or cpus
+        # Split the cores between workers so they do not oversubscribe them
+        self.threads_per_process = threads_per_process or max(1, cpus // self.processes)
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.backend, self.model_name, self.embedding_dim, self.threads_per_process)
+            )
+        return self._executor
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embeddings for texts (one row each, in order)"""
+        shape = (len(texts), self.embedding_dim)
+        if not texts:
+            return np.empty(shape, dtype=np.float32)
+
+        shm = shared_memory.SharedMemory(create=True, size=len(texts) * self.embedding_dim * 4)
+        try:
+            # Chunks small enough that every worker gets work, large enough to batch well
+            chunk = max(1, min(self.chunk_size, -(-len(texts) // self.processes)))
+            executor = self._get_executor()
+            futures = [executor.submit(_encode_into, shm.name, shape, start,
+                                       texts[start:start + chunk], self.batch_size)
+                       for start in range(0, len(texts), chunk)]
+            for future in futures:
+                future.result()
+            output = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+            embeddings = output.copy()
+            del output
+            return embeddings
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def stats(self) -> dict:
+        """Pool configuration for the stats endpoint"""
+        return {
+            'backend': self.backend,
+            'processes': self.processes,
+            'threads_per_process': self.threads_per_process,
+            'chunk_size': self.chunk_size,
+            'started': self._executor is not None
+        }
+
+    def close(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+# Made with Bob
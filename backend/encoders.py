@@ -0,0 +1,168 @@
+"""
+Encoders Module
+Pluggable text encoders for VectorDB. Every backend turns a list of texts
+into a float32 (n, embedding_dim) matrix and loads its model lazily.
+
+Backends:
+- sentence-transformers: the full-precision model (default)
+- quantized:  the same model with its Linear layers dynamically quantized to
+              int8 (weights stored as int8, activations quantized per
+              batch); faster on CPU at a small cost in embedding fidelity
+- stub:       deterministic hashed bag-of-words vectors with no model or
+              torch; for tests and for benchmarking everything but the model
+"""
+import hashlib
+import threading
+import time
+import numpy as np
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+ENCODER_BACKENDS = ('sentence-transformers', 'quantized', 'stub')
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+
+
+class Encoder:
+    """Base class: lazily loaded text -> embedding model"""
+
+    backend = None
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, embedding_dim: int = 384,
+                 threads: Optional[int] = None):
+        self.model_name = model_name
+        self.embedding_dim = embedding_dim
+        self.threads = threads
+        self.load_time = None
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the embeddings this encoder produces (keys the persistent embedding store)"""
+        return self.model_name
+
+    @property
+    def loaded(self) -> bool:
+        return True
+
+    def load(self):
+        """Load the model now rather than on the first encode"""
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Embeddings for texts, one float32 row each"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Encoder configuration for the stats endpoint"""
+        return {
+            'backend': self.backend,
+            'model_name': self.model_name,
+            'embedding_dim': self.embedding_dim,
+            'threads': self.threads,
+            'loaded': self.loaded,
+            'load_time': round(self.load_time * 1000, 2) if self.load_time is not None else None
+        }
+
+
+class SentenceTransformerEncoder(Encoder):
+    """
+    Full-precision sentence-transformers model
+    threads sets torch's intra-op thread count, which is process-wide.
+    """
+
+    backend = 'sentence-transformers'
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, embedding_dim: int = 384,
+                 threads: Optional[int] = None):
+        super().__init__(model_name, embedding_dim, threads)
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def _build(self):
+        # Deferred import: pulls in torch, which dominates start-up time
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name)
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start_time = time.perf_counter()
+                    if self.threads:
+                        import torch
+                        torch.set_num_threads(self.threads)
+                    self._model = self._build()
+                    self.load_time = time.perf_counter() - start_time
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        self.load()
+        embeddings = self._model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), self.embedding_dim)
+
+
+class QuantizedEncoder(SentenceTransformerEncoder):
+    """The sentence-transformers model with dynamically int8-quantized Linear layers (CPU only)"""
+
+    backend = 'quantized'
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.model_name}:int8-dynamic"
+
+    def _build(self):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(self.model_name, device='cpu')
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+@lru_cache(maxsize=65536)
+def _token_vector(token: str, dim: int) -> np.ndarray:
+    """Fixed pseudo-random unit vector for a token"""
+    seed = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    vector.flags.writeable = False
+    return vector
+
+
+class StubEncoder(Encoder):
+    """
+    Deterministic hashed bag-of-words encoder
+    Texts sharing words get similar vectors, so searches still return
+    sensible results; the same text always maps to the same vector on any
+    machine. Not comparable with model embeddings.
+    """
+
+    backend = 'stub'
+
+    def __init__(self, model_name: str = 'stub', embedding_dim: int = 384, threads: Optional[int] = None):
+        super().__init__(model_name, embedding_dim, threads)
+
+    @property
+    def cache_key(self) -> str:
+        return f"stub-{self.embedding_dim}"
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.embedding_dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in text.lower().split():
+                token = token.strip('.,;:!?()"\'')
+                if token:
+                    embeddings[i] += _token_vector(token, self.embedding_dim)
+        return embeddings
+
+
+def create_encoder(backend: str = 'sentence-transformers', model_name: str = DEFAULT_MODEL,
+                   embedding_dim: int = 384, threads: Optional[int] = None) -> Encoder:
+    """Create an encoder for the given backend (see ENCODER_BACKENDS)"""
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}', expected one of {ENCODER_BACKENDS}")
+    if backend == 'stub':
+        return StubEncoder(embedding_dim=embedding_dim, threads=threads)
+    encoder_class = QuantizedEncoder if backend == 'quantized' else SentenceTransformerEncoder
+    return encoder_class(model_name, embedding_dim, threads)
+
+# Made with Bob
@@ -0,0 +1,62 @@
+"""
+Search Filter Module
+Category and price predicates shared by both database modules
+"""
+from typing import Any, Dict, List, Optional
+
+
+FILTER_KEYS = ('category', 'min_price', 'max_price')
+
+
+def parse_filters(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Validate and normalize a filters dict
+    category may be a string or a list of strings; min_price / max_price are
+    inclusive bounds. Returns None when no filter is set.
+    Raises ValueError for unknown keys or malformed values.
+    """
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter(s) {sorted(unknown)}, expected any of {FILTER_KEYS}")
+
+    parsed = {}
+    category = filters.get('category')
+    if category:
+        categories = [category] if isinstance(category, str) else list(category)
+        if not all(isinstance(c, str) for c in categories):
+            raise ValueError("category filter must be a string or a list of strings")
+        parsed['category'] = categories
+    for key in ('min_price', 'max_price'):
+        if filters.get(key) is not None:
+            parsed[key] = float(filters[key])
+
+    return parsed or None
+
+
+def filter_clause(filters: Optional[Dict[str, Any]], alias: str = '') -> tuple[str, List[Any]]:
+    """
+    SQL predicate for parsed filters over the products table
+    Returns: (sql, params); sql is '1' when there is nothing to filter
+    """
+    if not filters:
+        return '1', []
+
+    prefix = f"{alias}." if alias else ''
+    clauses, params = [], []
+    if 'category' in filters:
+        clauses.append(f"{prefix}category IN ({','.join('?' * len(filters['category']))})")
+        params.extend(filters['category'])
+    if 'min_price' in filters:
+        clauses.append(f"{prefix}price >= ?")
+        params.append(filters['min_price'])
+    if 'max_price' in filters:
+        clauses.append(f"{prefix}price <= ?")
+        params.append(filters['max_price'])
+    return ' AND '.join(clauses), params
+
+# Made with Bob
@@ -0,0 +1,71 @@
+"""
+Hybrid Search Module
+Fuses the ranked shortlists of the traditional and vector engines into one
+list, rewarding products that rank well for keywords, meaning, or both.
+
+Fusion methods:
+- rrf:      reciprocal rank fusion, score = sum(weight / (rrf_k + rank))
+- weighted: weighted sum of per-engine scores min-max normalized to [0, 1]
+            (vector similarity; traditional results carry no score, so their
+            rank is used: 1 for the first hit down to 1/n for the last)
+"""
+from typing import Any, Dict, List, Optional
+
+FUSION_METHODS = ('rrf', 'weighted')
+
+# Rank offset of reciprocal rank fusion; damps the weight of the very top ranks
+RRF_K = 60
+
+
+def _normalized_scores(results: List[Dict[str, Any]]) -> List[float]:
+    """Per-result scores in [0, 1] for weighted fusion"""
+    if not results:
+        return []
+    if all('similarity' in product for product in results):
+        scores = [product['similarity'] for product in results]
+        low, high = min(scores), max(scores)
+        if high == low:
+            return [1.0] * len(scores)
+        return [(score - low) / (high - low) for score in scores]
+    count = len(results)
+    return [(count - rank) / count for rank in range(count)]
+
+
+def fuse(rankings: Dict[str, List[Dict[str, Any]]], method: str = 'rrf',
+         weights: Optional[Dict[str, float]] = None, limit: int = 20, rrf_k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merge per-engine rankings (engine -> results best first) by product id
+    Returns: the top limit products, each with hybrid_score and its 1-based
+    rank per engine under 'ranks' (engines that missed it are absent)
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method '{method}', expected one of {FUSION_METHODS}")
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    if rrf_k < 0:
+        raise ValueError("rrf_k must not be negative")
+    weights = weights or {}
+
+    fused = {}
+    for engine, results in rankings.items():
+        weight = float(weights.get(engine, 1.0))
+        if method == 'rrf':
+            contributions = [weight / (rrf_k + rank) for rank in range(1, len(results) + 1)]
+        else:
+            contributions = [weight * score for score in _normalized_scores(results)]
+
+        for rank, (product, contribution) in enumerate(zip(results, contributions), start=1):
+            entry = fused.get(product['id'])
+            if entry is None:
+                entry = fused[product['id']] = {**product, 'hybrid_score': 0.0, 'ranks': {}}
+            elif 'similarity' in product:
+                entry['similarity'] = product['similarity']
+            entry['hybrid_score'] += contribution
+            entry['ranks'][engine] = rank
+
+    ranked = sorted(fused.values(), key=lambda entry: entry['hybrid_score'], reverse=True)[:limit]
+    for entry in ranked:
+        entry['hybrid_score'] = round(entry['hybrid_score'], 6)
+    return ranked
+
+# Made with Bob
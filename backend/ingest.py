@@ -0,0 +1,256 @@
+"""
+Streaming Ingest Module
+Loads products from NDJSON or CSV into both databases with a two-stage
+pipeline: the calling thread parses and encodes batches, a writer thread
+inserts them into TraditionalDB and VectorDB. A bounded queue between the
+stages lets model encoding and SQLite I/O overlap while keeping at most
+queue_size batches in memory, however large the input is.
+
+Usage (from backend/, with the server stopped):
+    python ingest.py products.ndjson
+    python ingest.py products.csv --batch-size 500 --replace
+"""
+import argparse
+import csv
+import json
+import queue
+import sys
+import threading
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from encoders import ENCODER_BACKENDS
+
+PRODUCT_FIELDS = ('name', 'description', 'category', 'price')
+INGEST_FORMATS = ('ndjson', 'csv')
+
+
+def validate_product(record: Any, line: int) -> Dict[str, Any]:
+    """Check one input record and normalize it to a product dict"""
+    if not isinstance(record, dict):
+        raise ValueError(f"Line {line}: expected an object with {PRODUCT_FIELDS}")
+    missing = [field for field in PRODUCT_FIELDS if record.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"Line {line}: missing {missing}")
+    try:
+        price = float(record['price'])
+    except (TypeError, ValueError):
+        raise ValueError(f"Line {line}: price must be a number, got {record['price']!r}")
+    return {
+        'name': str(record['name']),
+        'description': str(record['description']),
+        'category': str(record['category']),
+        'price': price
+    }
+
+
+def parse_ndjson(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Products from newline-delimited JSON, one object per line (blank lines are skipped)"""
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line_number}: invalid JSON ({e.msg})")
+        yield validate_product(record, line_number)
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Products from CSV with a header row naming at least name, description, category and price"""
+    reader = csv.DictReader(lines)
+    missing = [field for field in PRODUCT_FIELDS if field not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV header is missing {missing}")
+    for record in reader:
+        yield validate_product(record, reader.line_num)
+
+
+def parse_products(lines: Iterable[str], fmt: str) -> Iterator[Dict[str, Any]]:
+    """Products parsed incrementally from text lines in the given format"""
+    if fmt == 'ndjson':
+        return parse_ndjson(lines)
+    if fmt == 'csv':
+        return parse_csv(lines)
+    raise ValueError(f"Unknown ingest format '{fmt}', expected one of {INGEST_FORMATS}")
+
+
+class IngestPipeline:
+    """
+    Parse/encode stage on the calling thread, write stage on a worker thread
+    progress(report) is called from the writer after every committed batch.
+    """
+
+    def __init__(self, traditional_db, vector_db, batch_size: int = 500, queue_size: int = 4,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        if batch_size < 1 or queue_size < 1:
+            raise ValueError("batch_size and queue_size must be at least 1")
+        self.traditional_db = traditional_db
+        self.vector_db = vector_db
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.progress = progress
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.batches = 0
+        self.encode_time = 0.0
+        self.write_time = 0.0
+        self.start_time = None
+        self.end_time = None
+        self.error = None
+
+    def report(self) -> Dict[str, Any]:
+        """Progress so far; busy times per stage show how well they overlap"""
+        with self._lock:
+            if self.start_time is None:
+                elapsed = 0.0
+            else:
+                elapsed = (self.end_time or time.perf_counter()) - self.start_time
+            return {
+                'rows': self.rows,
+                'batches': self.batches,
+                'elapsed': round(elapsed * 1000, 2),
+                'rows_per_second': round(self.rows / elapsed, 1) if elapsed else None,
+                'encode_time': round(self.encode_time * 1000, 2),
+                'write_time': round(self.write_time * 1000, 2),
+                'error': self.error
+            }
+
+    def _write(self, batches: queue.Queue, failed: threading.Event):
+        """Writer stage: drain encoded batches into both databases"""
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            if failed.is_set():
+                # Keep draining so the producer never blocks on a full queue
+                continue
+            batch, embeddings = item
+            product_ids = None
+            try:
+                start_time = time.perf_counter()
+                # The vector database takes the ids the traditional one
+                # assigned, so both keep addressing a product by the same id
+                product_ids = self.traditional_db.insert_products_batch(batch)
+                self.vector_db.insert_encoded_products(batch, embeddings, product_ids)
+                elapsed = time.perf_counter() - start_time
+            except Exception as e:
+                if product_ids is not None:
+                    self._discard(product_ids)
+                with self._lock:
+                    self.error = str(e)
+                failed.set()
+                continue
+            with self._lock:
+                self.rows += len(batch)
+                self.batches += 1
+                self.write_time += elapsed
+            if self.progress:
+                self.progress(self.report())
+
+    def _discard(self, product_ids: List[int]):
+        """
+        Remove a batch whose vector write failed from both databases (a
+        sharded vector store may have committed it on some shards)
+        """
+        for db in (self.traditional_db, self.vector_db):
+            try:
+                db.delete_products(product_ids)
+            except Exception as e:
+                print(f"[ERROR] Could not remove a failed ingest batch: {e}", file=sys.stderr)
+
+    def run(self, products: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Load products; returns the final report
+        Raises the first parse, encode or write error after the batches before
+        it have been committed (report() then shows how many rows landed).
+        """
+        self.start_time = time.perf_counter()
+        batches = queue.Queue(maxsize=self.queue_size)
+        failed = threading.Event()
+        writer = threading.Thread(target=self._write, args=(batches, failed), name='ingest-writer', daemon=True)
+        writer.start()
+
+        products = iter(products)
+        try:
+            while not failed.is_set():
+                batch = list(islice(products, self.batch_size))
+                if not batch:
+                    break
+                start_time = time.perf_counter()
+                embeddings = self.vector_db.encode_products(batch)
+                with self._lock:
+                    self.encode_time += time.perf_counter() - start_time
+                batches.put((batch, embeddings))
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+            raise
+        finally:
+            batches.put(None)
+            writer.join()
+            self.end_time = time.perf_counter()
+
+        report = self.report()
+        if failed.is_set():
+            raise RuntimeError(f"Ingest stopped after {report['rows']} rows: {report['error']}")
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream products from NDJSON or CSV into both databases')
+    parser.add_argument('path', help="input file ('-' for stdin)")
+    parser.add_argument('--format', choices=INGEST_FORMATS,
+                        help='input format (default: from the file extension, else ndjson)')
+    parser.add_argument('--batch-size', type=int, default=500, help='products per encode/write batch')
+    parser.add_argument('--queue-size', type=int, default=4, help='encoded batches buffered between stages')
+    parser.add_argument('--replace', action='store_true', help='clear both databases first')
+    parser.add_argument('--encoder-processes', type=int, default=0,
+                        help='encode on this many worker processes (0: in-process)')
+    parser.add_argument('--encoder', choices=ENCODER_BACKENDS, default='sentence-transformers',
+                        help='text encoder backend (use the one the server runs with)')
+    parser.add_argument('--shards', type=int, default=0,
+                        help='load into a vector store sharded this many ways (0: unsharded)')
+    args = parser.parse_args()
+    if args.batch_size < 1 or args.queue_size < 1:
+        parser.error('--batch-size and --queue-size must be at least 1')
+
+    fmt = args.format or ('csv' if args.path.lower().endswith('.csv') else 'ndjson')
+
+    # Imported here so --help does not load the databases
+    from traditional_db import TraditionalDB
+    from vector_db import VectorDB
+    from sharding import ShardedVectorDB
+    traditional_db = TraditionalDB()
+    options = {'encoder_processes': args.encoder_processes, 'encoder': args.encoder}
+    vector_db = ShardedVectorDB(shards=args.shards, **options) if args.shards else VectorDB(**options)
+
+    def progress(report: Dict[str, Any]):
+        print(f"[INFO] {report['rows']} rows loaded ({report['rows_per_second']} rows/s)", file=sys.stderr)
+
+    pipeline = IngestPipeline(traditional_db, vector_db, batch_size=args.batch_size,
+                              queue_size=args.queue_size, progress=progress)
+    source = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+    try:
+        if args.replace:
+            traditional_db.clear_all()
+            vector_db.clear_all()
+        report = pipeline.run(parse_products(source, fmt))
+    except (ValueError, RuntimeError) as e:
+        print(f"[ERROR] {e} ({pipeline.report()['rows']} rows committed)", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        traditional_db.close()
+        vector_db.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
+
+# Made with Bob
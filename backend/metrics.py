@@ -0,0 +1,175 @@
+"""
+Metrics Module
+Per-stage request timing (perf_counter_ns) and a small in-process registry of
+counters and histograms rendered in the Prometheus text exposition format
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+
+# Histogram bucket upper bounds in seconds (0.25 ms .. 10 s)
+DEFAULT_BUCKETS = (0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageTimer:
+    """
+    Records how long each named stage of one request takes
+    Stages are timed with perf_counter_ns; a stage entered more than once
+    accumulates. Not thread-safe: use one timer per engine per request.
+    """
+
+    def __init__(self):
+        self.start_ns = time.perf_counter_ns()
+        self.stages: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the body of a with-block as stage name"""
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter_ns() - start_ns)
+
+    def record(self, name: str, duration_ns: int):
+        """Add duration_ns to stage name"""
+        self.stages[name] = self.stages.get(name, 0) + duration_ns
+
+    def elapsed_ns(self) -> int:
+        """Nanoseconds since the timer was created"""
+        return time.perf_counter_ns() - self.start_ns
+
+    def elapsed(self) -> float:
+        """Seconds since the timer was created"""
+        return self.elapsed_ns() / 1e9
+
+    def as_ms(self) -> Dict[str, float]:
+        """Stage durations plus 'total' in milliseconds, in the order recorded"""
+        timings = {name: round(ns / 1e6, 3) for name, ns in self.stages.items()}
+        timings['total'] = round(self.elapsed_ns() / 1e6, 3)
+        return timings
+
+    def server_timing(self, prefix: str = '') -> str:
+        """Stages as a Server-Timing header value (durations in ms)"""
+        return ', '.join(f"{prefix}{name};dur={ns / 1e6:.3f}" for name, ns in self.stages.items())
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class MetricsRegistry:
+    """Thread-safe counters, histograms and scrape-time gauges"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # name -> (type, help)
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        # name -> {label key: value}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        # name -> {label key: [per-bucket counts, sum, count]}
+        self._histograms: Dict[str, Dict[tuple, list]] = {}
+        # name -> callable returning a value or {labels tuple: value}
+        self._callbacks: Dict[str, Callable[[], object]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str):
+        """Declare a metric's type ('counter', 'histogram' or 'gauge') and help text"""
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increment a counter"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Record one observation in a histogram"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += seconds
+            state[2] += 1
+
+    def observe_stages(self, name: str, timer: StageTimer, **labels):
+        """Record every stage of a timer in histogram name, labelled stage=<stage>"""
+        for stage, duration_ns in timer.stages.items():
+            self.observe(name, duration_ns / 1e9, stage=stage, **labels)
+
+    def gauge(self, name: str, help_text: str, callback: Callable[[], object], kind: str = 'gauge'):
+        """
+        Register a value read at scrape time
+        callback returns a number, or a dict mapping label tuples
+        ((name, value), ...) to numbers
+        """
+        self.describe(name, kind, help_text)
+        self._callbacks[name] = callback
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {key: (list(state[0]), state[1], state[2]) for key, state in series.items()}
+                          for name, series in self._histograms.items()}
+
+        lines = []
+
+        def header(name: str, default_kind: str):
+            kind, help_text = self._meta.get(name, (default_kind, ''))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name in sorted(counters):
+            header(name, 'counter')
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+        for name in sorted(histograms):
+            header(name, 'histogram')
+            for key, (bucket_counts, total, count) in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total:.9g}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+
+        for name in sorted(self._callbacks):
+            try:
+                value = self._callbacks[name]()
+            except Exception:
+                # A failing gauge must not break the scrape
+                continue
+            header(name, 'gauge')
+            values = value if isinstance(value, dict) else {(): value}
+            for key, number in sorted(values.items()):
+                lines.append(f"{name}{_format_labels(tuple(key))} {float(number):g}")
+
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry exposed by the /metrics endpoint
+REGISTRY = MetricsRegistry()
+
+# Made with Bob
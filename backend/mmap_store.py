@@ -0,0 +1,160 @@
+"""
+Memory-Mapped Matrix Store Module
+Flat on-disk copy of VectorDB's resident search matrix, opened with np.memmap.
+
+A restart maps the files instead of reading and copying every embedding BLOB
+out of SQLite, and several worker processes mapping the same files share one
+physical copy through the page cache.
+
+Files (for data/vector.db):
+- data/vector.matrix.meta.json   row count, storage mode, dimension and version stamp
+- data/vector.matrix.ids.bin     int64 product ids
+- data/vector.matrix.codes.bin   one encoded row per product (see quantization.py)
+- data/vector.matrix.scales.bin  float32 per-row scales (int8 mode only)
+
+The row count in the meta file is authoritative: bytes past it (e.g. from an
+interrupted append) are ignored and truncated by the next write. The version
+stamp is the owner's data version the rows were last known to reflect
+exactly; appends and rewrites clear it until the owner stamps it again.
+"""
+import json
+import os
+import numpy as np
+from typing import Optional
+
+from quantization import quantize
+
+
+class MatrixSidecar:
+    """Memory-mapped columns (ids, codes and, in int8 mode, scales); rows are appended or patched in place"""
+
+    def __init__(self, db_path: str, storage_mode: str, dim: int):
+        self.base = os.path.splitext(db_path)[0] + '.matrix'
+        self.storage_mode = storage_mode
+        self.dim = dim
+        self.meta_path = self.base + '.meta.json'
+
+        # Row layout of each column: (dtype, per-row shape)
+        sample_codes, sample_scales = quantize(np.zeros((1, dim), dtype=np.float32), storage_mode)
+        self.columns = {
+            'ids': (np.dtype(np.int64), ()),
+            'codes': (sample_codes.dtype, sample_codes.shape[1:])
+        }
+        if sample_scales is not None:
+            self.columns['scales'] = (sample_scales.dtype, ())
+
+    def _column_path(self, name: str) -> str:
+        return f"{self.base}.{name}.bin"
+
+    def _row_bytes(self, name: str) -> int:
+        dtype, shape = self.columns[name]
+        return dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+
+    def _read_meta(self) -> Optional[dict]:
+        """Contents of the meta file, or None if missing or for another layout"""
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        if meta.get('storage_mode') != self.storage_mode or meta.get('dim') != self.dim:
+            return None
+        return meta
+
+    def _read_count(self) -> Optional[int]:
+        """Row count from the meta file, or None if missing or for another layout"""
+        meta = self._read_meta()
+        return meta['count'] if meta is not None else None
+
+    def _write_count(self, count: int, version: Optional[int] = None):
+        """Atomically publish a new row count (and version stamp, cleared by default)"""
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'count': count, 'storage_mode': self.storage_mode, 'dim': self.dim,
+                       'version': version}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def version(self) -> Optional[int]:
+        """Version stamp of the stored rows (None if unstamped or missing)"""
+        meta = self._read_meta()
+        return meta.get('version') if meta is not None else None
+
+    def stamp(self, version: int):
+        """Record that the stored rows reflect the owner's data at version"""
+        count = self._read_count()
+        if count is not None:
+            self._write_count(count, version)
+
+    def open(self) -> Optional[tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]]:
+        """
+        Map the stored matrix read-only
+        Returns: (ids, codes, scales) or None if there is no usable sidecar
+        """
+        count = self._read_count()
+        if count is None:
+            return None
+
+        arrays = {}
+        for name, (dtype, shape) in self.columns.items():
+            path = self._column_path(name)
+            if not os.path.exists(path) or os.path.getsize(path) < count * self._row_bytes(name):
+                return None
+            if count == 0:
+                # np.memmap cannot map an empty region
+                arrays[name] = np.empty((0,) + shape, dtype=dtype)
+            else:
+                arrays[name] = np.asarray(np.memmap(path, dtype=dtype, mode='r', shape=(count,) + shape))
+        return arrays['ids'], arrays['codes'], arrays.get('scales')
+
+    def append(self, ids: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray]):
+        """Append rows, then publish the new count"""
+        count = self._read_count() or 0
+        values = {'ids': np.asarray(ids, dtype=np.int64), 'codes': codes, 'scales': scales}
+        for name in self.columns:
+            path = self._column_path(name)
+            with open(path, 'ab') as f:
+                # Drop any bytes past the published count before appending
+                f.truncate(count * self._row_bytes(name))
+                f.write(np.ascontiguousarray(values[name], dtype=self.columns[name][0]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self._write_count(count + len(values['ids']))
+
+    def write_rows(self, rows: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray]):
+        """
+        Overwrite the codes (and scales) of existing rows in place
+        The files are mapped shared, so open mappings see the new values. The
+        version stamp is kept: the owner re-stamps once the rows are current.
+        """
+        values = {'codes': codes, 'scales': scales}
+        for name in values:
+            if name not in self.columns:
+                continue
+            row_bytes = self._row_bytes(name)
+            data = np.ascontiguousarray(values[name], dtype=self.columns[name][0]).reshape(len(rows), -1)
+            with open(self._column_path(name), 'r+b') as f:
+                for row, value in zip(rows, data):
+                    f.seek(int(row) * row_bytes)
+                    f.write(value.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+    def rewrite(self, ids: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray]):
+        """Replace the stored matrix (initial build and compaction)"""
+        values = {'ids': np.asarray(ids, dtype=np.int64), 'codes': codes, 'scales': scales}
+        # Publish zero rows first so a crash mid-rewrite never exposes mixed files
+        self._write_count(0)
+        for name in self.columns:
+            tmp_path = self._column_path(name) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(np.ascontiguousarray(values[name], dtype=self.columns[name][0]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._column_path(name))
+        self._write_count(len(values['ids']))
+
+    def file_bytes(self) -> int:
+        """Total size of the column files on disk"""
+        return sum(os.path.getsize(self._column_path(name)) for name in self.columns
+                   if os.path.exists(self._column_path(name)))
+
+# Made with Bob
@@ -0,0 +1,73 @@
+"""
+Pagination Module
+Keyset (id-based) pagination over the products table, shared by both
+database modules. A page is the next limit products with id > cursor in id
+order: the primary key index answers it at any depth (no OFFSET scan), and
+products inserted or deleted between pages never shift the following pages.
+"""
+import sqlite3
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from filters import filter_clause
+
+# Largest page a single call returns
+MAX_PAGE_SIZE = 1000
+
+
+def parse_cursor(cursor: Any) -> int:
+    """
+    Validate a page cursor (the id of the last product already seen)
+    None or '' starts from the beginning. Raises ValueError when malformed.
+    """
+    if cursor is None or cursor == '':
+        return 0
+    try:
+        after_id = int(cursor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    if after_id < 0:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return after_id
+
+
+def fetch_page(conn: sqlite3.Connection, after_id: int = 0, limit: int = 100,
+               filters: Optional[Dict[str, Any]] = None) -> tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    One page of products with id > after_id (filters must already be parsed)
+    One extra row is read to tell whether another page follows.
+    Returns: (products in id order, cursor of the next page or None after the last)
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    where, params = filter_clause(filters)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT id, name, description, category, price
+        FROM products
+        WHERE id > ? AND {where}
+        ORDER BY id
+        LIMIT ?
+    """, [after_id] + params + [limit + 1])
+    products = [dict(row) for row in cursor.fetchall()]
+    if len(products) > limit:
+        return products[:limit], products[limit - 1]['id']
+    return products, None
+
+
+def iter_pages(get_page: Callable[[int, int], tuple], after_id: int = 0, limit: Optional[int] = None,
+               page_size: int = MAX_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Every product after after_id (at most limit), fetched page by page
+    get_page(after_id, page_size) returns (products, next cursor). Only one
+    page is held at a time, and no read transaction stays open between
+    pages, so a slow consumer never pins a WAL snapshot.
+    """
+    remaining = limit
+    while after_id is not None and (remaining is None or remaining > 0):
+        size = page_size if remaining is None else min(page_size, remaining)
+        products, after_id = get_page(after_id, size)
+        yield from products
+        if remaining is not None:
+            remaining -= len(products)
+
+# Made with Bob
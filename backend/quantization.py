@@ -0,0 +1,70 @@
+"""
+Embedding Quantization Module
+Compact in-memory encodings of L2-normalized embeddings for a coarse search
+pass; candidates are then rescored against the full float32 vectors.
+
+Storage modes (bytes per 384-dim vector):
+- float32: 1536 B, exact scores
+- int8:     388 B, symmetric scalar quantization with a per-vector scale
+- binary:    48 B, sign bits compared by Hamming distance
+"""
+import numpy as np
+from typing import Optional
+
+STORAGE_MODES = ('float32', 'int8', 'binary')
+
+# Shortlist size multiplier (candidates = limit * factor) per quantized mode
+DEFAULT_RESCORE_FACTORS = {'int8': 4, 'binary': 16}
+
+# Rows scored per block, bounding the temporary memory of the coarse pass
+SCAN_CHUNK_ROWS = 16384
+
+# Number of set bits for every byte value
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def quantize(vectors: np.ndarray, mode: str) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encode normalized vectors (one per row) for the given storage mode
+    Returns: (codes, scales); scales is None except for int8
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors.reshape(-1, vectors.shape[-1])
+    if mode == 'float32':
+        return np.ascontiguousarray(vectors), None
+    if mode == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    if mode == 'binary':
+        return np.packbits(vectors > 0, axis=1), None
+    raise ValueError(f"Unknown storage mode '{mode}', expected one of {STORAGE_MODES}")
+
+
+def coarse_scores(codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray,
+                  mode: str) -> np.ndarray:
+    """
+    Approximate similarity of a normalized query to every encoded row
+    (higher is better). Scores from different modes are not comparable.
+    """
+    if mode == 'float32':
+        return codes @ query
+
+    query_codes, query_scales = quantize(query[None, :], mode)
+    scores = np.empty(len(codes), dtype=np.float32)
+
+    for start in range(0, len(codes), SCAN_CHUNK_ROWS):
+        block = codes[start:start + SCAN_CHUNK_ROWS]
+        if mode == 'int8':
+            # Integer dot products; int8 * int8 sums over 384 dims stay below
+            # 2**24, so they are exact in float32 and can use BLAS
+            dots = block.astype(np.float32) @ query_codes[0].astype(np.float32)
+            scores[start:start + len(block)] = dots * scales[start:start + len(block)] * query_scales[0]
+        else:
+            hamming = _POPCOUNT[np.bitwise_xor(block, query_codes[0])].sum(axis=1, dtype=np.int32)
+            scores[start:start + len(block)] = -hamming
+
+    return scores
+
+# Made with Bob
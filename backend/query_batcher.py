@@ -0,0 +1,115 @@
+"""
+Query Batcher Module
+Dynamic micro-batching of concurrent query encodes. Request threads hand
+their query to a single encoder thread, which gathers everything arriving
+within a short window (or up to a maximum batch size) and encodes it in one
+forward pass. Each caller waits at most about one window plus one batch.
+"""
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+
+class QueryBatcher:
+    """
+    Batches encode requests from many threads into one model call
+    encode_batch(texts) must return one embedding row per text. With
+    window_ms=0 nothing is waited for: a batch is whatever queued up while
+    the previous one was being encoded.
+    """
+
+    def __init__(self, encode_batch: Callable[[List[str]], np.ndarray], max_batch_size: int = 32,
+                 window_ms: float = 2.0):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.window_ms = window_ms
+        self._requests = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='query-batcher', daemon=True)
+                    self._thread.start()
+
+    def encode(self, text: str) -> np.ndarray:
+        """Embedding for text, encoded together with concurrently submitted queries"""
+        self._ensure_started()
+        future = Future()
+        self._requests.put((text, future))
+        return future.result()
+
+    def _collect(self, first) -> list:
+        """The first request plus whatever arrives within the window, up to max_batch_size"""
+        batch = [first]
+        deadline = time.perf_counter() + self.window_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._requests.get(timeout=timeout) if timeout > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Shutting down: finish this batch, then let _run see the sentinel
+                self._requests.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._requests.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+
+            # Identical concurrent queries are encoded once
+            positions: Dict[str, List[Future]] = {}
+            for text, future in batch:
+                positions.setdefault(text, []).append(future)
+            texts = list(positions)
+            try:
+                embeddings = self.encode_batch(texts)
+            except Exception as e:
+                for futures in positions.values():
+                    for future in futures:
+                        future.set_exception(e)
+                continue
+
+            for text, embedding in zip(texts, embeddings):
+                for future in positions[text]:
+                    future.set_result(embedding)
+            with self._stats_lock:
+                self.batches += 1
+                self.queries += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching statistics for the stats endpoint"""
+        with self._stats_lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'window_ms': self.window_ms,
+                'batches': self.batches,
+                'queries': self.queries,
+                'mean_batch_size': round(self.queries / self.batches, 2) if self.batches else None,
+                'largest_batch': self.largest_batch
+            }
+
+    def close(self):
+        """Stop the encoder thread after the requests already queued"""
+        if self._thread is not None:
+            self._requests.put(None)
+            self._thread.join()
+            self._thread = None
+
+# Made with Bob
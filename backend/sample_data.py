@@ -1,6 +1,8 @@
 """
 Sample data for demonstrating database differences
 """
+import random
+from typing import Any, Dict, Iterator, List
 
 SAMPLE_PRODUCTS = [
     {
@@ -155,4 +157,67 @@ SAMPLE_PRODUCTS = [
     }
 ]
 
+# Vocabulary used to expand SAMPLE_PRODUCTS into large synthetic catalogs
+BRANDS = [
+    "Acme", "Northwind", "Contoso", "Globex", "Initech", "Umbrella", "Stark",
+    "Wayne", "Hooli", "Vandelay", "Soylent", "Cyberdyne", "Tyrell", "Aperture"
+]
+ADJECTIVES = [
+    "Compact", "Deluxe", "Pro", "Eco", "Classic", "Premium", "Lightweight",
+    "Heavy-Duty", "Smart", "Portable", "Essential", "Ultra", "Travel", "Mini"
+]
+COLORS = ["black", "white", "grey", "navy", "red", "green", "walnut", "silver", "rose gold", "sand"]
+MATERIALS = ["recycled plastic", "aluminum", "bamboo", "stainless steel", "oak", "cotton", "silicone", "carbon fiber"]
+FEATURES = [
+    "a two-year warranty", "free returns", "a travel case", "a minimalist design",
+    "easy-clean surfaces", "energy-saving operation", "a gift box", "replaceable parts"
+]
+
+# Natural-language queries in the style of the frontend examples
+SAMPLE_QUERIES = [
+    "comfortable seating", "exercise equipment", "kitchen appliances", "work from home",
+    "fitness tracking", "noise cancelling music", "keep drinks cold", "home gym",
+    "healthy cooking without oil", "better posture at my desk", "video calls",
+    "outdoor sports gear", "storage for books", "gift for a gamer", "morning coffee",
+    "typing comfortably", "strength training at home", "party music outside"
+]
+
+
+def generate_products(count: int, seed: int = 42) -> Iterator[Dict[str, Any]]:
+    """
+    Deterministic synthetic catalog built from SAMPLE_PRODUCTS
+    Each product is a variant of one of the sample rows (brand, adjective,
+    colour, material and a price jitter), so category structure and semantic
+    neighbourhoods are preserved at any size. Yields products lazily; the same
+    count and seed always produce the same catalog.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        base = SAMPLE_PRODUCTS[i % len(SAMPLE_PRODUCTS)]
+        color = rng.choice(COLORS)
+        yield {
+            "name": f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {base['name']}",
+            "description": (f"{base['description']}. Made from {rng.choice(MATERIALS)} in {color}, "
+                            f"with {rng.choice(FEATURES)}"),
+            "category": base["category"],
+            "price": round(round(max(base["price"] * rng.uniform(0.6, 1.6), 1.0)) - 0.01, 2)
+        }
+
+
+def generate_queries(count: int, seed: int = 7) -> List[str]:
+    """
+    Deterministic query workload: a mix of SAMPLE_QUERIES (semantic intent)
+    and product-name keywords (exact-match intent)
+    """
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        if i % 2 == 0:
+            queries.append(rng.choice(SAMPLE_QUERIES))
+        else:
+            base = rng.choice(SAMPLE_PRODUCTS)
+            words = base["name"].lower().split()
+            queries.append(' '.join(words[-2:]) if len(words) > 1 else words[0])
+    return queries
+
 # Made with Bob
@@ -0,0 +1,599 @@
+"""
+Sharding Module
+Hash-partitions the vector store across several SQLite files, each served by
+its own local worker process, so scoring scales with cores and the catalog
+is not bound to one file.
+
+Products are placed by jump consistent hash of their id: growing from N to
+N+1 shards moves only about 1/(N+1) of them, all onto the new shard. The
+coordinator (ShardedVectorDB) encodes queries once, fans them out to every
+shard, and heap-merges the per-shard top-k lists.
+"""
+import glob
+import heapq
+import os
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional
+
+from ann_index import INDEX_TYPES
+from filters import parse_filters
+from metrics import StageTimer
+from quantization import STORAGE_MODES
+from vector_db import VectorDB
+
+# Products exported per round trip when a resize moves them between shards
+MOVE_BATCH = 1000
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach) of an integer key into [0, buckets)"""
+    b, j = -1, 0
+    key &= 0xFFFFFFFFFFFFFFFF
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_path(db_path: str, index: int) -> str:
+    """SQLite file of one shard, e.g. data/vector_shard_0.db for data/vector.db"""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_shard_{index}{ext}"
+
+
+def merge_top_k(result_lists: List[List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
+    """
+    Heap-merge per-shard results (each best first) into the overall top limit
+    A product seen twice (mid-move during a resize) is kept once.
+    """
+    merged, seen = [], set()
+    for product in heapq.merge(*result_lists, key=lambda product: -product['similarity']):
+        if product['id'] in seen:
+            continue
+        seen.add(product['id'])
+        merged.append(product)
+        if len(merged) == limit:
+            break
+    return merged
+
+
+def _max_product_id(db: VectorDB) -> int:
+    """Highest product id the shard has ever assigned (deleted ones included)"""
+    cursor = db.conn.cursor()
+    cursor.execute("""
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'products'), 0),
+                   COALESCE((SELECT MAX(id) FROM products), 0))
+    """)
+    return cursor.fetchone()[0]
+
+
+def _search_engine(db: VectorDB) -> str:
+    """The shard's search path ('sqlite-vec' or 'numpy')"""
+    return db.search_engine
+
+
+def _categories(db: VectorDB) -> List[str]:
+    """Distinct categories stored on the shard"""
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT DISTINCT category FROM products")
+    return [row['category'] for row in cursor.fetchall()]
+
+
+def _export_misplaced(db: VectorDB, shard: int, num_shards: int, after_id: int,
+                      limit: int) -> tuple[List[Dict[str, Any]], np.ndarray, Optional[int]]:
+    """
+    Scan up to limit products with id > after_id and return those that belong
+    on another shard once there are num_shards
+    Returns: (products with ids, their raw embeddings, last id scanned or None when done)
+    """
+    cursor = db.conn.cursor()
+    cursor.execute("""
+        SELECT p.id, p.name, p.description, p.category, p.price, e.embedding
+        FROM products p
+        JOIN embeddings e ON e.product_id = p.id
+        WHERE p.id > ?
+        ORDER BY p.id
+        LIMIT ?
+    """, (after_id, limit))
+    rows = cursor.fetchall()
+    if not rows:
+        return [], np.empty((0, db.embedding_dim), dtype=np.float32), None
+    moving = [row for row in rows if jump_hash(row['id'], num_shards) != shard]
+    products = [{key: row[key] for key in ('id', 'name', 'description', 'category', 'price')} for row in moving]
+    embeddings = np.empty((len(moving), db.embedding_dim), dtype=np.float32)
+    for i, row in enumerate(moving):
+        embeddings[i] = np.frombuffer(row['embedding'], dtype=np.float32)
+    return products, embeddings, rows[-1]['id']
+
+
+# Shard-side helpers callable by name, besides the VectorDB methods
+SHARD_FUNCTIONS = {
+    'max_product_id': _max_product_id,
+    'search_engine': _search_engine,
+    'categories': _categories,
+    'export_misplaced': _export_misplaced
+}
+
+
+def _shard_worker(conn, db_path: str, options: Dict[str, Any]):
+    """
+    Worker process: serve one shard's VectorDB over a pipe
+    Requests are (name, args, kwargs); replies are (True, result) or
+    (False, error). The shard never loads the model: it only receives vectors.
+    """
+    db = VectorDB(db_path, persistent_cache=False, query_cache_size=0, **options)
+    conn.send((True, None))
+    try:
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+            name, args, kwargs = request
+            try:
+                function = SHARD_FUNCTIONS.get(name)
+                result = function(db, *args, **kwargs) if function else getattr(db, name)(*args, **kwargs)
+                conn.send((True, result))
+            except Exception as e:
+                conn.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        db.close()
+        conn.close()
+
+
+class SwapLock:
+    """
+    Readers-writer lock guarding the shard list: any number of fan-outs run
+    together, while a swap waits for them to finish and holds off new ones
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._swapping = False
+
+    @contextmanager
+    def reading(self):
+        with self._condition:
+            while self._swapping:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def swapping(self):
+        with self._condition:
+            while self._swapping:
+                self._condition.wait()
+            # Set first so new readers queue up behind the swap
+            self._swapping = True
+            while self._readers:
+                self._condition.wait()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._swapping = False
+                self._condition.notify_all()
+
+
+class Shard:
+    """Coordinator-side handle of one shard worker process (one request at a time)"""
+
+    def __init__(self, index: int, path: str, options: Dict[str, Any], context):
+        self.index = index
+        self.path = path
+        self._conn, child_conn = context.Pipe()
+        self._lock = threading.Lock()
+        self.process = context.Process(target=_shard_worker, args=(child_conn, path, options),
+                                       name=f'vector-shard-{index}', daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def _receive(self) -> Any:
+        try:
+            ok, result = self._conn.recv()
+        except (EOFError, OSError):
+            raise RuntimeError(f"Vector shard {self.index} worker is not running")
+        if not ok:
+            raise RuntimeError(f"Vector shard {self.index}: {result}")
+        return result
+
+    def wait_ready(self):
+        """Block until the worker has opened its database"""
+        with self._lock:
+            self._receive()
+
+    def call(self, name: str, *args, **kwargs) -> Any:
+        """Run a VectorDB method (or SHARD_FUNCTIONS entry) on the shard and return its result"""
+        with self._lock:
+            try:
+                self._conn.send((name, args, kwargs))
+            except (OSError, ValueError):
+                raise RuntimeError(f"Vector shard {self.index} worker is not running")
+            return self._receive()
+
+    def close(self):
+        """Close the shard's database and stop its worker"""
+        with self._lock:
+            try:
+                self._conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self.process.join(timeout=30)
+            self._conn.close()
+
+    def remove_files(self):
+        """Delete the shard's database, index and sidecar files (worker must be closed)"""
+        for path in glob.glob(glob.escape(os.path.splitext(self.path)[0]) + '.*'):
+            os.remove(path)
+
+
+class ShardedVectorDB(VectorDB):
+    """
+    VectorDB front end over hash-partitioned shards
+    The coordinator owns the model, query cache and persistent embedding
+    store and allocates product ids; shards (data/vector_shard_<i>.db, each
+    with its own worker process) hold products, embeddings and the resident
+    matrix / ANN index built from index_type, storage_mode and friends.
+    Writes that span shards are committed per shard, not atomically.
+    Starting with a different shard count than the files on disk resizes.
+    """
+
+    def __init__(self, db_path: str = "data/vector.db", shards: int = 2, index_type: str = "exact",
+                 index_options: Optional[Dict[str, Any]] = None, storage_mode: str = "float32",
+                 rescore_factor: Optional[int] = None, mmap_matrix: bool = False, **options):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        # Checked here: a shard worker failing on them would only report that it exited
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{storage_mode}', expected one of {STORAGE_MODES}")
+        self.num_shards = shards
+        self._shard_options = {
+            'index_type': index_type,
+            'index_options': index_options,
+            'storage_mode': storage_mode,
+            'rescore_factor': rescore_factor,
+            'mmap_matrix': mmap_matrix
+        }
+        self.shards = []
+        self._executor = None
+        # Fan-outs read self.shards / self._executor; resizes swap them
+        self._swap_lock = SwapLock()
+        self._next_id = 1
+        # Serializes writes and resizes so every write sees a stable placement
+        self._write_lock = threading.RLock()
+        # The coordinator itself keeps no vectors: only the model and caches
+        super().__init__(db_path, **options)
+        self.index_type = index_type
+        self.storage_mode = storage_mode
+
+    def initialize_db(self):
+        """Start a worker per existing shard file (num_shards for a new store), then resize to num_shards"""
+        existing = 0
+        while os.path.exists(shard_path(self.db_path, existing)):
+            existing += 1
+        self._context = get_context('spawn')
+        self._set_shards([self._start_shard(index) for index in range(existing or self.num_shards)])
+
+        self.search_engine = self.shards[0].call('search_engine')
+        self._next_id = max(self._broadcast('max_product_id')) + 1
+        if len(self.shards) != self.num_shards:
+            self.resize(self.num_shards)
+
+    def _start_shard(self, index: int) -> Shard:
+        shard = Shard(index, shard_path(self.db_path, index), self._shard_options, self._context)
+        shard.wait_ready()
+        return shard
+
+    def _set_shards(self, shards: List[Shard], retired: List[Shard] = ()):
+        """
+        Swap in a new shard list with a fan-out pool sized to it
+        Waits for in-flight fan-outs first, so none can still reach the old
+        pool or a retired shard, which is then stopped.
+        """
+        with self._swap_lock.swapping():
+            previous = self._executor
+            self.shards = shards
+            self._executor = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix='vector-shard')
+        if previous is not None:
+            previous.shutdown(wait=True)
+        for shard in retired:
+            shard.close()
+
+    def _fan_out(self, calls: List[tuple]) -> List[Any]:
+        """Run (shard, name, args, kwargs) calls concurrently (caller holds _swap_lock for reading)"""
+        futures = [self._executor.submit(shard.call, name, *args, **kwargs) for shard, name, args, kwargs in calls]
+        return [future.result() for future in futures]
+
+    def _call_shards(self, calls: List[tuple]) -> List[Any]:
+        """Run (shard, name, args, kwargs) calls concurrently; returns their results in order"""
+        with self._swap_lock.reading():
+            return self._fan_out(calls)
+
+    def _broadcast(self, name: str, *args, **kwargs) -> List[Any]:
+        """Run the same call on every shard"""
+        with self._swap_lock.reading():
+            return self._fan_out([(shard, name, args, kwargs) for shard in self.shards])
+
+    def shard_of(self, product_id: int) -> Shard:
+        """The shard holding product_id"""
+        return self.shards[jump_hash(product_id, len(self.shards))]
+
+    def load_search_structures(self):
+        """Build every shard's resident matrix / ANN index"""
+        self._broadcast('load_search_structures')
+
+    def rebuild_index(self):
+        """Retrain every shard's ANN index"""
+        self._broadcast('rebuild_index')
+
+    def search_embedding(self, query_embedding: np.ndarray, limit: int = 20, exact: bool = False,
+                         filters: Optional[Dict[str, Any]] = None, timer: Optional[StageTimer] = None,
+                         **search_params) -> List[Dict[str, Any]]:
+        """
+        Scatter the query to every shard (each returns its hydrated top-limit),
+        then merge; records the search and merge stages
+        """
+        timer = timer or StageTimer()
+        filters = parse_filters(filters)
+        with timer.stage('search'):
+            shard_results = self._broadcast('search_embedding', query_embedding, limit, exact, filters,
+                                            **search_params)
+        with timer.stage('merge'):
+            return merge_top_k(shard_results, limit)
+
+    def search_embeddings_batch(self, query_embeddings: np.ndarray, limit: int = 20, exact: bool = False,
+                                filters: Optional[Dict[str, Any]] = None, timer: Optional[StageTimer] = None,
+                                **search_params) -> List[List[Dict[str, Any]]]:
+        """Batch search on every shard, then a merge per query; records the score and merge stages"""
+        timer = timer or StageTimer()
+        filters = parse_filters(filters)
+        with timer.stage('score'):
+            shard_results = self._broadcast('search_embeddings_batch', query_embeddings, limit, exact, filters,
+                                            **search_params)
+        with timer.stage('merge'):
+            return [merge_top_k([results[i] for results in shard_results], limit)
+                    for i in range(len(query_embeddings))]
+
+    def evaluate_recall(self, queries: List[str], k: int = 10, **search_params) -> Dict[str, Any]:
+        """Recall@k and mean latency (ms, scatter-gather included) of the approximate path against exact search"""
+        if self.index_type == 'exact' and self.storage_mode == 'float32':
+            raise ValueError("evaluate_recall requires an ANN index (index_type 'ivf' or 'hnsw') "
+                             "or a quantized storage_mode ('int8' or 'binary')")
+
+        recalls, exact_times, approx_times = [], [], []
+        for query in queries:
+            query_embedding = self._encode_query(query)
+
+            start_time = time.perf_counter()
+            exact_ids = [product['id'] for product in self.search_embedding(query_embedding, k, exact=True)]
+            exact_times.append(time.perf_counter() - start_time)
+
+            start_time = time.perf_counter()
+            approx_ids = [product['id'] for product in self.search_embedding(query_embedding, k, **search_params)]
+            approx_times.append(time.perf_counter() - start_time)
+
+            if exact_ids:
+                recalls.append(len(set(exact_ids).intersection(approx_ids)) / len(exact_ids))
+
+        return {
+            'index_type': self.index_type,
+            'storage_mode': self.storage_mode,
+            'shards': len(self.shards),
+            'k': k,
+            'queries': len(queries),
+            'search_params': search_params,
+            'recall_at_k': round(float(np.mean(recalls)), 4) if recalls else None,
+            'exact_ms': round(float(np.mean(exact_times)) * 1000, 3) if exact_times else None,
+            'approx_ms': round(float(np.mean(approx_times)) * 1000, 3) if approx_times else None
+        }
+
+    def insert_product(self, name: str, description: str, category: str, price: float) -> int:
+        """Encode a product and insert it on its shard"""
+        product = {'name': name, 'description': description, 'category': category, 'price': price}
+        return self.insert_encoded_products([product], self.encode_products([product]))[0]
+
+    def insert_encoded_products(self, products: List[Dict[str, Any]], embeddings: np.ndarray,
+                                product_ids: Optional[List[int]] = None) -> List[int]:
+        """
+        Allocate ids (unless given) and write each product to its shard, all
+        shards concurrently
+        Returns: the new product ids
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._write_lock:
+            if product_ids is None:
+                product_ids = list(range(self._next_id, self._next_id + len(products)))
+            else:
+                product_ids = [int(product_id) for product_id in product_ids]
+            if product_ids:
+                self._next_id = max(self._next_id, max(product_ids) + 1)
+
+            positions = {}
+            for i, product_id in enumerate(product_ids):
+                positions.setdefault(jump_hash(product_id, len(self.shards)), []).append(i)
+            self._call_shards([
+                (self.shards[shard], 'insert_encoded_products',
+                 ([products[i] for i in rows], embeddings[rows], [product_ids[i] for i in rows]), {})
+                for shard, rows in positions.items()
+            ])
+            self._bump_data_version()
+        return product_ids
+
+    def update_product(self, product_id: int, name: Optional[str] = None, description: Optional[str] = None,
+                       category: Optional[str] = None, price: Optional[float] = None,
+                       embedding: Optional[np.ndarray] = None) -> bool:
+        """Update a product on its shard; changed text is encoded here, since shards hold no model"""
+        with self._write_lock:
+            shard = self.shard_of(product_id)
+            if embedding is None and any(value is not None for value in (name, description, category)):
+                current = shard.call('_fetch_products', [product_id]).get(product_id)
+                if current is None:
+                    return False
+                new_text = self._product_text(name or current['name'], description or current['description'],
+                                              category or current['category'])
+                if new_text != self._product_text(current['name'], current['description'], current['category']):
+                    embedding = self._embed_texts([new_text])
+            updated = shard.call('update_product', product_id, name, description, category, price, embedding)
+            if updated:
+                self._bump_data_version()
+            return updated
+
+    def delete_products(self, product_ids: List[int]) -> int:
+        """Delete products from their shards; returns the number deleted"""
+        with self._write_lock:
+            groups = {}
+            for product_id in product_ids:
+                groups.setdefault(jump_hash(int(product_id), len(self.shards)), []).append(int(product_id))
+            deleted = sum(self._call_shards([(self.shards[shard], 'delete_products', (ids,), {})
+                                             for shard, ids in groups.items()]))
+            if deleted:
+                self._bump_data_version()
+            return deleted
+
+    def resize(self, shards: int) -> int:
+        """
+        Change the number of shards, moving only products whose shard changes
+        New shards are started first; each product is written to its new
+        shard before it is deleted from the old one (searches meanwhile may
+        see it on both and merge_top_k keeps one). Surplus shards are stopped
+        and their files removed once empty.
+        Returns: number of products moved
+        """
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        with self._write_lock:
+            current = self.shards
+            if shards > len(current):
+                self._set_shards(current + [self._start_shard(index) for index in range(len(current), shards)])
+
+            moved = 0
+            for source in current:
+                after_id = 0
+                while True:
+                    products, embeddings, after_id = source.call('export_misplaced', source.index, shards,
+                                                                 after_id, MOVE_BATCH)
+                    if after_id is None:
+                        break
+                    if not products:
+                        continue
+                    positions = {}
+                    for i, product in enumerate(products):
+                        positions.setdefault(jump_hash(product['id'], shards), []).append(i)
+                    self._call_shards([
+                        (self.shards[target], 'insert_encoded_products',
+                         ([products[i] for i in rows], embeddings[rows], [products[i]['id'] for i in rows]), {})
+                        for target, rows in positions.items()
+                    ])
+                    source.call('delete_products', [product['id'] for product in products])
+                    moved += len(products)
+
+            if shards < len(self.shards):
+                surplus = self.shards[shards:]
+                self._set_shards(self.shards[:shards], retired=surplus)
+                for shard in surplus:
+                    shard.remove_files()
+            self.num_shards = shards
+            self._bump_data_version()
+        print(f"[INFO] Resized vector store to {shards} shard(s), moved {moved} products")
+        return moved
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Resident matrix memory summed over shards"""
+        per_shard = self._broadcast('memory_stats')
+        totals = {key: sum(stats[key] for stats in per_shard)
+                  for key in ('resident_vectors', 'tombstones', 'matrix_bytes', 'ids_bytes')}
+        sidecar_bytes = [stats['sidecar_file_bytes'] for stats in per_shard]
+        return {
+            'storage_mode': self.storage_mode,
+            'backing': per_shard[0]['backing'],
+            'sidecar_file_bytes': sum(sidecar_bytes) if None not in sidecar_bytes else None,
+            **totals,
+            'bytes_per_vector': round(totals['matrix_bytes'] / totals['resident_vectors'], 1)
+            if totals['resident_vectors'] else None,
+            'float32_bytes_per_vector': self.embedding_dim * 4
+        }
+
+    def get_products_page(self, after_id: int = 0, limit: int = 100,
+                          filters: Optional[Dict[str, Any]] = None) -> tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Keyset page across all shards: every shard returns its own next page,
+        and the pages are merged by id (a product mid-move is kept once)
+        """
+        pages = self._broadcast('get_products_page', after_id, limit, parse_filters(filters))
+        merged = []
+        for product in heapq.merge(*(products for products, _ in pages), key=lambda product: product['id']):
+            if not merged or merged[-1]['id'] != product['id']:
+                merged.append(product)
+        products = merged[:limit]
+        more = len(merged) > limit or any(next_cursor is not None for _, next_cursor in pages)
+        return products, products[-1]['id'] if more and products else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Database statistics summed over shards, with a per-shard breakdown"""
+        with self._swap_lock.reading():
+            shards = self.shards
+            per_shard = self._fan_out([(shard, 'get_stats', (), {}) for shard in shards])
+        total_products = sum(stats['total_products'] for stats in per_shard)
+        categories = set()
+        for shard_categories in self._broadcast('categories'):
+            categories.update(shard_categories)
+        price_sum = sum(stats['avg_price'] * stats['total_products'] for stats in per_shard)
+
+        return {
+            'total_products': total_products,
+            'total_categories': len(categories),
+            'avg_price': round(price_sum / total_products, 2) if total_products else 0,
+            'total_embeddings': sum(stats['total_embeddings'] for stats in per_shard),
+            'embedding_dimension': self.embedding_dim,
+            'encoder': self.encoder.stats(),
+            'index_type': self.index_type,
+            'search_engine': self.search_engine,
+            'ready': self.is_ready,
+            'memory': self.memory_stats(),
+            'shards': [
+                {
+                    'index': shard.index,
+                    'path': shard.path,
+                    'pid': shard.process.pid,
+                    'products': stats['total_products'],
+                    'resident_vectors': stats['memory']['resident_vectors']
+                }
+                for shard, stats in zip(shards, per_shard)
+            ],
+            'query_cache': self.query_cache.stats(),
+            'embedding_store': self.embedding_store.stats() if self.embedding_store else None,
+            'encoder_pool': self.encoder_pool.stats() if self.encoder_pool else None,
+            'query_batcher': self.query_batcher.stats() if self.query_batcher else None,
+            'db_type': 'Vector Database (sharded)'
+        }
+
+    def clear_all(self):
+        """Clear every shard"""
+        with self._write_lock:
+            self._broadcast('clear_all')
+            self._bump_data_version()
+
+    def close(self):
+        """Stop the shard workers, then release the coordinator's caches and pools"""
+        for shard in self.shards:
+            shard.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        super().close()
+
+# Made with Bob
@@ -5,22 +5,42 @@ Demonstrates traditional relational database operations with exact text matching
 """
 import sqlite3
 import time
-from typing import List, Dict, Any
+from itertools import count, islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from db_pool import ConnectionManager
+from filters import parse_filters, filter_clause
+from metrics import StageTimer
+from pagination import fetch_page, iter_pages
+
+
+# FTS5 tokenizers to try, in order of preference. trigram keeps the substring
+# semantics of LIKE '%q%'; unicode61 matches whole tokens only.
+FTS_TOKENIZERS = ('trigram', 'unicode61')
 
 
 class TraditionalDB:
-    def __init__(self, db_path: str = "data/traditional.db"):
+    def __init__(self, db_path: str = "data/traditional.db", fts_tokenizer: str = "trigram"):
         self.db_path = db_path
-        self.conn = None
+        self.pool = None
+        self.fts_tokenizer = fts_tokenizer
+        # Set by initialize_db: 'fts5' when the full-text index is available, otherwise 'like'
+        self.search_engine = 'like'
+        # Bumped after every committed write (see _commit_write)
+        self._version_counter = count(1)
+        self.data_version = 0
         # Ensure data directory exists
         import os
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.initialize_db()
     
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's database connection"""
+        return self.pool.connection()
+    
     def initialize_db(self):
         """Initialize the traditional SQLite database with schema"""
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+        self.pool = ConnectionManager(self.db_path)
         cursor = self.conn.cursor()
         
         # Create products table
@@ -46,7 +66,78 @@ class TraditionalDB:
             ON products(category)
         """)
         
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_products_price
+            ON products(price)
+        """)
+        
+        self.conn.commit()
+        
+        self._initialize_fts()
+    
+    def _initialize_fts(self):
+        """
+        Create the FTS5 shadow index over products, kept in sync by triggers
+        Falls back to LIKE search if FTS5 (or every tokenizer) is unavailable.
+        """
+        cursor = self.conn.cursor()
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+        ).fetchone()
+        
+        if exists:
+            # Reuse the tokenizer the index was created with
+            sql = cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE name = 'products_fts'"
+            ).fetchone()['sql']
+            self.fts_tokenizer = 'trigram' if 'trigram' in sql else 'unicode61'
+        else:
+            tokenizers = [self.fts_tokenizer] + [t for t in FTS_TOKENIZERS if t != self.fts_tokenizer]
+            for tokenizer in tokenizers:
+                try:
+                    cursor.execute(f"""
+                        CREATE VIRTUAL TABLE products_fts USING fts5(
+                            name, description, category,
+                            content='products', content_rowid='id',
+                            tokenize='{tokenizer}'
+                        )
+                    """)
+                    self.fts_tokenizer = tokenizer
+                    break
+                except sqlite3.OperationalError as e:
+                    print(f"[INFO] FTS5 tokenizer '{tokenizer}' unavailable: {e}")
+            else:
+                print("[INFO] Using LIKE-based text search (FTS5 not available)")
+                return
+            
+            # Index rows that were inserted before the FTS table existed
+            cursor.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+        
+        cursor.executescript("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts (rowid, name, description, category)
+                VALUES (new.id, new.name, new.description, new.category);
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, name, description, category)
+                VALUES ('delete', old.id, old.name, old.description, old.category);
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, name, description, category)
+                VALUES ('delete', old.id, old.name, old.description, old.category);
+                INSERT INTO products_fts (rowid, name, description, category)
+                VALUES (new.id, new.name, new.description, new.category);
+            END;
+        """)
+        self.conn.commit()
+        self.search_engine = 'fts5'
+    
+    def _commit_write(self):
+        """Commit a write and bump data_version so cached results built on the old data go stale"""
         self.conn.commit()
+        self.data_version = next(self._version_counter)
     
     def insert_product(self, name: str, description: str, category: str, price: float) -> int:
         """Insert a product into the database"""
@@ -55,45 +146,194 @@ class TraditionalDB:
             INSERT INTO products (name, description, category, price)
             VALUES (?, ?, ?, ?)
         """, (name, description, category, price))
-        self.conn.commit()
+        self._commit_write()
         return cursor.lastrowid
     
-    def search_exact(self, query: str) -> tuple[List[Dict[str, Any]], float]:
+    def insert_products_bulk(self, products: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """
+        Insert many products with executemany and one transaction per batch
+        Each product is a dict with name, description, category and price.
+        Returns: number of products inserted
+        """
+        products = iter(products)
+        total = 0
+        while True:
+            batch = list(islice(products, batch_size))
+            if not batch:
+                break
+            total += len(self.insert_products_batch(batch))
+        
+        return total
+    
+    def insert_products_batch(self, products: List[Dict[str, Any]]) -> List[int]:
+        """
+        Insert a batch of products in one transaction
+        The batch gets a contiguous id range after the current maximum, so the
+        same products can be written to the vector database under the same ids.
+        Returns: the new product ids
+        """
+        cursor = self.conn.cursor()
+        try:
+            if not self.conn.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
+            # Reserve the id range under the write lock
+            cursor.execute("""
+                SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'products'), 0),
+                           COALESCE((SELECT MAX(id) FROM products), 0))
+            """)
+            first_id = cursor.fetchone()[0] + 1
+            product_ids = list(range(first_id, first_id + len(products)))
+            cursor.executemany("""
+                INSERT INTO products (id, name, description, category, price)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(product_id, p['name'], p['description'], p['category'], p['price'])
+                  for product_id, p in zip(product_ids, products)])
+            self._commit_write()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return product_ids
+    
+    def update_product(self, product_id: int, name: Optional[str] = None, description: Optional[str] = None,
+                       category: Optional[str] = None, price: Optional[float] = None) -> bool:
+        """
+        Update the given fields of a product (the FTS index follows via its trigger)
+        Returns: False if the product does not exist
+        """
+        changes = {'name': name, 'description': description, 'category': category, 'price': price}
+        changes = {key: value for key, value in changes.items() if value is not None}
+        cursor = self.conn.cursor()
+        if not changes:
+            cursor.execute("SELECT 1 FROM products WHERE id = ?", (product_id,))
+            return cursor.fetchone() is not None
+        
+        assignments = ', '.join(f"{key} = ?" for key in changes)
+        cursor.execute(f"UPDATE products SET {assignments} WHERE id = ?", list(changes.values()) + [product_id])
+        self._commit_write()
+        return cursor.rowcount > 0
+    
+    def delete_product(self, product_id: int) -> bool:
+        """
+        Delete a product (the FTS index follows via its trigger)
+        Returns: False if the product does not exist
+        """
+        return self.delete_products([product_id]) == 1
+    
+    def delete_products(self, product_ids: List[int]) -> int:
+        """
+        Delete products in one transaction
+        Returns: number of products deleted (missing ids are ignored)
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany("DELETE FROM products WHERE id = ?",
+                               [(int(product_id),) for product_id in product_ids])
+            self._commit_write()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return cursor.rowcount
+    
+    def search_exact(self, query: str, filters: Optional[Dict[str, Any]] = None,
+                     timer: Optional[StageTimer] = None, limit: int = 20) -> tuple[List[Dict[str, Any]], float]:
         """
-        Exact text search using SQL LIKE
+        Exact text search using the FTS5 index (BM25 ranked), or SQL LIKE
+        when FTS5 is unavailable or the query is too short for trigrams
+        filters (category, min_price, max_price) are applied in the same query
+        Stages (query, rows) are recorded in timer when given.
         Returns: (results, execution_time)
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
+        timer = timer or StageTimer()
+        filters = parse_filters(filters)
+        
+        with timer.stage('query'):
+            rows = self._search_rows(query, filters, limit)
+        
+        with timer.stage('rows'):
+            results = [dict(row) for row in rows]
+        
+        execution_time = (time.perf_counter_ns() - start_ns) / 1e9
+        
+        return results, execution_time
+    
+    def iter_search_exact(self, query: str, filters: Optional[Dict[str, Any]] = None,
+                          limit: int = 20) -> Iterator[Dict[str, Any]]:
+        """
+        The results of search_exact one at a time, read straight from the
+        SQLite cursor instead of being collected into a list first
+        """
+        rows = self._search_rows(query, parse_filters(filters), limit)
+        return (dict(row) for row in rows)
+    
+    def _search_rows(self, query: str, filters: Optional[Dict[str, Any]], limit: int) -> sqlite3.Cursor:
+        """Executed search query (FTS5 when usable, else LIKE); rows are fetched by iterating it"""
+        if self._can_use_fts(query):
+            return self._search_fts(query, filters, limit)
+        return self._search_like(query, filters, limit)
+    
+    def _can_use_fts(self, query: str) -> bool:
+        """Trigram MATCH needs at least three characters to find anything"""
+        if self.search_engine != 'fts5':
+            return False
+        return self.fts_tokenizer != 'trigram' or len(query) >= 3
+    
+    def _search_fts(self, query: str, filters: Optional[Dict[str, Any]] = None,
+                    limit: int = 20) -> sqlite3.Cursor:
+        """BM25-ranked full-text search; name hits weigh most, then category"""
+        # Quote the query as a single phrase so FTS5 syntax in user input is inert
+        match_expr = '"' + query.replace('"', '""') + '"'
+        where, params = filter_clause(filters, alias='p')
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT p.id, p.name, p.description, p.category, p.price
+            FROM products_fts
+            JOIN products p ON p.id = products_fts.rowid
+            WHERE products_fts MATCH ? AND {where}
+            ORDER BY bm25(products_fts, 10.0, 1.0, 5.0)
+            LIMIT ?
+        """, [match_expr] + params + [limit])
+        return cursor
+    
+    def _search_like(self, query: str, filters: Optional[Dict[str, Any]] = None,
+                     limit: int = 20) -> sqlite3.Cursor:
+        """Full-scan search using SQL LIKE"""
         cursor = self.conn.cursor()
         
         search_pattern = f"%{query}%"
-        cursor.execute("""
+        where, params = filter_clause(filters)
+        cursor.execute(f"""
             SELECT id, name, description, category, price
             FROM products
-            WHERE name LIKE ? OR description LIKE ? OR category LIKE ?
+            WHERE (name LIKE ? OR description LIKE ? OR category LIKE ?) AND {where}
             ORDER BY 
                 CASE 
                     WHEN name LIKE ? THEN 1
                     WHEN category LIKE ? THEN 2
                     ELSE 3
                 END
-            LIMIT 20
-        """, (search_pattern, search_pattern, search_pattern, search_pattern, search_pattern))
-        
-        results = [dict(row) for row in cursor.fetchall()]
-        execution_time = time.time() - start_time
+            LIMIT ?
+        """, [search_pattern, search_pattern, search_pattern] + params + [search_pattern, search_pattern, limit])
         
-        return results, execution_time
+        return cursor
     
     def get_all_products(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get all products"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT id, name, description, category, price
-            FROM products
-            LIMIT ?
-        """, (limit,))
-        return [dict(row) for row in cursor.fetchall()]
+        """Get the first limit products by id"""
+        return self.get_products_page(limit=limit)[0]
+    
+    def get_products_page(self, after_id: int = 0, limit: int = 100,
+                          filters: Optional[Dict[str, Any]] = None) -> tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Keyset page of products in id order, starting after product after_id
+        Returns: (products, cursor of the next page or None after the last)
+        """
+        return fetch_page(self.conn, after_id, limit, parse_filters(filters))
+    
+    def iter_products(self, after_id: int = 0, limit: Optional[int] = None,
+                      filters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Every product after after_id (at most limit) in id order, holding one page at a time"""
+        filters = parse_filters(filters)
+        return iter_pages(lambda after, size: self.get_products_page(after, size, filters), after_id, limit)
     
     def get_stats(self) -> Dict[str, Any]:
         """Get database statistics"""
@@ -112,6 +352,7 @@ class TraditionalDB:
             'total_products': total_products,
             'total_categories': total_categories,
             'avg_price': round(avg_price, 2),
+            'search_engine': self.search_engine,
             'db_type': 'Traditional SQL'
         }
     
@@ -119,11 +360,11 @@ class TraditionalDB:
         """Clear all products"""
         cursor = self.conn.cursor()
         cursor.execute("DELETE FROM products")
-        self.conn.commit()
+        self._commit_write()
     
     def close(self):
         """Close database connection"""
-        if self.conn:
-            self.conn.close()
+        if self.pool:
+            self.pool.close_all()
 
 # Made with Bob
@@ -4,37 +4,185 @@ Vector Database Module using sqlite-vec
 Demonstrates semantic search capabilities using vector embeddings
 """
 import sqlite_vec
+import threading
 import time
 import numpy as np
-from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
+from itertools import count, islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Union
+from ann_index import create_index
+from encoders import Encoder, create_encoder
+from quantization import STORAGE_MODES, DEFAULT_RESCORE_FACTORS, SCAN_CHUNK_ROWS, quantize, coarse_scores
+from db_pool import ConnectionManager
+from mmap_store import MatrixSidecar
+from embedding_cache import QueryEmbeddingCache, PersistentEmbeddingStore
+from encoder_pool import EncoderPool
+from query_batcher import QueryBatcher
+from filters import parse_filters, filter_clause
+from metrics import StageTimer
+from pagination import fetch_page, iter_pages
 
 import sqlite3
 
+# Largest (products x queries) score block computed at once by search_semantic_batch
+BATCH_SCORE_ELEMENTS = 64 * 1024 * 1024
+# Product ids per hydration query; stays under SQLite's default variable limit
+HYDRATE_CHUNK = 500
+# Deleted rows stay in the resident matrix / HNSW graph as tombstones until
+# they exceed this share of the rows (and at least COMPACT_MIN_TOMBSTONES),
+# then the structure is compacted
+COMPACT_RATIO = 0.1
+COMPACT_MIN_TOMBSTONES = 1024
+
 
 class VectorDB:
-    def __init__(self, db_path: str = "data/vector.db"):
+    def __init__(self, db_path: str = "data/vector.db", index_type: str = "exact",
+                 index_options: Optional[Dict[str, Any]] = None, query_cache_size: int = 1024,
+                 query_cache_lowercase: bool = True, persistent_cache: bool = True,
+                 storage_mode: str = "float32", rescore_factor: Optional[int] = None,
+                 mmap_matrix: bool = False, encoder_processes: int = 0,
+                 query_batch_size: int = 0, query_batch_window_ms: float = 2.0,
+                 encoder: Union[str, Encoder] = 'sentence-transformers', encoder_threads: Optional[int] = None):
         self.db_path = db_path
-        self.conn = None
+        self.pool = None
         # Ensure data directory exists
         import os
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')  # 384-dimensional embeddings
-        self.embedding_dim = 384
+        
+        # Text encoder: a backend name (see encoders.ENCODER_BACKENDS) or an
+        # Encoder instance. The model (and torch) is loaded lazily: by
+        # warm_up() in the background, or on the first encode
+        self.encoder = encoder if isinstance(encoder, Encoder) else create_encoder(encoder, threads=encoder_threads)
+        self.model_name = self.encoder.model_name
+        self.embedding_dim = self.encoder.embedding_dim  # 384 for all-MiniLM-L6-v2
+        self._ready = threading.Event()
+        self.warm_up_error = None
+        self.warm_up_time = None
+        
+        # Content-hash embedding store next to the database, e.g.
+        # data/vector_embedding_cache.db; survives clear_all so re-seeding
+        # unchanged products does not re-run the model
+        self.embedding_store = None
+        if persistent_cache:
+            store_path = os.path.splitext(db_path)[0] + '_embedding_cache.db'
+            self.embedding_store = PersistentEmbeddingStore(store_path, self.encoder.cache_key, self.embedding_dim)
+        
+        # Optional process pool for product embeddings in bulk and streaming
+        # loads (encoder_processes=0 keeps encoding in-process); queries are
+        # always encoded in-process
+        self.encoder_pool = EncoderPool(self.model_name, self.embedding_dim, encoder_processes,
+                                        backend=self.encoder.backend) if encoder_processes else None
+        
+        # Optional micro-batching of concurrent query encodes: cache misses from
+        # all request threads are gathered for up to query_batch_window_ms (at
+        # most query_batch_size queries) and encoded in one forward pass
+        self.query_batcher = QueryBatcher(self._generate_embeddings, query_batch_size, query_batch_window_ms) \
+            if query_batch_size > 1 else None
+        
+        # LRU cache of normalized query embeddings (query_cache_size=0 disables it)
+        self.query_cache = QueryEmbeddingCache(query_cache_size, lowercase=query_cache_lowercase)
+        
+        # Resident search matrix: L2-normalized rows aligned with _ids, encoded
+        # per storage_mode (float32, int8 codes + _scales, or packed sign bits).
+        # Built lazily from the embeddings table; inserts are buffered in
+        # _pending_* and folded in on the next search.
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{storage_mode}', expected one of {STORAGE_MODES}")
+        self.storage_mode = storage_mode
+        # Quantized modes shortlist limit * rescore_factor candidates for float32 rescoring
+        if rescore_factor is not None and rescore_factor < 0:
+            raise ValueError("rescore_factor must be at least 1 (or 0 for the storage mode's default)")
+        self.rescore_factor = rescore_factor or DEFAULT_RESCORE_FACTORS.get(storage_mode, 1)
+        self._matrix = None
+        self._scales = None
+        self._ids = None
+        # With mmap_matrix the resident matrix lives in flat sidecar files
+        # (data/vector.matrix.*) mapped with np.memmap instead of on the heap
+        self.sidecar = MatrixSidecar(db_path, storage_mode, self.embedding_dim) if mmap_matrix else None
+        self._pending_ids = []
+        self._pending_vectors = []
+        # Sorted ids of deleted products whose rows are still in the matrix
+        self._deleted_ids = np.empty(0, dtype=np.int64)
+        self._matrix_lock = threading.Lock()
+        
+        # Optional ANN index ('ivf' or 'hnsw'), persisted next to the database file
+        self.index_type = index_type
+        self.ann_index = create_index(index_type, self.embedding_dim, db_path, **(index_options or {}))
+        self._index_ready = False
+        
+        # Bumped after every committed write; lets callers (e.g. the response
+        # cache) detect that anything derived from the data is stale
+        self._version_counter = count(1)
+        self.data_version = 0
+        
+        # Set by initialize_db: 'sqlite-vec' when the extension and vec0 table
+        # are available, otherwise 'numpy'
+        self.search_engine = 'numpy'
+        
         self.initialize_db()
     
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's database connection"""
+        return self.pool.connection()
+    
+    @property
+    def is_ready(self) -> bool:
+        """True once warm-up has loaded the model and search structures"""
+        return self._ready.is_set()
+    
+    def warm_up(self):
+        """
+        Load the model, run a dummy encode (triggers lazy initialisation and
+        allocations) and build the in-memory search structures
+        """
+        start_time = time.perf_counter()
+        try:
+            self.encoder.encode(["warm up"])
+            self.load_search_structures()
+            self.warm_up_error = None
+        except Exception as e:
+            self.warm_up_error = str(e)
+            print(f"[ERROR] Vector engine warm-up failed: {e}")
+            return
+        self.warm_up_time = time.perf_counter() - start_time
+        self._ready.set()
+        print(f"[INFO] Vector engine ready (warm-up took {self.warm_up_time:.1f}s)")
+    
+    def load_search_structures(self):
+        """Build the resident matrix / ANN index now rather than on the first search"""
+        if self.ann_index is not None:
+            self._get_index()
+        elif self.search_engine == 'numpy' or self.storage_mode != 'float32':
+            self._get_matrix()
+    
+    def start_warm_up(self) -> threading.Thread:
+        """Run warm_up() on a background daemon thread"""
+        thread = threading.Thread(target=self.warm_up, name='vector-warm-up', daemon=True)
+        thread.start()
+        return thread
+    
+    @staticmethod
+    def _load_vec_extension(conn: sqlite3.Connection):
+        """Load sqlite-vec into a new connection; failures leave the numpy path in place"""
+        try:
+            if hasattr(conn, 'enable_load_extension'):
+                conn.enable_load_extension(True)
+                sqlite_vec.load(conn)
+                conn.enable_load_extension(False)
+        except Exception:
+            pass
+    
     def initialize_db(self):
         """Initialize the vector database with schema"""
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+        self.pool = ConnectionManager(self.db_path, on_connect=self._load_vec_extension)
         
-        # Try to load sqlite-vec extension (optional)
-        # If it fails, we'll use numpy-based similarity which works fine
+        # Check whether the sqlite-vec extension (optional) made it into the connection
+        # If not, we'll use numpy-based similarity which works fine
+        vec_loaded = False
         try:
             if hasattr(self.conn, 'enable_load_extension'):
-                self.conn.enable_load_extension(True)
-                sqlite_vec.load(self.conn)
-                self.conn.enable_load_extension(False)
+                self.conn.execute("SELECT vec_version()")
+                vec_loaded = True
                 print("[INFO] sqlite-vec extension loaded successfully")
             else:
                 print("[INFO] Using numpy-based similarity search (extension loading not available)")
@@ -55,6 +203,17 @@ class VectorDB:
             )
         """)
         
+        # Indexes used to resolve category / price filters before scoring
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_products_category_price
+            ON products(category, price)
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_products_price
+            ON products(price)
+        """)
+        
         # Create embeddings table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS embeddings (
@@ -64,18 +223,513 @@ class VectorDB:
             )
         """)
         
+        # embeddings_version counts committed embedding writes; the persisted
+        # ANN index is stamped with the version it was saved at (ann_index_version),
+        # the matrix sidecar with the version its rows reflect (see mmap_store)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS vector_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO vector_meta (key, value) VALUES ('embeddings_version', 0)")
+        
         self.conn.commit()
+        
+        if vec_loaded:
+            self._initialize_vec_table()
+    
+    def _initialize_vec_table(self):
+        """
+        Create the sqlite-vec vec0 table used for in-engine KNN
+        The plain embeddings table stays the source of truth (it is what the
+        numpy fallback reads); vec_embeddings mirrors it keyed by product id.
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS vec_embeddings USING vec0(
+                    embedding float[{self.embedding_dim}] distance_metric=cosine
+                )
+            """)
+            
+            # Backfill rows written while the extension was unavailable
+            cursor.execute("""
+                INSERT INTO vec_embeddings (rowid, embedding)
+                SELECT product_id, embedding FROM embeddings
+                WHERE product_id NOT IN (SELECT rowid FROM vec_embeddings)
+            """)
+            self.conn.commit()
+            self.search_engine = 'sqlite-vec'
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"[INFO] Using numpy-based similarity search (vec0 unavailable: {e})")
     
     def _generate_embedding(self, text: str) -> np.ndarray:
-        """Generate embedding vector for text"""
-        return self.model.encode(text, convert_to_numpy=True)
+        """Generate embedding vector for text (through the query batcher when enabled)"""
+        if self.query_batcher is not None:
+            return self.query_batcher.encode(text)
+        return self.encoder.encode([text])[0]
+    
+    def _encode_query(self, query: str) -> np.ndarray:
+        """L2-normalized query embedding, served from the query cache when possible"""
+        embedding = self.query_cache.get(query)
+        if embedding is None:
+            embedding = self._normalize(self._generate_embedding(query))
+            self.query_cache.put(query, embedding)
+        return embedding
+    
+    def _encode_queries(self, queries: List[str]) -> tuple[np.ndarray, int]:
+        """
+        L2-normalized embeddings for many queries; cache misses are encoded in
+        batched model calls
+        Returns: (embeddings, number of cache hits)
+        """
+        embeddings = np.empty((len(queries), self.embedding_dim), dtype=np.float32)
+        # Cache misses grouped by cache key, so repeated queries are encoded once
+        missing = {}
+        for i, query in enumerate(queries):
+            cached = self.query_cache.get(query)
+            if cached is None:
+                missing.setdefault(self.query_cache.key(query), []).append(i)
+            else:
+                embeddings[i] = cached
+        
+        if missing:
+            positions = list(missing.values())
+            encoded = self._normalize(self._generate_embeddings([queries[group[0]] for group in positions]))
+            for group, embedding in zip(positions, encoded):
+                embeddings[group] = embedding
+                self.query_cache.put(queries[group[0]], embedding)
+        return embeddings, len(queries) - sum(len(group) for group in missing.values())
+    
+    def _generate_embeddings(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Generate embedding vectors for many texts in batched model calls"""
+        return self.encoder.encode(texts, batch_size=batch_size)
+    
+    def _encode_product_texts(self, texts: List[str]) -> np.ndarray:
+        """Encode product texts, on the encoder pool when one is configured"""
+        if self.encoder_pool is not None:
+            return self.encoder_pool.encode(texts)
+        return self._generate_embeddings(texts)
+    
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Embeddings for product texts, encoding only those missing from the persistent store"""
+        if self.embedding_store is None:
+            return self._encode_product_texts(texts)
+        
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        cached = self.embedding_store.get_many(texts)
+        for i, embedding in cached.items():
+            embeddings[i] = embedding
+        
+        missing = [i for i in range(len(texts)) if i not in cached]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            encoded = self._encode_product_texts(missing_texts)
+            embeddings[missing] = encoded
+            self.embedding_store.put_many(missing_texts, encoded)
+        return embeddings
+    
+    @staticmethod
+    def _product_text(name: str, description: str, category: str) -> str:
+        """Text that is embedded for a product"""
+        return f"{name} {description} {category}"
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize a vector or the rows of a matrix (zero rows stay zero)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    def _read_embeddings(self, product_ids: Optional[List[int]] = None,
+                         chunk_size: int = SCAN_CHUNK_ROWS) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        Stream stored embeddings (all, or only product_ids) from SQLite
+        Yields: (ids, L2-normalized float32 vectors) chunks of up to chunk_size rows
+        """
+        if product_ids is None:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT product_id, embedding FROM embeddings ORDER BY product_id")
+            cursors = [cursor]
+        else:
+            product_ids = [int(product_id) for product_id in product_ids]
+            cursors = (self._embedding_cursor(product_ids[start:start + HYDRATE_CHUNK])
+                       for start in range(0, len(product_ids), HYDRATE_CHUNK))
+        
+        for cursor in cursors:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                ids = np.fromiter((row['product_id'] for row in rows), dtype=np.int64, count=len(rows))
+                vectors = np.empty((len(rows), self.embedding_dim), dtype=np.float32)
+                for i, row in enumerate(rows):
+                    vectors[i] = np.frombuffer(row['embedding'], dtype=np.float32)
+                yield ids, self._normalize(vectors)
+    
+    def _embedding_cursor(self, product_ids: List[int]) -> sqlite3.Cursor:
+        """Cursor over the stored embeddings of the given products"""
+        placeholders = ','.join('?' * len(product_ids))
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT product_id, embedding FROM embeddings
+            WHERE product_id IN ({placeholders})
+        """, product_ids)
+        return cursor
+    
+    def _sidecar_matches(self) -> bool:
+        """True if the sidecar was stamped at the current embeddings_version"""
+        version = self.sidecar.version()
+        return version is not None and version == self._meta_value('embeddings_version')
+    
+    def _stamp_sidecar(self):
+        """
+        Stamp the sidecar with the current embeddings_version if its rows hold
+        exactly the stored embeddings: nothing pending, no tombstones (caller
+        holds _matrix_lock, after the write being applied is fully reflected)
+        """
+        if (self.sidecar is not None and self._matrix is not None
+                and not self._pending_ids and not len(self._deleted_ids)):
+            self.sidecar.stamp(self._meta_value('embeddings_version'))
+    
+    def _load_matrix(self):
+        """
+        Map the matrix sidecar if it is current, otherwise read every stored
+        embedding (caller holds _matrix_lock, so no write commits meanwhile)
+        """
+        self._pending_ids = []
+        self._pending_vectors = []
+        self._deleted_ids = np.empty(0, dtype=np.int64)
+        if self.sidecar is not None:
+            mapped = self.sidecar.open()
+            if mapped is not None and self._sidecar_matches():
+                self._ids, self._matrix, self._scales = mapped
+                return
+        
+        id_chunks, code_chunks, scale_chunks = [], [], []
+        # Quantize chunk by chunk so a float32 copy of the catalog never exists at once
+        for ids, vectors in self._read_embeddings():
+            codes, scales = quantize(vectors, self.storage_mode)
+            id_chunks.append(ids)
+            code_chunks.append(codes)
+            scale_chunks.append(scales)
+        
+        if id_chunks:
+            self._ids = np.concatenate(id_chunks)
+            self._matrix = np.ascontiguousarray(np.vstack(code_chunks))
+            self._scales = np.concatenate(scale_chunks) if self.storage_mode == 'int8' else None
+        else:
+            self._ids = np.empty(0, dtype=np.int64)
+            self._matrix, self._scales = quantize(
+                np.empty((0, self.embedding_dim), dtype=np.float32), self.storage_mode)
+        
+        if self.sidecar is not None:
+            # Persist, then swap the heap copy for the mapping
+            self.sidecar.rewrite(self._ids, self._matrix, self._scales)
+            self._ids, self._matrix, self._scales = self.sidecar.open()
+            self._stamp_sidecar()
+    
+    def _get_matrix(self) -> tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        Return (ids, matrix, scales), loading or folding in pending inserts as needed
+        matrix holds normalized float32 rows or quantized codes (see storage_mode)
+        """
+        with self._matrix_lock:
+            if self._matrix is None:
+                self._load_matrix()
+            elif self._pending_ids:
+                self._fold_pending()
+                self._stamp_sidecar()
+            return self._ids, self._matrix, self._scales
+    
+    def _fold_pending(self):
+        """
+        Add buffered inserts to the resident matrix (caller holds _matrix_lock)
+        ids must stay sorted (see _rows_of): new ids above the current maximum
+        are appended, older ones (e.g. products moved here by a shard resize)
+        are merged into place.
+        """
+        if not self._pending_ids:
+            return
+        codes, scales = quantize(self._normalize(np.vstack(self._pending_vectors)), self.storage_mode)
+        pending_ids = np.asarray(self._pending_ids, dtype=np.int64)
+        if (len(self._ids) and pending_ids[0] <= self._ids[-1]) or np.any(np.diff(pending_ids) <= 0):
+            self._merge_rows(pending_ids, codes, scales)
+        elif self.sidecar is not None:
+            # Incremental append to the sidecar files, then remap
+            self.sidecar.append(pending_ids, codes, scales)
+            self._ids, self._matrix, self._scales = self.sidecar.open()
+        else:
+            self._matrix = np.ascontiguousarray(np.vstack([self._matrix, codes]))
+            if scales is not None:
+                self._scales = np.concatenate([self._scales, scales])
+            self._ids = np.concatenate([self._ids, pending_ids])
+        self._pending_ids = []
+        self._pending_vectors = []
+    
+    def _merge_rows(self, new_ids: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray]):
+        """
+        Merge rows with out-of-order ids into the resident matrix, keeping ids
+        sorted; tombstoned rows of re-inserted ids are replaced (caller holds _matrix_lock)
+        """
+        keep = ~np.isin(self._ids, new_ids)
+        ids = np.concatenate([self._ids[keep], new_ids])
+        order = np.argsort(ids, kind='stable')
+        matrix = np.ascontiguousarray(np.vstack([self._matrix[keep], codes])[order])
+        if scales is not None:
+            scales = np.concatenate([self._scales[keep], scales])[order]
+        ids = ids[order]
+        if self.sidecar is not None:
+            self.sidecar.rewrite(ids, matrix, scales)
+            ids, matrix, scales = self.sidecar.open()
+        self._ids, self._matrix, self._scales = ids, matrix, scales
+        self._deleted_ids = np.setdiff1d(self._deleted_ids, new_ids)
+    
+    def _compact_matrix(self):
+        """Drop tombstoned rows from the resident matrix (caller holds _matrix_lock)"""
+        keep = ~np.isin(self._ids, self._deleted_ids)
+        ids, matrix = self._ids[keep], np.ascontiguousarray(self._matrix[keep])
+        scales = self._scales[keep] if self._scales is not None else None
+        if self.sidecar is not None:
+            self.sidecar.rewrite(ids, matrix, scales)
+            ids, matrix, scales = self.sidecar.open()
+        self._ids, self._matrix, self._scales = ids, matrix, scales
+        self._deleted_ids = np.empty(0, dtype=np.int64)
+    
+    def _rows_of(self, ids: np.ndarray, product_ids: np.ndarray) -> np.ndarray:
+        """Rows of the (sorted) ids array holding product_ids; ids not present are skipped"""
+        rows = np.searchsorted(ids, product_ids)
+        in_range = rows < len(ids)
+        rows = rows[in_range]
+        return rows[ids[rows] == product_ids[in_range]]
+    
+    def _mask_deleted(self, ids: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        """Give tombstoned rows a score of -inf so they never rank (scores is modified)"""
+        deleted = self._deleted_ids
+        if len(deleted):
+            scores[self._rows_of(ids, deleted)] = -np.inf
+        return scores
+    
+    def _get_float_matrix(self) -> tuple[np.ndarray, np.ndarray]:
+        """(ids, normalized float32 matrix): resident in float32 mode, read from SQLite otherwise"""
+        if self.storage_mode == 'float32':
+            ids, matrix, _ = self._get_matrix()
+            deleted = self._deleted_ids
+            if len(deleted):
+                keep = ~np.isin(ids, deleted)
+                ids, matrix = ids[keep], matrix[keep]
+            return ids, matrix
+        chunks = list(self._read_embeddings())
+        if not chunks:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.embedding_dim), dtype=np.float32)
+        return np.concatenate([ids for ids, _ in chunks]), np.vstack([vectors for _, vectors in chunks])
+    
+    def _meta_value(self, key: str) -> Optional[int]:
+        """Value stored under key in vector_meta (None if unset)"""
+        row = self.conn.execute("SELECT value FROM vector_meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+    
+    def _record_embeddings_write(self):
+        """Bump embeddings_version inside the current write transaction"""
+        self.conn.execute("UPDATE vector_meta SET value = value + 1 WHERE key = 'embeddings_version'")
+    
+    def _save_index(self, version: int):
+        """Persist the ANN index, stamped with the embeddings_version it reflects"""
+        self.ann_index.save()
+        self.conn.execute("INSERT OR REPLACE INTO vector_meta (key, value) VALUES ('ann_index_version', ?)",
+                          (version,))
+        self.conn.commit()
+    
+    def _get_index(self):
+        """Return the ANN index, loading it from disk or building it on first use"""
+        while not self._index_ready:
+            # The snapshot is taken outside _matrix_lock (it may load the
+            # matrix). Writes commit under the lock and only reach the index
+            # once it is ready, so the index is published only if no write
+            # committed since the version was read; otherwise snapshot again.
+            version = self._meta_value('embeddings_version')
+            ids, matrix = self._get_float_matrix()
+            with self._matrix_lock:
+                if self._index_ready:
+                    break
+                if self._meta_value('embeddings_version') != version:
+                    continue
+                # A persisted index is only trusted if no embedding was written
+                # after it was saved and it covers exactly the stored embeddings
+                if not (self._meta_value('ann_index_version') == version and self.ann_index.load()
+                        and len(self.ann_index) == len(ids)):
+                    self.ann_index.build(ids, matrix)
+                    self._save_index(version)
+                self._index_ready = True
+        return self.ann_index
+    
+    def rebuild_index(self):
+        """Retrain the ANN index from the current embeddings (e.g. after heavy growth)"""
+        if self.ann_index is None:
+            return
+        self._index_ready = False
+        self.ann_index.remove_file()
+        self._get_index()
+    
+    def _search_ids(self, query_embedding: np.ndarray, k: int, exact: bool = False,
+                    filters: Optional[Dict[str, Any]] = None,
+                    **search_params) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k product ids for a normalized query on the configured search path
+        filters must already be parsed (see filters.parse_filters)
+        Returns: (ids, scores) ordered best first
+        """
+        if filters:
+            return self._search_filtered_ids(query_embedding, k, filters, exact, **search_params)
+        if self.ann_index is not None and not exact:
+            return self._get_index().search(query_embedding, k, **search_params)
+        if self.storage_mode != 'float32' and not exact:
+            return self._search_quantized_ids(query_embedding, k, **search_params)
+        if self.search_engine == 'sqlite-vec':
+            return self._search_vec_ids(query_embedding, k)
+        return self._search_exact_ids(query_embedding, k)
+    
+    def _search_exact_ids(self, query_embedding: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Brute-force float32 top-k; returns (ids, scores)"""
+        if self.storage_mode == 'float32':
+            # One matrix-vector product scores the whole catalog
+            ids, matrix, _ = self._get_matrix()
+            scores = self._mask_deleted(ids, matrix @ query_embedding)
+            top = self._top_k(scores, k)
+            return ids[top], scores[top]
+        
+        # Quantized modes keep no float32 copy in memory: stream it from SQLite
+        return self._rescore_ids(query_embedding, None, k)
+    
+    def _search_quantized_ids(self, query_embedding: np.ndarray, k: int, rows: Optional[np.ndarray] = None,
+                              snapshot: Optional[tuple] = None, rescore_factor: Optional[int] = None,
+                              **search_params) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Coarse pass over the quantized matrix (or only the given rows of it),
+        then float32 rescoring of the shortlist
+        rows index into snapshot, the (ids, matrix, scales) they were computed
+        from; a fresh _get_matrix() could have been merged or compacted since.
+        Returns: (ids, scores) with exact cosine scores
+        """
+        if rescore_factor is not None and rescore_factor < 1:
+            raise ValueError("rescore_factor must be at least 1")
+        ids, codes, scales = snapshot if snapshot is not None else self._get_matrix()
+        if rows is not None:
+            ids, codes = ids[rows], codes[rows]
+            scales = scales[rows] if scales is not None else None
+        coarse = self._mask_deleted(ids, coarse_scores(codes, scales, query_embedding, self.storage_mode))
+        shortlist = ids[self._top_k(coarse, k * (rescore_factor or self.rescore_factor))]
+        return self._rescore_ids(query_embedding, shortlist, k)
+    
+    def _rescore_ids(self, query_embedding: np.ndarray, product_ids: Optional[np.ndarray],
+                     k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Exact float32 top-k among the given products (all if None), reading their vectors from SQLite"""
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for ids, vectors in self._read_embeddings(product_ids):
+            ids = np.concatenate([best_ids, ids])
+            scores = np.concatenate([best_scores, vectors @ query_embedding])
+            top = self._top_k(scores, k)
+            best_ids, best_scores = ids[top], scores[top]
+        return best_ids, best_scores
+    
+    def _filter_ids(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Sorted ids of the products matching filters, resolved through the SQL indexes"""
+        where, params = filter_clause(filters)
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT id FROM products WHERE {where} ORDER BY id", params)
+        return np.fromiter((row[0] for row in cursor), dtype=np.int64)
+    
+    def _search_filtered_ids(self, query_embedding: np.ndarray, k: int, filters: Dict[str, Any],
+                             exact: bool = False, **search_params) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k restricted to products matching filters
+        The predicate is resolved to a candidate set first and only that slice
+        is scored, so a selective filter still returns a full top-k. ANN
+        indexes are bypassed: the slice is scanned exactly.
+        """
+        if self.search_engine == 'sqlite-vec' and self.storage_mode == 'float32':
+            return self._search_vec_filtered_ids(query_embedding, k, filters)
+        
+        candidate_ids = self._filter_ids(filters)
+        if self.storage_mode != 'float32' and exact:
+            return self._rescore_ids(query_embedding, candidate_ids, k)
+        
+        # Map candidate ids to matrix rows (the resident ids are kept sorted);
+        # the rows are only valid for this snapshot
+        snapshot = self._get_matrix()
+        ids, matrix, _ = snapshot
+        rows = self._rows_of(ids, candidate_ids)
+        
+        if self.storage_mode != 'float32':
+            return self._search_quantized_ids(query_embedding, k, rows=rows, snapshot=snapshot, **search_params)
+        
+        scores = matrix[rows] @ query_embedding
+        top = self._top_k(scores, k)
+        return ids[rows[top]], scores[top]
+    
+    def _search_vec_filtered_ids(self, query_embedding: np.ndarray, k: int,
+                                 filters: Dict[str, Any]) -> tuple[np.ndarray, np.ndarray]:
+        """Filtered KNN inside SQLite: the products predicate runs before any distance is computed"""
+        where, params = filter_clause(filters, alias='p')
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT e.product_id, vec_distance_cosine(e.embedding, ?) AS distance
+            FROM products p
+            JOIN embeddings e ON e.product_id = p.id
+            WHERE {where}
+            ORDER BY distance
+            LIMIT ?
+        """, [query_embedding.astype(np.float32).tobytes()] + params + [k])
+        rows = cursor.fetchall()
+        ids = np.array([row['product_id'] for row in rows], dtype=np.int64)
+        scores = 1.0 - np.array([row['distance'] for row in rows], dtype=np.float32)
+        return ids, scores
+    
+    def _search_vec_ids(self, query_embedding: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """KNN inside SQLite via the vec0 table; returns (ids, scores)"""
+        cursor = self.conn.cursor()
+        # The 'k = ?' constraint is the portable spelling of LIMIT for vec0
+        # (LIMIT is only pushed into the virtual table on SQLite >= 3.41)
+        cursor.execute("""
+            SELECT rowid, distance
+            FROM vec_embeddings
+            WHERE embedding MATCH ? AND k = ?
+            ORDER BY distance
+        """, (query_embedding.astype(np.float32).tobytes(), k))
+        rows = cursor.fetchall()
+        ids = np.array([row['rowid'] for row in rows], dtype=np.int64)
+        # vec0 cosine distance is 1 - cosine similarity
+        scores = 1.0 - np.array([row['distance'] for row in rows], dtype=np.float32)
+        return ids, scores
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest scores, best first"""
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
     
-    def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
-        """Calculate cosine similarity between two vectors"""
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        return float(dot_product / (norm1 * norm2))
+    def _fetch_products(self, product_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Hydrate product rows for the given ids, keyed by id"""
+        if not product_ids:
+            return {}
+        placeholders = ','.join('?' * len(product_ids))
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT id, name, description, category, price
+            FROM products
+            WHERE id IN ({placeholders})
+        """, product_ids)
+        return {row['id']: dict(row) for row in cursor.fetchall()}
     
     def insert_product(self, name: str, description: str, category: str, price: float) -> int:
         """Insert a product and its embedding into the database"""
@@ -89,8 +743,8 @@ class VectorDB:
         product_id = cursor.lastrowid
         
         # Generate and store embedding
-        combined_text = f"{name} {description} {category}"
-        embedding = self._generate_embedding(combined_text)
+        combined_text = self._product_text(name, description, category)
+        embedding = self._embed_texts([combined_text])[0]
         embedding_blob = embedding.tobytes()
         
         cursor.execute("""
@@ -98,62 +752,468 @@ class VectorDB:
             VALUES (?, ?)
         """, (product_id, embedding_blob))
         
-        self.conn.commit()
+        if self.search_engine == 'sqlite-vec':
+            cursor.execute("""
+                INSERT INTO vec_embeddings (rowid, embedding)
+                VALUES (?, ?)
+            """, (product_id, embedding_blob))
+        
+        self._commit_embeddings([product_id], embedding[None, :])
         return product_id
     
-    def search_semantic(self, query: str, limit: int = 20) -> tuple[List[Dict[str, Any]], float]:
+    def insert_products_bulk(self, products: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """
+        Insert many products with batched encoding and one transaction per batch
+        Each product is a dict with name, description, category and price.
+        Returns: number of products inserted
+        """
+        products = iter(products)
+        total = 0
+        while True:
+            batch = list(islice(products, batch_size))
+            if not batch:
+                break
+            
+            # Encode outside the write transaction so readers are not blocked
+            embeddings = self.encode_products(batch)
+            self.insert_encoded_products(batch, embeddings)
+            total += len(batch)
+        
+        return total
+    
+    def encode_products(self, products: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Embeddings for a batch of products (persistent store first, then the model)
+        Touches no product tables, so it can run concurrently with writes.
+        """
+        texts = [self._product_text(p['name'], p['description'], p['category']) for p in products]
+        return self._embed_texts(texts)
+    
+    def insert_encoded_products(self, products: List[Dict[str, Any]], embeddings: np.ndarray,
+                                product_ids: Optional[List[int]] = None) -> List[int]:
+        """
+        Write a batch of products with precomputed embeddings in one transaction
+        product_ids assigns the ids explicitly (e.g. ids allocated by a shard
+        coordinator); by default a contiguous range after the current maximum is used.
+        Returns: the new product ids
+        """
+        cursor = self.conn.cursor()
+        try:
+            if not self.conn.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
+            if product_ids is None:
+                # Reserve a contiguous id range for the batch under the write lock
+                cursor.execute("""
+                    SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'products'), 0),
+                               COALESCE((SELECT MAX(id) FROM products), 0))
+                """)
+                first_id = cursor.fetchone()[0] + 1
+                product_ids = list(range(first_id, first_id + len(products)))
+            else:
+                product_ids = [int(product_id) for product_id in product_ids]
+            
+            cursor.executemany("""
+                INSERT INTO products (id, name, description, category, price)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(product_id, p['name'], p['description'], p['category'], p['price'])
+                  for product_id, p in zip(product_ids, products)])
+            
+            embedding_rows = [(product_id, np.asarray(embedding, dtype=np.float32).tobytes())
+                              for product_id, embedding in zip(product_ids, embeddings)]
+            cursor.executemany("""
+                INSERT INTO embeddings (product_id, embedding)
+                VALUES (?, ?)
+            """, embedding_rows)
+            
+            if self.search_engine == 'sqlite-vec':
+                cursor.executemany("""
+                    INSERT INTO vec_embeddings (rowid, embedding)
+                    VALUES (?, ?)
+                """, embedding_rows)
+            
+            self._commit_embeddings(product_ids, embeddings)
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+        return product_ids
+    
+    def _commit_embeddings(self, product_ids: List[int], embeddings: np.ndarray):
+        """
+        Commit the current transaction and register its embeddings with the
+        resident matrix and ANN index. Both happen under the matrix lock so a
+        concurrent matrix load can never see the rows without the registration
+        (or vice versa) and count them twice.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._matrix_lock:
+            self._record_embeddings_write()
+            self.conn.commit()
+            if self._matrix is not None:
+                self._pending_ids.extend(product_ids)
+                self._pending_vectors.append(embeddings)
+            if self._index_ready:
+                self.ann_index.add(np.asarray(product_ids, dtype=np.int64), self._normalize(embeddings))
+            self._bump_data_version()
+    
+    def _bump_data_version(self):
+        """Record a committed write (after the in-memory structures reflect it)"""
+        self.data_version = next(self._version_counter)
+    
+    def _stored_vectors(self, product_ids: List[int]) -> np.ndarray:
+        """Current normalized embeddings of the given products, in order (zeros if missing)"""
+        vectors = np.zeros((len(product_ids), self.embedding_dim), dtype=np.float32)
+        positions = {product_id: i for i, product_id in enumerate(product_ids)}
+        for ids, chunk in self._read_embeddings(product_ids):
+            for product_id, vector in zip(ids, chunk):
+                vectors[positions[int(product_id)]] = vector
+        return vectors
+    
+    def update_product(self, product_id: int, name: Optional[str] = None, description: Optional[str] = None,
+                       category: Optional[str] = None, price: Optional[float] = None,
+                       embedding: Optional[np.ndarray] = None) -> bool:
+        """
+        Update the given fields of a product
+        The product is re-embedded only when its text (name, description or
+        category) changes; its row in the resident matrix and its ANN entry
+        are then patched in place. embedding, if given, is the precomputed
+        embedding of the new text and is used instead of encoding it.
+        Returns: False if the product does not exist
+        """
+        current = self._fetch_products([product_id]).get(product_id)
+        if current is None:
+            return False
+        changes = {'name': name, 'description': description, 'category': category, 'price': price}
+        updated = {**current, **{key: value for key, value in changes.items() if value is not None}}
+        
+        old_text = self._product_text(current['name'], current['description'], current['category'])
+        new_text = self._product_text(updated['name'], updated['description'], updated['category'])
+        if new_text == old_text:
+            embedding = None
+        elif embedding is None:
+            # Encode outside the write transaction so readers are not blocked
+            embedding = self._embed_texts([new_text])
+        else:
+            embedding = np.asarray(embedding, dtype=np.float32).reshape(1, self.embedding_dim)
+        
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
+                UPDATE products SET name = ?, description = ?, category = ?, price = ?
+                WHERE id = ?
+            """, (updated['name'], updated['description'], updated['category'], float(updated['price']),
+                  product_id))
+            if cursor.rowcount == 0:
+                # Deleted since it was read
+                self.conn.rollback()
+                return False
+            
+            if embedding is None:
+                self.conn.commit()
+                self._bump_data_version()
+                return True
+            
+            old_vectors = self._stored_vectors([product_id])
+            blob = embedding[0].astype(np.float32).tobytes()
+            cursor.execute("UPDATE embeddings SET embedding = ? WHERE product_id = ?", (blob, product_id))
+            if self.search_engine == 'sqlite-vec':
+                cursor.execute("DELETE FROM vec_embeddings WHERE rowid = ?", (product_id,))
+                cursor.execute("INSERT INTO vec_embeddings (rowid, embedding) VALUES (?, ?)", (product_id, blob))
+            self._commit_replacements([product_id], embedding, old_vectors)
+        except Exception:
+            self.conn.rollback()
+            raise
+        return True
+    
+    def delete_product(self, product_id: int) -> bool:
+        """
+        Delete a product and its embedding
+        Returns: False if the product does not exist
+        """
+        return self.delete_products([product_id]) == 1
+    
+    def delete_products(self, product_ids: List[int]) -> int:
+        """
+        Delete products and their embeddings in one transaction
+        Their matrix rows become tombstones (skipped by every search) until
+        compaction; the ANN index drops them.
+        Returns: number of products deleted (missing ids are ignored)
+        """
+        cursor = self.conn.cursor()
+        try:
+            if not self.conn.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
+            product_ids = [int(product_id) for product_id in product_ids]
+            existing = []
+            for start in range(0, len(product_ids), HYDRATE_CHUNK):
+                chunk = product_ids[start:start + HYDRATE_CHUNK]
+                cursor.execute(f"SELECT id FROM products WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                existing.extend(row['id'] for row in cursor.fetchall())
+            if not existing:
+                self.conn.rollback()
+                return 0
+            
+            # The stored vectors locate the entries in the ANN index
+            old_vectors = self._stored_vectors(existing) if self.ann_index is not None else None
+            for start in range(0, len(existing), HYDRATE_CHUNK):
+                chunk = existing[start:start + HYDRATE_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f"DELETE FROM products WHERE id IN ({placeholders})", chunk)
+                cursor.execute(f"DELETE FROM embeddings WHERE product_id IN ({placeholders})", chunk)
+                if self.search_engine == 'sqlite-vec':
+                    cursor.execute(f"DELETE FROM vec_embeddings WHERE rowid IN ({placeholders})", chunk)
+            self._commit_deletes(existing, old_vectors)
+        except Exception:
+            self.conn.rollback()
+            raise
+        return len(existing)
+    
+    def _commit_replacements(self, product_ids: List[int], embeddings: np.ndarray, old_vectors: np.ndarray):
+        """
+        Commit the current transaction and overwrite the products' rows in the
+        resident matrix (in place, also in the sidecar files) and ANN index
+        """
+        ids = np.asarray(product_ids, dtype=np.int64)
+        vectors = self._normalize(embeddings)
+        with self._matrix_lock:
+            self._record_embeddings_write()
+            self.conn.commit()
+            if self._matrix is not None:
+                self._fold_pending()
+                rows = self._rows_of(self._ids, ids)
+                codes, scales = quantize(vectors[np.isin(ids, self._ids[rows])], self.storage_mode)
+                if self.sidecar is not None:
+                    self.sidecar.write_rows(rows, codes, scales)
+                    self._stamp_sidecar()
+                else:
+                    self._matrix[rows] = codes
+                    if scales is not None:
+                        self._scales[rows] = scales
+            if self._index_ready:
+                self.ann_index.update(ids, old_vectors, vectors)
+            self._bump_data_version()
+    
+    def _commit_deletes(self, product_ids: List[int], old_vectors: Optional[np.ndarray]):
+        """
+        Commit the current transaction and tombstone the products in the
+        resident matrix and ANN index, compacting either once tombstones pile up
+        """
+        ids = np.asarray(product_ids, dtype=np.int64)
+        with self._matrix_lock:
+            self._record_embeddings_write()
+            self.conn.commit()
+            if self._matrix is not None:
+                self._fold_pending()
+                self._deleted_ids = np.union1d(self._deleted_ids, ids[np.isin(ids, self._ids)])
+                if len(self._deleted_ids) >= max(COMPACT_MIN_TOMBSTONES, COMPACT_RATIO * len(self._ids)):
+                    self._compact_matrix()
+                    self._stamp_sidecar()
+            if self._index_ready:
+                self.ann_index.remove(ids, old_vectors)
+                if self.ann_index.tombstones >= max(COMPACT_MIN_TOMBSTONES,
+                                                    COMPACT_RATIO * len(self.ann_index)):
+                    # Rebuilt without the deleted entries on the next search
+                    self._index_ready = False
+                    self.ann_index.remove_file()
+            self._bump_data_version()
+    
+    def search_semantic(self, query: str, limit: int = 20, exact: bool = False,
+                        filters: Optional[Dict[str, Any]] = None, timer: Optional[StageTimer] = None,
+                        **search_params) -> tuple[List[Dict[str, Any]], float]:
         """
         Semantic search using vector similarity
+        Uses the ANN index or quantized storage when configured (unless
+        exact=True); extra keyword arguments such as ef_search, nprobe or
+        rescore_factor tune that path. filters (category, min_price,
+        max_price) restrict the search to matching products before scoring.
+        Stages (encode, search, fetch) are recorded in timer when given;
+        'search' covers scoring and top-k selection, which sqlite-vec and the
+        ANN indexes perform in a single call.
         Returns: (results, execution_time)
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
+        timer = timer or StageTimer()
+        filters = parse_filters(filters)
         
         # Generate query embedding
-        query_embedding = self._generate_embedding(query)
+        with timer.stage('encode'):
+            query_embedding = self._encode_query(query)
         
-        cursor = self.conn.cursor()
+        results = self.search_embedding(query_embedding, limit, exact, filters, timer, **search_params)
         
-        # Get all products with embeddings
-        cursor.execute("""
-            SELECT p.id, p.name, p.description, p.category, p.price, e.embedding
-            FROM products p
-            JOIN embeddings e ON p.id = e.product_id
-        """)
+        execution_time = (time.perf_counter_ns() - start_ns) / 1e9
         
-        results = []
-        for row in cursor.fetchall():
-            # Convert blob back to numpy array
-            stored_embedding = np.frombuffer(row['embedding'], dtype=np.float32)
-            
-            # Calculate similarity
-            similarity = self._cosine_similarity(query_embedding, stored_embedding)
+        return results, execution_time
+    
+    def search_embedding(self, query_embedding: np.ndarray, limit: int = 20, exact: bool = False,
+                         filters: Optional[Dict[str, Any]] = None, timer: Optional[StageTimer] = None,
+                         **search_params) -> List[Dict[str, Any]]:
+        """
+        Top-limit products for an already encoded (L2-normalized) query
+        Same options as search_semantic; records the search and fetch stages.
+        Returns: products best first, each with its similarity
+        """
+        timer = timer or StageTimer()
+        filters = parse_filters(filters)
+        
+        with timer.stage('search'):
+            top_ids, scores = self._search_ids(query_embedding, limit, exact, filters, **search_params)
+        
+        # Only hydrate the winning rows
+        with timer.stage('fetch'):
+            top_ids = [int(product_id) for product_id in top_ids]
+            products = self._fetch_products(top_ids)
             
-            results.append({
-                'id': row['id'],
-                'name': row['name'],
-                'description': row['description'],
-                'category': row['category'],
-                'price': row['price'],
-                'similarity': round(similarity, 4)
-            })
+            results = []
+            for product_id, score in zip(top_ids, scores):
+                product = products.get(product_id)
+                if product is None:
+                    continue
+                product['similarity'] = round(float(score), 4)
+                results.append(product)
+        return results
+    
+    def search_semantic_batch(self, queries: List[str], limit: int = 20, exact: bool = False,
+                              filters: Optional[Dict[str, Any]] = None, **search_params) -> tuple[List[List[Dict[str, Any]]], Dict[str, Any]]:
+        """
+        Semantic search for many queries in one pass
+        Queries are encoded in batched model calls and, on the float32 matrix
+        path, scored with one matrix-matrix product per block of queries.
+        Returns: (results per query, per-stage timings in ms)
+        """
+        timer = StageTimer()
+        filters = parse_filters(filters)
         
-        # Sort by similarity (highest first)
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        results = results[:limit]
+        with timer.stage('encode'):
+            query_embeddings, cache_hits = self._encode_queries(queries)
         
-        execution_time = time.time() - start_time
+        batch_results = self.search_embeddings_batch(query_embeddings, limit, exact, filters, timer, **search_params)
         
-        return results, execution_time
+        timings = timer.as_ms()
+        timings['queries'] = len(queries)
+        timings['query_cache_hits'] = cache_hits
+        return batch_results, timings
+    
+    def search_embeddings_batch(self, query_embeddings: np.ndarray, limit: int = 20, exact: bool = False,
+                                filters: Optional[Dict[str, Any]] = None, timer: Optional[StageTimer] = None,
+                                **search_params) -> List[List[Dict[str, Any]]]:
+        """
+        Top-limit products for each row of an already encoded query matrix
+        Records the score and hydrate stages.
+        Returns: results per query, best first
+        """
+        timer = timer or StageTimer()
+        filters = parse_filters(filters)
+        
+        with timer.stage('score'):
+            if self.storage_mode == 'float32' and (self.ann_index is None or exact) and not filters:
+                ids, matrix, _ = self._get_matrix()
+                # Bound the (products x queries) score block to ~64M floats
+                block_size = max(1, BATCH_SCORE_ELEMENTS // max(len(ids), 1))
+                ranked = []
+                deleted_rows = self._rows_of(ids, self._deleted_ids)
+                for start in range(0, len(query_embeddings), block_size):
+                    scores = matrix @ query_embeddings[start:start + block_size].T
+                    scores[deleted_rows] = -np.inf
+                    for column in range(scores.shape[1]):
+                        top = self._top_k(scores[:, column], limit)
+                        ranked.append((ids[top], scores[top, column]))
+            else:
+                # ANN / quantized / filtered paths have no shared scan to batch; query them one by one
+                ranked = [self._search_ids(embedding, limit, exact, filters, **search_params)
+                          for embedding in query_embeddings]
+        
+        # Hydrate every winning row with a single query
+        with timer.stage('hydrate'):
+            all_ids = sorted({int(product_id) for top_ids, _ in ranked for product_id in top_ids})
+            products = {}
+            for start in range(0, len(all_ids), HYDRATE_CHUNK):
+                products.update(self._fetch_products(all_ids[start:start + HYDRATE_CHUNK]))
+            
+            batch_results = []
+            for top_ids, scores in ranked:
+                results = []
+                for product_id, score in zip(top_ids, scores):
+                    product = products.get(int(product_id))
+                    if product is None:
+                        continue
+                    results.append({**product, 'similarity': round(float(score), 4)})
+                batch_results.append(results)
+        return batch_results
+    
+    def evaluate_recall(self, queries: List[str], k: int = 10, **search_params) -> Dict[str, Any]:
+        """
+        Measure recall@k of the approximate search path (ANN index or quantized
+        storage) against the exact float32 path
+        Returns recall and mean latency (ms) of both paths for the given queries
+        """
+        if self.ann_index is None and self.storage_mode == 'float32':
+            raise ValueError("evaluate_recall requires an ANN index (index_type 'ivf' or 'hnsw') "
+                             "or a quantized storage_mode ('int8' or 'binary')")
+        
+        recalls, exact_times, approx_times = [], [], []
+        for query in queries:
+            query_embedding = self._encode_query(query)
+            
+            start_time = time.perf_counter()
+            exact_ids, _ = self._search_exact_ids(query_embedding, k)
+            exact_times.append(time.perf_counter() - start_time)
+            
+            start_time = time.perf_counter()
+            approx_ids, _ = self._search_ids(query_embedding, k, **search_params)
+            approx_times.append(time.perf_counter() - start_time)
+            
+            if len(exact_ids):
+                recalls.append(len(np.intersect1d(exact_ids, approx_ids)) / len(exact_ids))
+        
+        return {
+            'index_type': self.index_type,
+            'storage_mode': self.storage_mode,
+            'k': k,
+            'queries': len(queries),
+            'search_params': search_params,
+            'recall_at_k': round(float(np.mean(recalls)), 4) if recalls else None,
+            'exact_ms': round(float(np.mean(exact_times)) * 1000, 3) if exact_times else None,
+            'approx_ms': round(float(np.mean(approx_times)) * 1000, 3) if approx_times else None
+        }
+    
+    def memory_stats(self) -> Dict[str, Any]:
+        """Memory held by the resident search matrix (0 until it is first loaded)"""
+        with self._matrix_lock:
+            vectors = len(self._ids) if self._ids is not None else 0
+            matrix_bytes = self._matrix.nbytes if self._matrix is not None else 0
+            if self._scales is not None:
+                matrix_bytes += self._scales.nbytes
+            ids_bytes = self._ids.nbytes if self._ids is not None else 0
+        return {
+            'storage_mode': self.storage_mode,
+            'backing': 'mmap' if self.sidecar is not None else 'heap',
+            'sidecar_file_bytes': self.sidecar.file_bytes() if self.sidecar is not None else None,
+            'resident_vectors': vectors,
+            'tombstones': len(self._deleted_ids),
+            'matrix_bytes': matrix_bytes,
+            'ids_bytes': ids_bytes,
+            'bytes_per_vector': round(matrix_bytes / vectors, 1) if vectors else None,
+            'float32_bytes_per_vector': self.embedding_dim * 4
+        }
     
     def get_all_products(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get all products"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT id, name, description, category, price
-            FROM products
-            LIMIT ?
-        """, (limit,))
-        return [dict(row) for row in cursor.fetchall()]
+        """Get the first limit products by id"""
+        return self.get_products_page(limit=limit)[0]
+    
+    def get_products_page(self, after_id: int = 0, limit: int = 100,
+                          filters: Optional[Dict[str, Any]] = None) -> tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Keyset page of products in id order, starting after product after_id
+        Returns: (products, cursor of the next page or None after the last)
+        """
+        return fetch_page(self.conn, after_id, limit, parse_filters(filters))
+    
+    def iter_products(self, after_id: int = 0, limit: Optional[int] = None,
+                      filters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Every product after after_id (at most limit) in id order, holding one page at a time"""
+        filters = parse_filters(filters)
+        return iter_pages(lambda after, size: self.get_products_page(after, size, filters), after_id, limit)
     
     def get_stats(self) -> Dict[str, Any]:
         """Get database statistics"""
@@ -177,19 +1237,64 @@ class VectorDB:
             'avg_price': round(avg_price, 2),
             'total_embeddings': total_embeddings,
             'embedding_dimension': self.embedding_dim,
+            'encoder': self.encoder.stats(),
+            'index_type': self.index_type,
+            'search_engine': self.search_engine,
+            'ready': self.is_ready,
+            'memory': self.memory_stats(),
+            'query_cache': self.query_cache.stats(),
+            'embedding_store': self.embedding_store.stats() if self.embedding_store else None,
+            'encoder_pool': self.encoder_pool.stats() if self.encoder_pool else None,
+            'query_batcher': self.query_batcher.stats() if self.query_batcher else None,
             'db_type': 'Vector Database'
         }
     
     def clear_all(self):
         """Clear all products and embeddings"""
         cursor = self.conn.cursor()
+        if self.search_engine == 'sqlite-vec':
+            cursor.execute("DELETE FROM vec_embeddings")
         cursor.execute("DELETE FROM embeddings")
         cursor.execute("DELETE FROM products")
-        self.conn.commit()
+        
+        with self._matrix_lock:
+            self._record_embeddings_write()
+            self.conn.commit()
+            self._ids = np.empty(0, dtype=np.int64)
+            self._matrix, self._scales = quantize(
+                np.empty((0, self.embedding_dim), dtype=np.float32), self.storage_mode)
+            self._pending_ids = []
+            self._pending_vectors = []
+            self._deleted_ids = np.empty(0, dtype=np.int64)
+            if self.sidecar is not None:
+                # Compact the sidecar down to nothing
+                self.sidecar.rewrite(self._ids, self._matrix, self._scales)
+                self._stamp_sidecar()
+            if self.ann_index is not None:
+                # Rebuilt from the new data on the next search
+                self._index_ready = False
+                self.ann_index.remove_file()
+            self._bump_data_version()
     
     def close(self):
         """Close database connection"""
-        if self.conn:
-            self.conn.close()
+        if self.sidecar is not None and self._matrix is not None:
+            # Leave sidecar files stamped current for the next start
+            with self._matrix_lock:
+                self._fold_pending()
+                if len(self._deleted_ids):
+                    self._compact_matrix()
+                self._stamp_sidecar()
+        if self.ann_index is not None and self._index_ready:
+            with self._matrix_lock:
+                self._save_index(self._meta_value('embeddings_version'))
+        if self.embedding_store is not None:
+            self.embedding_store.close()
+        if self.encoder_pool is not None:
+            self.encoder_pool.close()
+        if self.query_batcher is not None:
+            self.query_batcher.close()
+        if self.pool:
+            self.pool.close_all()
 
 # Made with Bob
@@ -161,15 +161,20 @@ function displayStats(data) {
     `;
 }
 
+function formatEngineTime(section) {
+    if (section.error) {
+        return `⚠️ ${section.error}`;
+    }
+    return `⚡ ${section.execution_time}ms (${section.count} results)`;
+}
+
 function displayResults(data) {
     const tradResults = data.traditional.results;
     const vecResults = data.vector.results;
     
-    // Update execution times
-    document.getElementById('tradTime').textContent = 
-        `⚡ ${data.traditional.execution_time}ms (${data.traditional.count} results)`;
-    document.getElementById('vecTime').textContent = 
-        `⚡ ${data.vector.execution_time}ms (${data.vector.count} results)`;
+    // Update execution times (an engine that failed or timed out reports an error instead)
+    document.getElementById('tradTime').textContent = formatEngineTime(data.traditional);
+    document.getElementById('vecTime').textContent = formatEngineTime(data.vector);
     
     // Display traditional results
     const tradResultsEl = document.getElementById('tradResults');
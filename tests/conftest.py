@@ -0,0 +1,103 @@
+"""
+Shared fixtures
+Backend modules import each other by flat name, so backend/ goes on the
+path. Every vector database uses the deterministic stub encoder: no model is
+downloaded and results are the same on every machine.
+"""
+import os
+import sys
+import time
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+from sample_data import generate_products  # noqa: E402
+from sharding import ShardedVectorDB  # noqa: E402
+from traditional_db import TraditionalDB  # noqa: E402
+from vector_db import VectorDB  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def catalog():
+    """600 synthetic products; ids 1..600 once inserted into an empty database"""
+    return list(generate_products(600))
+
+
+@pytest.fixture
+def make_vector_db(tmp_path):
+    """
+    Factory for stub-encoded vector stores under tmp_path: a VectorDB, or a
+    ShardedVectorDB when shards is given. Open ones are closed afterwards.
+    """
+    opened = []
+
+    def make(name='vector.db', shards=None, **options):
+        options.setdefault('encoder', 'stub')
+        options.setdefault('persistent_cache', False)
+        path = str(tmp_path / name)
+        db = VectorDB(path, **options) if shards is None else ShardedVectorDB(path, shards=shards, **options)
+        opened.append(db)
+        return db
+
+    yield make
+    for db in opened:
+        # A sharded coordinator has no pool of its own and may be closed twice
+        if db.pool is None or not db.pool._closed:
+            db.close()
+
+
+@pytest.fixture
+def traditional_db(tmp_path):
+    db = TraditionalDB(str(tmp_path / 'traditional.db'))
+    yield db
+    db.close()
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """
+    The Flask app with stub-encoded databases in a temporary directory,
+    loaded with the sample data
+    The databases use relative paths, so the working directory stays there
+    for the session.
+    """
+    previous_cwd = os.getcwd()
+    previous_encoder = os.environ.get('VECTOR_ENCODER')
+    os.chdir(tmp_path_factory.mktemp('app'))
+    os.environ['VECTOR_ENCODER'] = 'stub'
+    import app
+
+    deadline = time.time() + 60
+    while not app.vector_db.is_ready and time.time() < deadline:
+        time.sleep(0.05)
+    assert app.vector_db.is_ready, app.vector_db.warm_up_error
+    assert app.app.test_client().post('/api/initialize').status_code == 200
+
+    yield app
+    app.vector_db.close()
+    app.traditional_db.close()
+    os.chdir(previous_cwd)
+    if previous_encoder is None:
+        os.environ.pop('VECTOR_ENCODER', None)
+    else:
+        os.environ['VECTOR_ENCODER'] = previous_encoder
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def add_app_product(app_module):
+    """Insert a product into both of the app's databases under one id; returns the id"""
+    def add(name, description, category, price):
+        product = {'name': name, 'description': description, 'category': category, 'price': price}
+        product_id = app_module.traditional_db.insert_products_batch([product])[0]
+        app_module.vector_db.insert_encoded_products([product], app_module.vector_db.encode_products([product]),
+                                                     [product_id])
+        return product_id
+
+    return add
@@ -0,0 +1,162 @@
+import itertools
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from ann_index import HNSWIndex, IVFIndex
+from sample_data import generate_queries
+
+QUERIES = generate_queries(30)
+
+ANN_PATHS = [
+    pytest.param({'index_type': 'ivf'}, id='ivf'),
+    pytest.param({'index_type': 'hnsw'}, id='hnsw'),
+]
+
+
+def _skip_without_hnswlib(options):
+    if options.get('index_type') == 'hnsw':
+        pytest.importorskip('hnswlib')
+
+
+@pytest.mark.parametrize('options', ANN_PATHS)
+def test_ann_recall_against_exact(make_vector_db, catalog, options):
+    _skip_without_hnswlib(options)
+    db = make_vector_db(**options)
+    db.insert_products_bulk(catalog)
+
+    report = db.evaluate_recall(QUERIES, k=10)
+    assert report['queries'] == len(QUERIES)
+    assert report['recall_at_k'] >= 0.9
+
+
+def test_nprobe_trades_recall_for_work(make_vector_db, catalog):
+    db = make_vector_db(index_type='ivf', index_options={'n_lists': 24})
+    db.insert_products_bulk(catalog)
+    narrow = db.evaluate_recall(QUERIES, k=10, nprobe=1)['recall_at_k']
+    assert db.evaluate_recall(QUERIES, k=10, nprobe=24)['recall_at_k'] == 1.0
+    assert narrow < 1.0
+
+
+def test_evaluate_recall_requires_an_approximate_path(make_vector_db, catalog):
+    db = make_vector_db()
+    db.insert_products_bulk(catalog[:50])
+    with pytest.raises(ValueError):
+        db.evaluate_recall(QUERIES[:2])
+
+
+@pytest.mark.parametrize('options', ANN_PATHS)
+def test_writes_during_an_index_build_reach_the_index(make_vector_db, catalog, options):
+    _skip_without_hnswlib(options)
+    db = make_vector_db(**options)
+    db.insert_products_bulk(catalog[:200])
+
+    # Commit a write between the build's snapshot and its publication
+    snapshot, written = db._get_float_matrix, []
+
+    def racing_snapshot():
+        result = snapshot()
+        if not written:
+            written.append(db.insert_product('Zyzzyva Lamp', 'zyzzyva lamp', 'Lighting', 10.0))
+        return result
+
+    db._get_float_matrix = racing_snapshot
+    results, _ = db.search_semantic('zyzzyva lamp lighting', limit=1)
+    assert results[0]['id'] == written[0] == 201
+    assert len(db.ann_index) == 201
+
+
+def test_ivf_search_sees_whole_lists_during_writes():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = IVFIndex(16, n_lists=4, nprobe=4)
+    index.build(np.arange(2000), vectors)
+
+    deadline, errors = time.monotonic() + 2, []
+
+    def churn():
+        for product_id in itertools.cycle(range(2000)):
+            if time.monotonic() > deadline:
+                break
+            index.remove([product_id], vectors[product_id:product_id + 1])
+            index.add([product_id], vectors[product_id:product_id + 1])
+
+    def search():
+        for product_id in itertools.cycle(range(0, 2000, 7)):
+            if time.monotonic() > deadline:
+                break
+            query = vectors[product_id]
+            try:
+                ids, scores = index.search(query, 5)
+                # Every returned score belongs to the returned id
+                if not np.allclose(scores, vectors[ids] @ query, atol=1e-4):
+                    errors.append(ids)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=churn)] + [threading.Thread(target=search) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_hnsw_readded_labels_are_not_tombstones():
+    pytest.importorskip('hnswlib')
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((100, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = HNSWIndex(16)
+    index.build(np.arange(100), vectors)
+
+    index.remove(np.arange(10), vectors[:10])
+    index.remove(np.arange(5), vectors[:5])
+    assert index.tombstones == 10 and len(index) == 90
+    index.add(np.arange(10), vectors[:10])
+    assert index.tombstones == 0 and len(index) == 100
+    assert len(index.search(vectors[0], 100, ef_search=200)[0]) == 100
+
+
+def test_ivf_rejects_nprobe_below_one(make_vector_db, catalog):
+    db = make_vector_db(index_type='ivf')
+    db.insert_products_bulk(catalog[:100])
+    with pytest.raises(ValueError):
+        db.search_semantic('lamp', nprobe=-1)
+
+
+@pytest.mark.parametrize('params', [{'nprobe': -10}, {'nprobe': 0}, {'ef_search': -1}, {'rescore_factor': -2},
+                                    {'nprobe': 'many'}])
+def test_search_endpoints_reject_bad_tuning_parameters(client, params):
+    for endpoint, body in (('/api/search/vector', {'query': 'lamp'}),
+                           ('/api/search/vector/batch', {'queries': ['lamp']}),
+                           ('/api/search/hybrid', {'query': 'lamp'}),
+                           ('/api/search/compare', {'query': 'lamp'})):
+        response = client.post(endpoint, json={**body, **params})
+        assert response.status_code == 400, endpoint
+        assert 'error' in response.json
+
+
+def test_search_endpoint_accepts_tuning_parameters(client):
+    response = client.post('/api/search/vector', json={'query': 'lamp', 'nprobe': 4, 'ef_search': 32,
+                                                       'rescore_factor': 2})
+    assert response.status_code == 200
+
+
+def test_recall_endpoint_measures_the_ivf_index(client, app_module, make_vector_db, catalog, monkeypatch):
+    ivf_db = make_vector_db(index_type='ivf')
+    ivf_db.insert_products_bulk(catalog)
+    ivf_db.warm_up()
+    monkeypatch.setattr(app_module, 'vector_db', ivf_db)
+
+    response = client.post('/api/search/vector/recall', json={'queries': QUERIES[:10], 'k': 5, 'nprobe': 4})
+    assert response.status_code == 200
+    assert response.json['queries'] == 10 and response.json['recall_at_k'] >= 0.8
+    for body in ({'queries': QUERIES[:2], 'k': 0}, {'queries': []}):
+        assert client.post('/api/search/vector/recall', json=body).status_code == 400
+    # The app's own database is exact, which has nothing to measure
+    monkeypatch.undo()
+    assert client.post('/api/search/vector/recall', json={'queries': QUERIES[:2]}).status_code == 400
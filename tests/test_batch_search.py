@@ -0,0 +1,58 @@
+import pytest
+
+from sample_data import generate_queries
+
+QUERIES = generate_queries(12)
+
+
+def _ids(results):
+    return [product['id'] for product in results]
+
+
+@pytest.mark.parametrize('options', [
+    pytest.param({}, id='exact'),
+    pytest.param({'storage_mode': 'int8'}, id='int8'),
+    pytest.param({'index_type': 'ivf'}, id='ivf'),
+])
+def test_batch_search_matches_single_searches(make_vector_db, catalog, options):
+    db = make_vector_db(**options)
+    db.insert_products_bulk(catalog)
+    filters = {'category': ['Kitchen', 'Electronics']}
+
+    batch, timings = db.search_semantic_batch(QUERIES, limit=7)
+    assert timings['queries'] == len(QUERIES)
+    assert [_ids(results) for results in batch] == [_ids(db.search_semantic(q, limit=7)[0]) for q in QUERIES]
+
+    batch, _ = db.search_semantic_batch(QUERIES, limit=7, filters=filters)
+    assert ([_ids(results) for results in batch]
+            == [_ids(db.search_semantic(q, limit=7, filters=filters)[0]) for q in QUERIES])
+
+
+def test_batch_endpoint_matches_single_searches(client):
+    queries = ['desk lamp', 'running shoes']
+    batch = client.post('/api/search/vector/batch', json={'queries': queries, 'limit': 4}).json
+    assert batch['count'] == 2
+    for query, entry in zip(queries, batch['results']):
+        single = client.post('/api/search/vector', json={'query': query, 'limit': 4}).json['results']
+        assert entry['query'] == query
+        assert _ids(entry['results']) == _ids(single)
+
+
+@pytest.mark.parametrize('body', [
+    {'queries': []},
+    {'queries': 'lamp'},
+    {'queries': ['lamp'], 'limit': 0},
+    {'queries': ['lamp'], 'limit': -1},
+    {'queries': ['lamp'], 'limit': 'ten'},
+])
+def test_batch_endpoint_rejects_bad_requests(client, body):
+    response = client.post('/api/search/vector/batch', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def test_batch_endpoint_caps_limit_and_query_count(client, app_module):
+    too_deep = {'queries': ['lamp'], 'limit': app_module.MAX_SEARCH_LIMIT + 1}
+    assert client.post('/api/search/vector/batch', json=too_deep).status_code == 400
+    too_many = {'queries': ['lamp'] * (app_module.MAX_BATCH_QUERIES + 1)}
+    assert client.post('/api/search/vector/batch', json=too_many).status_code == 400
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from encoders import QuantizedEncoder, StubEncoder, create_encoder
+
+
+def test_stub_encoder_is_deterministic():
+    first, second = StubEncoder(), StubEncoder()
+    texts = ['wireless noise cancelling headphones', 'wireless headphones', 'cast iron skillet']
+    vectors = first.encode(texts)
+    assert vectors.shape == (3, 384) and vectors.dtype == np.float32
+    assert np.array_equal(vectors, second.encode(texts))
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Shared words make texts similar
+    assert normalized[0] @ normalized[1] > normalized[0] @ normalized[2]
+
+
+def test_create_encoder_backends():
+    assert isinstance(create_encoder('stub', embedding_dim=16), StubEncoder)
+    # The model is loaded lazily, so no torch is needed to construct it
+    quantized = create_encoder('quantized')
+    assert isinstance(quantized, QuantizedEncoder) and not quantized.loaded
+    # Embeddings of different backends never share persistent cache entries
+    assert len({create_encoder(backend).cache_key for backend in ('sentence-transformers', 'quantized', 'stub')}) == 3
+    with pytest.raises(ValueError):
+        create_encoder('onnx')
+
+
+def test_vector_db_uses_the_configured_encoder(make_vector_db):
+    db = make_vector_db(encoder='stub')
+    product_id = db.insert_product('Cast Iron Skillet', 'cast iron skillet', 'Kitchen', 30.0)
+    db.insert_product('Wireless Headphones', 'wireless headphones', 'Electronics', 80.0)
+    assert db.search_semantic('iron skillet', limit=1)[0][0]['id'] == product_id
+    assert db.get_stats()['encoder']['backend'] == 'stub'
@@ -0,0 +1,75 @@
+import pytest
+
+from filters import filter_clause, parse_filters
+
+FILTERED_PATHS = [
+    pytest.param({}, id='exact'),
+    pytest.param({'index_type': 'ivf'}, id='ivf'),
+    pytest.param({'storage_mode': 'int8'}, id='int8'),
+    pytest.param({'storage_mode': 'binary'}, id='binary'),
+]
+
+
+def _matching_ids(catalog, category, max_price):
+    return {i + 1 for i, product in enumerate(catalog)
+            if product['category'] == category and product['price'] <= max_price}
+
+
+def test_parse_filters():
+    assert parse_filters(None) is None and parse_filters({}) is None
+    assert parse_filters({'category': 'Kitchen', 'min_price': '5'}) == {'category': ['Kitchen'], 'min_price': 5.0}
+    assert filter_clause(parse_filters({'category': ['A', 'B'], 'max_price': 9})) == (
+        'category IN (?,?) AND price <= ?', ['A', 'B', 9.0])
+
+
+@pytest.mark.parametrize('filters', [{'colour': 'red'}, {'category': [1]}, {'min_price': 'cheap'}, ['Kitchen']])
+def test_malformed_filters_are_rejected(filters):
+    with pytest.raises(ValueError):
+        parse_filters(filters)
+
+
+@pytest.mark.parametrize('options', FILTERED_PATHS)
+def test_filtered_search_returns_only_and_all_matches(make_vector_db, catalog, options):
+    db = make_vector_db(**options)
+    db.insert_products_bulk(catalog)
+    filters = {'category': 'Furniture', 'max_price': 300}
+
+    results, _ = db.search_semantic('comfortable chair', limit=len(catalog), filters=filters)
+    assert {product['id'] for product in results} == _matching_ids(catalog, 'Furniture', 300)
+
+    top, _ = db.search_semantic('comfortable chair', limit=5, filters=filters)
+    assert len(top) == 5
+    assert all(product['category'] == 'Furniture' and product['price'] <= 300 for product in top)
+
+
+def test_unknown_filter_is_rejected(make_vector_db):
+    db = make_vector_db()
+    with pytest.raises(ValueError):
+        db.search_semantic('chair', filters={'colour': 'red'})
+
+
+@pytest.mark.parametrize('storage_mode', ['int8', 'binary'])
+def test_filtered_rows_stay_on_the_snapshot_they_came_from(make_vector_db, catalog, storage_mode):
+    db = make_vector_db(storage_mode=storage_mode)
+    db.insert_products_bulk(catalog)
+    db.load_search_structures()
+    # Tombstoned rows, below the compaction threshold
+    db.delete_products(range(1, 60))
+    expected = _matching_ids(catalog, 'Furniture', 300) - set(range(1, 60))
+
+    # Compact the matrix (shifting every row) right after the filtered
+    # search took its snapshot, as a concurrent delete would
+    get_matrix, calls = db._get_matrix, []
+
+    def compacting_get_matrix():
+        snapshot = get_matrix()
+        calls.append(1)
+        if len(calls) == 1:
+            with db._matrix_lock:
+                db._compact_matrix()
+        return snapshot
+
+    db._get_matrix = compacting_get_matrix
+    results, _ = db.search_semantic('comfortable chair', limit=len(catalog),
+                                    filters={'category': 'Furniture', 'max_price': 300})
+    assert {product['id'] for product in results} == expected
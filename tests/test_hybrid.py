@@ -0,0 +1,55 @@
+import pytest
+
+from hybrid import fuse
+
+
+def _ranking(*ids):
+    return [{'id': product_id, 'similarity': 1.0 - rank / 10} for rank, product_id in enumerate(ids)]
+
+
+def test_rrf_rewards_products_both_engines_rank():
+    rankings = {'traditional': _ranking(1, 2, 3), 'vector': _ranking(3, 4, 1)}
+    fused = fuse(rankings, limit=2)
+    assert [product['id'] for product in fused] == [1, 3]
+    assert fused[0]['ranks'] == {'traditional': 1, 'vector': 3}
+
+
+def test_weights_shift_the_fusion():
+    rankings = {'traditional': _ranking(1, 2), 'vector': _ranking(2, 1)}
+    assert fuse(rankings, method='weighted', weights={'vector': 2.0})[0]['id'] == 2
+    assert fuse(rankings, weights={'traditional': 2.0})[0]['id'] == 1
+
+
+@pytest.mark.parametrize('options', [{'limit': 0}, {'rrf_k': -1}, {'method': 'borda'}])
+def test_fuse_rejects_bad_options(options):
+    with pytest.raises(ValueError):
+        fuse({'vector': _ranking(1)}, **options)
+
+
+def test_hybrid_endpoint_honours_the_limit(client):
+    response = client.post('/api/search/hybrid', json={'query': 'office chair', 'limit': 3, 'candidates': 10})
+    assert response.status_code == 200
+    assert response.json['count'] == len(response.json['results']) == 3
+    assert response.json['candidates'] == {'traditional': 10, 'vector': 10}
+
+
+@pytest.mark.parametrize('body', [
+    {'limit': 0},
+    {'limit': 'ten'},
+    {'candidates': -1},
+    {'candidates': {'vector': 0}},
+    {'rrf_k': -1},
+    {'rrf_k': 'high'},
+    {'method': 'borda'},
+])
+def test_hybrid_endpoint_rejects_bad_parameters(client, body):
+    response = client.post('/api/search/hybrid', json={'query': 'lamp', **body})
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def test_hybrid_endpoint_caps_limit_and_candidates(client, app_module):
+    # One past the largest value the endpoint accepts
+    too_deep = app_module.MAX_SEARCH_LIMIT + 1
+    for body in ({'limit': too_deep}, {'candidates': too_deep}, {'candidates': {'vector': too_deep}}):
+        assert client.post('/api/search/hybrid', json={'query': 'lamp', **body}).status_code == 400
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from ingest import IngestPipeline, parse_products
+
+
+def _ndjson(products):
+    return [json.dumps(product) + '\n' for product in products]
+
+
+def _names(db):
+    return {product['id']: product['name'] for product in db.iter_products()}
+
+
+def test_parse_ndjson_and_csv():
+    lines = ['{"name": "Lamp", "description": "desk lamp", "category": "Lighting", "price": "12.5"}\n', '\n']
+    assert list(parse_products(lines, 'ndjson')) == [
+        {'name': 'Lamp', 'description': 'desk lamp', 'category': 'Lighting', 'price': 12.5}]
+    csv_lines = ['name,description,category,price\n', 'Lamp,desk lamp,Lighting,12.5\n']
+    assert list(parse_products(csv_lines, 'csv')) == list(parse_products(lines, 'ndjson'))
+
+
+@pytest.mark.parametrize('lines, fmt', [
+    (['{"name": "Lamp"}'], 'ndjson'),
+    (['not json'], 'ndjson'),
+    (['{"name": "Lamp", "description": "d", "category": "c", "price": "cheap"}'], 'ndjson'),
+    (['name,price\n', 'Lamp,1\n'], 'csv'),
+])
+def test_invalid_input_is_rejected(lines, fmt):
+    with pytest.raises(ValueError):
+        list(parse_products(lines, fmt))
+
+
+def test_pipeline_loads_both_databases_with_the_same_ids(traditional_db, make_vector_db, catalog):
+    vector_db = make_vector_db()
+    report = IngestPipeline(traditional_db, vector_db, batch_size=64).run(catalog[:300])
+    assert report['rows'] == 300 and report['batches'] == 5
+    assert _names(traditional_db) == _names(vector_db) == {i + 1: p['name'] for i, p in enumerate(catalog[:300])}
+
+
+def test_failed_vector_write_does_not_shift_ids(traditional_db, make_vector_db, catalog):
+    vector_db = make_vector_db()
+    # Ids the traditional database allocated and then lost to a rollback
+    # must not make the two databases number later products differently
+    traditional_db.insert_products_bulk(catalog[:3])
+    traditional_db.delete_products([1, 2, 3])
+    insert, calls = vector_db.insert_encoded_products, []
+
+    def failing_insert(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError('disk full')
+        return insert(*args, **kwargs)
+
+    vector_db.insert_encoded_products = failing_insert
+    with pytest.raises(RuntimeError):
+        IngestPipeline(traditional_db, vector_db, batch_size=50).run(catalog[:200])
+    # The failed batch is removed from the traditional database again
+    assert _names(traditional_db) == _names(vector_db) and len(_names(vector_db)) == 50
+
+    IngestPipeline(traditional_db, vector_db, batch_size=50).run(catalog[200:300])
+    assert _names(traditional_db) == _names(vector_db) and len(_names(vector_db)) == 150
+    product_id = max(_names(vector_db))
+    assert traditional_db.update_product(product_id, name='Renamed')
+    assert vector_db.update_product(product_id, name='Renamed')
+    assert _names(traditional_db) == _names(vector_db)
+
+
+def test_batch_size_must_be_positive(traditional_db, make_vector_db):
+    with pytest.raises(ValueError):
+        IngestPipeline(traditional_db, make_vector_db(), batch_size=0)
+
+
+@pytest.mark.parametrize('batch_size', ['0', '-5', 'many'])
+def test_ingest_endpoint_rejects_bad_batch_size(client, batch_size):
+    response = client.post(f'/api/ingest?batch_size={batch_size}', data=b'',
+                           content_type='application/x-ndjson')
+    assert response.status_code == 400
+
+
+def test_bulk_writes_are_refused_while_the_ingest_lock_is_held(client, app_module):
+    total = client.get('/api/stats').json['traditional']['total_products']
+    assert app_module.ingest_lock.acquire(blocking=False)
+    try:
+        for endpoint in ('/api/initialize', '/api/clear', '/api/ingest'):
+            response = client.post(endpoint, data=b'', content_type='application/x-ndjson')
+            assert response.status_code == 409, endpoint
+        # Held by a reseed rather than a load, so no ingest is reported running
+        assert client.get('/api/ingest/status').json['running'] is False
+    finally:
+        app_module.ingest_lock.release()
+    assert client.get('/api/stats').json['traditional']['total_products'] == total
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from pagination import MAX_PAGE_SIZE, parse_cursor
+
+
+@pytest.fixture(params=['traditional', 'vector'])
+def loaded_db(request, traditional_db, make_vector_db, catalog):
+    """Either database module, loaded with the 600-product catalog"""
+    db = traditional_db if request.param == 'traditional' else make_vector_db()
+    db.insert_products_bulk(catalog)
+    return db
+
+
+def _walk(db, limit, **params):
+    ids, cursor, pages = [], 0, 0
+    while cursor is not None:
+        page, cursor = db.get_products_page(cursor, limit, **params)
+        ids.extend(product['id'] for product in page)
+        pages += 1
+    return ids, pages
+
+
+def test_pages_cover_every_product_once_in_id_order(loaded_db, catalog):
+    ids, pages = _walk(loaded_db, 250)
+    assert ids == list(range(1, len(catalog) + 1))
+    assert pages == 3
+
+
+def test_last_full_page_has_no_next_cursor(loaded_db):
+    page, cursor = loaded_db.get_products_page(500, 100)
+    assert len(page) == 100 and cursor is None
+
+
+def test_filtered_pages(loaded_db, catalog):
+    filters = {'category': ['Kitchen', 'Furniture'], 'min_price': 50}
+    ids, _ = _walk(loaded_db, 40, filters=filters)
+    assert ids == [i + 1 for i, product in enumerate(catalog)
+                   if product['category'] in ('Kitchen', 'Furniture') and product['price'] >= 50]
+
+
+def test_writes_between_pages_do_not_shift_later_pages(loaded_db):
+    first, cursor = loaded_db.get_products_page(0, 100)
+    # Deleting already-seen products would make an OFFSET scan skip rows
+    for product in first[:10]:
+        loaded_db.delete_product(product['id'])
+    second, _ = loaded_db.get_products_page(cursor, 100)
+    assert [product['id'] for product in second] == list(range(101, 201))
+
+
+def test_iter_products_streams_from_the_cursor(loaded_db, catalog):
+    assert [product['id'] for product in loaded_db.iter_products(590)] == list(range(591, 601))
+    assert len(list(loaded_db.iter_products(limit=1234))) == len(catalog)
+    assert [product['id'] for product in loaded_db.iter_products(10, limit=3)] == [11, 12, 13]
+
+
+def test_page_size_is_bounded(loaded_db):
+    with pytest.raises(ValueError):
+        loaded_db.get_products_page(0, 0)
+    with pytest.raises(ValueError):
+        loaded_db.get_products_page(0, MAX_PAGE_SIZE + 1)
+
+
+@pytest.mark.parametrize('cursor, expected', [(None, 0), ('', 0), ('42', 42), (7, 7)])
+def test_parse_cursor(cursor, expected):
+    assert parse_cursor(cursor) == expected
+
+
+@pytest.mark.parametrize('cursor', ['abc', '-1', '1.5'])
+def test_parse_cursor_rejects_malformed(cursor):
+    with pytest.raises(ValueError):
+        parse_cursor(cursor)
+
+
+def test_products_endpoint_pages_and_streams(client):
+    total = client.get('/api/stats').json['traditional']['total_products']
+    ids, cursor = [], None
+    while True:
+        params = {'limit': 7, **({'cursor': cursor} if cursor else {})}
+        body = client.get('/api/products', query_string=params).json
+        ids.extend(product['id'] for product in body['products'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert len(ids) == total and ids == sorted(set(ids))
+
+    response = client.get('/api/products?format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line)['id'] for line in response.data.decode().splitlines()] == ids
+
+    vector_page = client.get('/api/products?source=vector&limit=3').json
+    assert [product['id'] for product in vector_page['products']] == ids[:3]
+
+
+@pytest.mark.parametrize('query', ['cursor=x', 'limit=0', f'limit={MAX_PAGE_SIZE + 1}', 'source=nope',
+                                   'min_price=abc'])
+def test_products_endpoint_rejects_bad_parameters(client, query):
+    assert client.get(f'/api/products?{query}').status_code == 400
+
+
+@pytest.mark.parametrize('endpoint', ['/api/search/traditional', '/api/search/vector'])
+def test_search_endpoints_stream_ndjson(client, endpoint):
+    response = client.post(endpoint, json={'query': 'coffee', 'limit': 3, 'stream': True})
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert 0 < len(rows) <= 3
+    assert rows == client.post(endpoint, json={'query': 'coffee', 'limit': 3}).json['results']
+
+
+@pytest.mark.parametrize('endpoint', ['/api/search/traditional', '/api/search/vector'])
+@pytest.mark.parametrize('limit', [0, -3, 'ten'])
+def test_search_endpoints_reject_bad_limits(client, endpoint, limit):
+    assert client.post(endpoint, json={'query': 'lamp', 'limit': limit}).status_code == 400
+
+
+@pytest.mark.parametrize('endpoint', ['/api/search/traditional', '/api/search/vector'])
+def test_search_endpoints_cap_the_limit(client, app_module, endpoint):
+    maximum = app_module.MAX_SEARCH_LIMIT
+    assert client.post(endpoint, json={'query': 'lamp', 'limit': maximum + 1}).status_code == 400
+    assert client.post(endpoint, json={'query': 'lamp', 'limit': maximum}).status_code == 200
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from quantization import coarse_scores, quantize
+from sample_data import generate_queries
+
+QUERIES = generate_queries(30)
+
+
+@pytest.mark.parametrize('storage_mode, min_recall', [('int8', 0.85), ('binary', 0.7)])
+def test_quantized_recall_against_exact(make_vector_db, catalog, storage_mode, min_recall):
+    db = make_vector_db(storage_mode=storage_mode)
+    db.insert_products_bulk(catalog)
+
+    report = db.evaluate_recall(QUERIES, k=10)
+    assert report['queries'] == len(QUERIES)
+    assert report['recall_at_k'] >= min_recall
+    # Rescoring the whole catalog is exact
+    assert db.evaluate_recall(QUERIES, k=10, rescore_factor=len(catalog))['recall_at_k'] == 1.0
+
+
+def test_quantized_results_carry_exact_scores(make_vector_db, catalog):
+    exact = make_vector_db('exact.db')
+    quantized = make_vector_db('int8.db', storage_mode='int8')
+    exact.insert_products_bulk(catalog[:200])
+    quantized.insert_products_bulk(catalog[:200])
+    expected = {product['id']: product['similarity'] for product in exact.search_semantic('desk lamp', limit=200)[0]}
+    for product in quantized.search_semantic('desk lamp', limit=10)[0]:
+        assert product['similarity'] == expected[product['id']]
+
+
+def test_int8_coarse_scores_track_float_scores():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    codes, scales = quantize(vectors, 'int8')
+    assert codes.dtype == np.int8
+    query = vectors[0]
+    assert np.allclose(coarse_scores(codes, scales, query, 'int8'), vectors @ query, atol=0.02)
+
+
+def test_rescore_factor_below_one_is_rejected(make_vector_db, catalog):
+    db = make_vector_db(storage_mode='int8')
+    db.insert_products_bulk(catalog[:50])
+    with pytest.raises(ValueError):
+        db.search_semantic('lamp', rescore_factor=-1)
+    with pytest.raises(ValueError):
+        make_vector_db('other.db', storage_mode='int8', rescore_factor=-4)
@@ -0,0 +1,77 @@
+from response_cache import ResponseCache
+
+
+def test_entries_from_an_older_data_version_are_not_served():
+    cache = ResponseCache()
+    cache.put('key', (1, 1), b'old')
+    assert cache.get('key', (1, 1)) == b'old'
+    assert cache.get('key', (1, 2)) is None
+    # The stale entry is dropped, not kept around
+    assert cache.stats()['size'] == 0 and cache.stats()['stale'] == 1
+
+
+def test_bounds_evict_least_recently_used():
+    cache = ResponseCache(max_entries=2, max_bytes=10)
+    cache.put('a', 0, b'aaaa')
+    cache.put('b', 0, b'bbbb')
+    cache.get('a', 0)
+    cache.put('c', 0, b'cccc')
+    assert cache.get('b', 0) is None
+    assert cache.get('a', 0) == b'aaaa' and cache.get('c', 0) == b'cccc'
+
+    cache.put('big', 0, b'x' * 11)
+    assert cache.get('big', 0) is None
+    assert cache.bytes <= 10
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResponseCache(max_entries=0)
+    cache.put('key', 0, b'body')
+    assert not cache.enabled and cache.get('key', 0) is None
+
+
+def _vector_search(client, query, **params):
+    return client.post('/api/search/vector', json={'query': query, **params})
+
+
+def test_writes_invalidate_cached_search_responses(client, app_module):
+    query = {'query': 'ergonomic chair', 'filters': {'category': 'Furniture'}}
+    assert client.post('/api/search/traditional', json=query).headers['X-Cache'] == 'MISS'
+    assert client.post('/api/search/traditional', json=query).headers['X-Cache'] == 'HIT'
+    first = _vector_search(client, 'ergonomic chair')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert _vector_search(client, '  Ergonomic   CHAIR ').headers['X-Cache'] == 'HIT'
+    # Different parameters are different entries
+    assert _vector_search(client, 'ergonomic chair', limit=3).headers['X-Cache'] == 'MISS'
+
+    product_id = first.json['results'][0]['id']
+    original = app_module.traditional_db.get_products_page(product_id - 1, 1)[0][0]
+    try:
+        assert client.put(f'/api/products/{product_id}', json={'name': 'Renamed Seat'}).status_code == 200
+        after_update = _vector_search(client, 'ergonomic chair')
+        assert after_update.headers['X-Cache'] == 'MISS'
+        names = {product['id']: product['name'] for product in after_update.json['results']}
+        assert names.get(product_id, 'Renamed Seat') == 'Renamed Seat'
+        assert client.post('/api/search/traditional', json=query).headers['X-Cache'] == 'MISS'
+    finally:
+        client.put(f'/api/products/{product_id}', json={'name': original['name']})
+
+
+def test_timings_requests_bypass_the_cache(client):
+    for _ in range(2):
+        response = _vector_search(client, 'desk lamp', timings=True)
+        assert 'X-Cache' not in response.headers
+        assert 'timings' in response.json
+
+
+def test_deletes_invalidate_cached_search_responses(client, add_app_product):
+    product_id = add_app_product('Vorpal Blade', 'vorpal blade', 'Outdoors', 40.0)
+    for endpoint in ('/api/search/traditional', '/api/search/vector'):
+        assert client.post(endpoint, json={'query': 'vorpal blade'}).headers['X-Cache'] == 'MISS'
+        assert client.post(endpoint, json={'query': 'vorpal blade'}).headers['X-Cache'] == 'HIT'
+
+    assert client.delete(f'/api/products/{product_id}').status_code == 200
+    for endpoint in ('/api/search/traditional', '/api/search/vector'):
+        response = client.post(endpoint, json={'query': 'vorpal blade'})
+        assert response.headers['X-Cache'] == 'MISS'
+        assert product_id not in {product['id'] for product in response.json['results']}
@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+
+from sharding import jump_hash, merge_top_k
+
+
+def _all_ids(db):
+    return [product['id'] for product in db.iter_products()]
+
+
+def _similarities(results):
+    return [product['similarity'] for product in results]
+
+
+def test_jump_hash_moves_only_onto_the_new_shard():
+    for key in range(2000):
+        before, after = jump_hash(key, 3), jump_hash(key, 4)
+        assert 0 <= before < 3
+        assert after in (before, 3)
+
+
+def test_merge_top_k_keeps_the_best_and_dedupes():
+    merged = merge_top_k([
+        [{'id': 1, 'similarity': 0.9}, {'id': 3, 'similarity': 0.5}],
+        [{'id': 1, 'similarity': 0.9}, {'id': 2, 'similarity': 0.7}],
+    ], limit=3)
+    assert [product['id'] for product in merged] == [1, 2, 3]
+
+
+def test_sharded_search_matches_a_single_store(make_vector_db, catalog):
+    products = catalog[:300]
+    sharded = make_vector_db(shards=3)
+    single = make_vector_db('single.db')
+    sharded.insert_products_bulk(products)
+    single.insert_products_bulk(products)
+
+    for query in ('wireless headphones', 'comfortable office chair', 'coffee'):
+        # Ties may be ordered differently across shards; the scores may not
+        assert (_similarities(sharded.search_semantic(query, limit=10)[0])
+                == _similarities(single.search_semantic(query, limit=10)[0]))
+    filters = {'category': 'Kitchen'}
+    assert ({product['id'] for product in sharded.search_semantic('coffee', limit=300, filters=filters)[0]}
+            == {product['id'] for product in single.search_semantic('coffee', limit=300, filters=filters)[0]})
+
+
+@pytest.mark.parametrize('index_type', ['exact', 'hnsw'])
+def test_resize_round_trip_keeps_search_consistent(make_vector_db, catalog, index_type):
+    if index_type == 'hnsw':
+        pytest.importorskip('hnswlib')
+    products = catalog[:200]
+    db = make_vector_db(shards=2, index_type=index_type)
+    db.insert_products_bulk(products)
+    db.load_search_structures()
+
+    assert db.resize(3) > 0
+    assert db.resize(2) > 0
+    assert len(db.shards) == 2
+    assert _all_ids(db) == list(range(1, 201))
+    for shard in db.shards:
+        ids = shard.call('_get_matrix')[0]
+        assert list(ids) == sorted(ids)
+
+    furniture = {i + 1 for i, product in enumerate(products) if product['category'] == 'Furniture'}
+    results, _ = db.search_semantic('chair', limit=200, filters={'category': 'Furniture'})
+    assert {product['id'] for product in results} == furniture
+
+    # Products that moved and came back are patched and tombstoned in place
+    moved = [product_id for product_id in range(1, 201) if jump_hash(product_id, 3) == 2]
+    assert db.update_product(moved[0], name='Quuxbar Widget', description='quuxbar widget', category='Gadgets')
+    assert db.search_semantic('quuxbar widget gadgets', limit=1)[0][0]['id'] == moved[0]
+    assert db.delete_product(moved[1])
+    results, _ = db.search_semantic(products[moved[1] - 1]['name'], limit=200)
+    assert moved[1] not in {product['id'] for product in results}
+    # Products deleted from a shard by the first resize and re-added by the
+    # second are live entries again, not tombstones
+    assert len(results) == 199
+
+
+def test_searches_keep_working_during_resize(make_vector_db, catalog):
+    db = make_vector_db(shards=2)
+    db.insert_products_bulk(catalog[:200])
+    db.load_search_structures()
+
+    stop = threading.Event()
+    errors, counts = [], []
+
+    def search():
+        while not stop.is_set():
+            try:
+                counts.append(len(db.search_semantic('lamp', limit=5)[0]))
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=search) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    try:
+        # Each shrink retires shards while searches are in flight
+        for shards in (3, 1, 3, 2, 1):
+            db.resize(shards)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert errors == []
+    assert counts and set(counts) == {5}
+
+
+def test_reopening_with_another_shard_count_resizes(make_vector_db, catalog):
+    db = make_vector_db(shards=2)
+    db.insert_products_bulk(catalog[:100])
+    db.close()
+
+    db = make_vector_db(shards=3)
+    assert len(db.shards) == 3
+    assert _all_ids(db) == list(range(1, 101))
+    assert db.insert_product('Zyzzyva Lamp', 'zyzzyva lamp', 'Lighting', 10.0) == 101
+
+
+def test_sharded_keyset_pages_merge_by_id(make_vector_db, catalog):
+    db = make_vector_db(shards=3)
+    db.insert_products_bulk(catalog[:250])
+
+    page, cursor = db.get_products_page(limit=100)
+    assert [product['id'] for product in page] == list(range(1, 101)) and cursor == 100
+    page, cursor = db.get_products_page(200, limit=100)
+    assert [product['id'] for product in page] == list(range(201, 251)) and cursor is None
@@ -0,0 +1,135 @@
+import pytest
+
+# Search paths that patch their in-memory structures on writes
+WRITE_PATHS = [
+    pytest.param({}, id='exact'),
+    pytest.param({'index_type': 'ivf'}, id='ivf'),
+    pytest.param({'index_type': 'hnsw'}, id='hnsw'),
+    pytest.param({'storage_mode': 'int8'}, id='int8'),
+    pytest.param({'mmap_matrix': True}, id='mmap'),
+    pytest.param({'mmap_matrix': True, 'storage_mode': 'int8'}, id='mmap-int8'),
+]
+
+
+def _skip_without_hnswlib(options):
+    if options.get('index_type') == 'hnsw':
+        pytest.importorskip('hnswlib')
+
+
+def _top_id(db, query, **params):
+    return db.search_semantic(query, limit=1, **params)[0][0]['id']
+
+
+@pytest.mark.parametrize('options', WRITE_PATHS)
+def test_update_and_delete_are_visible_to_search(make_vector_db, catalog, options):
+    _skip_without_hnswlib(options)
+    db = make_vector_db(**options)
+    db.insert_products_bulk(catalog)
+    db.load_search_structures()
+
+    assert db.update_product(5, name='Quuxbar Widget', description='quuxbar widget', category='Gadgets')
+    assert _top_id(db, 'quuxbar widget gadgets') == 5
+    assert _top_id(db, 'quuxbar widget gadgets', filters={'category': 'Gadgets'}) == 5
+
+    deleted_name = catalog[6]['name']
+    assert db.delete_product(7)
+    assert not db.delete_product(7)
+    results, _ = db.search_semantic(deleted_name, limit=50)
+    assert 7 not in {product['id'] for product in results}
+    results, _ = db.search_semantic(deleted_name, limit=len(catalog), exact=True)
+    assert len(results) == len(catalog) - 1 and 7 not in {product['id'] for product in results}
+
+    # New ids after a delete are still found
+    new_id = db.insert_product('Zyzzyva Lamp', 'zyzzyva lamp', 'Lighting', 10.0)
+    assert _top_id(db, 'zyzzyva lamp lighting') == new_id
+
+
+@pytest.mark.parametrize('options', WRITE_PATHS)
+def test_writes_survive_a_restart_without_close(make_vector_db, catalog, options):
+    _skip_without_hnswlib(options)
+    db = make_vector_db(**options)
+    db.insert_products_bulk(catalog)
+    db.load_search_structures()
+    db.close()
+
+    # Persisted index / sidecar files are current here; then change the data
+    # without closing, as a server that is killed would. Neither change
+    # alters the number of stored embeddings.
+    db = make_vector_db(**options)
+    db.load_search_structures()
+    db.update_product(5, name='Quuxbar Widget', description='quuxbar widget', category='Gadgets')
+    assert _top_id(make_vector_db(**options), 'quuxbar widget gadgets') == 5
+
+    db.delete_product(7)
+    new_id = db.insert_product('Zyzzyva Lamp', 'zyzzyva lamp', 'Lighting', 10.0)
+    reopened = make_vector_db(**options)
+    assert _top_id(reopened, 'zyzzyva lamp lighting') == new_id
+    results, _ = reopened.search_semantic(catalog[6]['name'], limit=50)
+    assert 7 not in {product['id'] for product in results}
+
+
+@pytest.mark.parametrize('options', WRITE_PATHS)
+def test_update_before_the_first_search_survives_a_restart(make_vector_db, catalog, options):
+    _skip_without_hnswlib(options)
+    db = make_vector_db(**options)
+    db.insert_products_bulk(catalog)
+    db.load_search_structures()
+    db.close()
+
+    # Nothing is loaded yet (as before warm-up finishes), so only the
+    # database sees the update
+    db = make_vector_db(**options)
+    db.update_product(5, name='Quuxbar Widget', description='quuxbar widget', category='Gadgets')
+    assert _top_id(db, 'quuxbar widget gadgets', exact=True) == 5
+    db.close()
+
+    reopened = make_vector_db(**options)
+    assert _top_id(reopened, 'quuxbar widget gadgets') == 5
+    assert _top_id(reopened, 'quuxbar widget gadgets', exact=True) == 5
+
+
+def test_price_only_update_keeps_the_embedding(make_vector_db, catalog):
+    db = make_vector_db()
+    db.insert_products_bulk(catalog[:50])
+    before = db.search_semantic(catalog[9]['name'], limit=5)[0]
+    assert db.update_product(10, price=1.5)
+    after = db.search_semantic(catalog[9]['name'], limit=5)[0]
+    assert [product['id'] for product in after] == [product['id'] for product in before]
+    assert next(product for product in after if product['id'] == 10)['price'] == 1.5
+    assert not db.update_product(10_000, price=1.0)
+
+
+def test_current_sidecar_is_mapped_after_a_restart(make_vector_db, catalog):
+    db = make_vector_db(mmap_matrix=True)
+    db.insert_products_bulk(catalog[:100])
+    db.load_search_structures()
+    db.insert_product('Zyzzyva Lamp', 'zyzzyva lamp', 'Lighting', 10.0)
+    db.delete_product(3)
+    db.close()
+
+    # Pending rows are folded in and tombstones compacted away on close
+    reopened = make_vector_db(mmap_matrix=True)
+    assert reopened._sidecar_matches()
+    ids, _, _ = reopened._get_matrix()
+    assert len(ids) == 100 and 3 not in ids and 101 in ids
+
+
+@pytest.mark.parametrize('body', ['[1, 2]', '"name"', '42', 'null', '{not json', '{}', '{"colour": "red"}',
+                                  '{"price": [1]}', '{"price": "cheap"}'])
+def test_update_endpoint_rejects_bad_bodies(client, body):
+    response = client.put('/api/products/1', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def test_update_and_delete_endpoints_change_both_databases(client, add_app_product):
+    product_id = add_app_product('Zyzzyva Lamp', 'zyzzyva lamp', 'Lighting', 10.0)
+
+    response = client.put(f'/api/products/{product_id}', json={'name': 'Quuxbar Lamp', 'price': '12'})
+    assert response.json['updated'] == {'traditional': True, 'vector': True}
+    top = client.post('/api/search/vector', json={'query': 'quuxbar lamp lighting', 'limit': 1}).json['results']
+    assert top[0]['id'] == product_id and top[0]['price'] == 12.0
+
+    assert client.delete(f'/api/products/{product_id}').json['deleted'] == {'traditional': True, 'vector': True}
+    assert client.delete(f'/api/products/{product_id}').status_code == 404
+    assert client.put(f'/api/products/{product_id}', json={'price': 1}).status_code == 404